@@ -1,21 +1,51 @@
+import asyncio
+
 import aiohttp_cors
-import aiomysql
 
 import motor.motor_asyncio
 from aiohttp import web
-from jasyncq.dispatcher.tasks import TasksDispatcher
-from jasyncq.repository.tasks import TaskRepository
 
 from apiserver.config import config
 from apiserver.dispatcher.device import DeviceDispatcher
+from apiserver.metrics import metrics_middleware
+from apiserver.model.device_notification_log import NotificationLogMode
+from apiserver.repository.device_notification_log_block import \
+    compact_device_notification_log_blocks, COMPACTION_INTERVAL_SECONDS
+from apiserver.repository.notification import notification_cache
 from apiserver.resource.abstract import AbstractResource
 from apiserver.resource.devices import DevicesHttpResource
 from apiserver.resource.internal import InternalHttpResource
 from apiserver.resource.notifications import NotificationsHttpResource
 from common.logger.logger import get_logger
+from common.task_queue.factory import TaskQueueFactory
 from apiserver.storage.init import init_db
 
 
+async def compact_device_notification_log_blocks_periodically(app):
+    logger = get_logger(__name__)
+    while True:
+        await asyncio.sleep(COMPACTION_INTERVAL_SECONDS)
+        try:
+            compacted = await compact_device_notification_log_blocks()
+            if compacted:
+                logger.info(f'{compacted} device notification log blocks compacted')
+        except Exception:
+            logger.exception('device notification log block compaction failed')
+
+
+async def start_background_tasks(app):
+    app['background_tasks'] = []
+    if config.api_server.notification_log_mode == NotificationLogMode.BLOCK:
+        app['background_tasks'].append(
+            asyncio.ensure_future(compact_device_notification_log_blocks_periodically(app))
+        )
+
+
+async def cleanup_background_tasks(app):
+    for task in app['background_tasks']:
+        task.cancel()
+
+
 def plugin_app(app, prefix, nested, keys=()):
     for key in keys:
         nested[key] = app[key]
@@ -41,47 +71,48 @@ async def application():
         f'@{mongo_config.host}:{mongo_config.port}'
     )[mongo_config.database]
 
-    task_queue_config = config.api_server.task_queue
-    task_queue_pool = await aiomysql.create_pool(
-        host=task_queue_config.host,
-        port=task_queue_config.port,
-        user=task_queue_config.user,
-        password=task_queue_config.password,
-        db=task_queue_config.database,
-        autocommit=False,
-    )
+    task_queue_factory = TaskQueueFactory(task_queue_config=config.api_server.task_queue)
+    notification_task_queue = await task_queue_factory.create(topic_name='NOTIFICATION_TOPIC')
 
-    notification_task_queue_repository = TaskRepository(
-        pool=task_queue_pool,
-        topic_name='NOTIFICATION_TOPIC',
+    cache_config = config.api_server.cache
+    notification_cache.configure(
+        max_size=cache_config.notification_max_size,
+        ttl_seconds=cache_config.ttl_seconds,
     )
-    await notification_task_queue_repository.initialize()
-    notification_task_queue = TasksDispatcher(
-        repository=notification_task_queue_repository,
+
+    # NOTE(pjongy): Shared between resources to aggregate condition usage for index advising
+    device_dispatcher = DeviceDispatcher(
+        database=mongo_client,
+        cache_max_size=cache_config.device_max_size,
+        cache_ttl_seconds=cache_config.ttl_seconds,
     )
+    await device_dispatcher.initialize()
 
     resource_list = {
         '/devices': DevicesHttpResource(
-            device_dispatcher=DeviceDispatcher(
-                database=mongo_client
-            )
+            device_dispatcher=device_dispatcher,
+            notification_log_mode=config.api_server.notification_log_mode,
         ),
         '/notifications': NotificationsHttpResource(
-            device_dispatcher=DeviceDispatcher(
-                database=mongo_client
-            ),
+            device_dispatcher=device_dispatcher,
             notification_task_queue=notification_task_queue,
         ),
         '/internal': InternalHttpResource(
             internal_api_keys=config.api_server.internal_api_keys,
+            device_dispatcher=device_dispatcher,
+            notification_log_mode=config.api_server.notification_log_mode,
         ),
     }
 
     for path, resource in resource_list.items():
         resource: AbstractResource = resource  # NOTE(pjongy): For type hinting
         resource.route()
+        resource.app.middlewares.append(metrics_middleware(prefix=path))
         plugin_app(app, path, resource.app)
 
+    app.on_startup.append(start_background_tasks)
+    app.on_cleanup.append(cleanup_background_tasks)
+
     cors = aiohttp_cors.setup(app)
     allow_url = '*'
 
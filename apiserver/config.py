@@ -1,5 +1,5 @@
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
 import deserialize
 
@@ -10,6 +10,7 @@ class Config:
     @deserialize.default('internal_api_keys', [])
     @deserialize.parser('internal_api_keys', lambda arg: arg.split(','))
     @deserialize.default('port', 8080)
+    @deserialize.default('notification_log_mode', 'row')
     @deserialize.parser('port', int)
     class APIServer:
         @deserialize.default('port', 3306)
@@ -21,6 +22,32 @@ class Config:
             password: str
             database: str
 
+        @deserialize.default('backend', 'jasyncq')
+        @deserialize.default('port', 3306)
+        @deserialize.parser('port', int)
+        class TaskQueue:
+            @deserialize.default('port', 6379)
+            @deserialize.default('database', 0)
+            @deserialize.default('max_connections', 10)
+            @deserialize.parser('port', int)
+            @deserialize.parser('database', int)
+            @deserialize.parser('max_connections', int)
+            class Redis:
+                host: str
+                port: int
+                password: Optional[str]
+                database: int
+                max_connections: int
+
+            backend: str  # jasyncq or redis, every service should use same backend
+            # NOTE(pjongy): MySQL connection for jasyncq backend
+            host: Optional[str]
+            port: int
+            user: Optional[str]
+            password: Optional[str]
+            database: Optional[str]
+            redis: Optional[Redis]  # for redis backend
+
         @deserialize.default('port', 27017)
         @deserialize.parser('port', int)
         class Mongo:
@@ -30,11 +57,24 @@ class Config:
             password: str
             database: str
 
+        @deserialize.default('notification_max_size', 1000)
+        @deserialize.default('device_max_size', 10000)
+        @deserialize.default('ttl_seconds', 5.0)
+        @deserialize.parser('notification_max_size', int)
+        @deserialize.parser('device_max_size', int)
+        @deserialize.parser('ttl_seconds', float)
+        class Cache:
+            notification_max_size: int  # 0 to disable
+            device_max_size: int  # 0 to disable
+            ttl_seconds: float  # bounds staleness between api server processes
+
         mysql: MySQL
-        task_queue: MySQL
+        task_queue: TaskQueue
         mongo: Mongo
+        cache: Cache
         port: int
         internal_api_keys: List[str]  # comma separated string to list
+        notification_log_mode: str  # row or block (apiserver/model/device_notification_log.py)
 
     api_server: APIServer
 
@@ -0,0 +1,12 @@
+from apiserver.metrics import DB_CALL_SECONDS
+from common.metrics import observe_seconds
+
+
+def observe_db_call(database: str):
+    def decorator(func):
+        return observe_seconds(
+            DB_CALL_SECONDS,
+            database=database,
+            operation=func.__qualname__,
+        )(func)
+    return decorator
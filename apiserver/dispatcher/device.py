@@ -1,14 +1,22 @@
 import dataclasses
 import enum
+import math
 from random import randint
-from typing import Dict, Union, List
+from typing import Dict, Union, List, Optional, Tuple, AsyncIterator
 
-import deserialize
 import pymongo
+from bson import ObjectId
+from bson.errors import InvalidId
 from motor.core import AgnosticDatabase, AgnosticCollection
 from motor.motor_asyncio import AsyncIOMotorCursor
-from pymongo import ReturnDocument
-
+from pymongo import ReturnDocument, IndexModel, UpdateOne
+from pymongo.errors import OperationFailure, BulkWriteError
+from pymongo.results import BulkWriteResult, UpdateResult
+
+from apiserver.decorator.metrics import observe_db_call
+from apiserver.dispatcher.index_advisor import ConditionUsage, suggest_indexes, KEYSET_SORT_KEYS
+from apiserver.exception.repository import WrongParameterError
+from common.cache import LRUCache
 from common.logger.logger import get_logger
 from common.structure.condition import ConditionClause
 
@@ -26,15 +34,25 @@ class SendPlatform(enum.IntEnum):
     APNS = 2
 
 
+RANDOM_BUCKET_MIN = 1
+RANDOM_BUCKET_MAX = 10000
+RANDOM_BUCKET_SIZE = RANDOM_BUCKET_MAX - RANDOM_BUCKET_MIN + 1
+
+EXPLAIN_LIMIT = 1000
+ESTIMATE_CONFIDENCE_Z = 1.96  # NOTE(pjongy): 95% confidence interval
+
 DevicePropertyValue = Union[
     str, int, float, List[Union[str, int, float]]
 ]
 
 
-@deserialize.default('device_properties', {})
-@deserialize.parser('_id', str)
 @dataclasses.dataclass
 class Device:
+    __slots__ = (
+        '_id', 'id', 'random_bucket', 'external_id', 'push_token', 'send_platform',
+        'device_platform', 'device_properties',
+    )
+
     _id: str
     id: int  # NOTE(pjongy): MySQL PK field for backward-compatibility
     random_bucket: int
@@ -45,6 +63,80 @@ class Device:
     device_properties: Dict[str, DevicePropertyValue]
 
 
+def device_from_document(document: dict) -> Device:
+    # NOTE(pjongy): Decoded without deserialize since it is called for every searched device
+    return Device(
+        _id=str(document['_id']),
+        id=document['id'],
+        random_bucket=document['random_bucket'],
+        external_id=document['external_id'],
+        push_token=document['push_token'],
+        send_platform=SendPlatform(document['send_platform']),
+        device_platform=DevicePlatform(document['device_platform']),
+        device_properties=document.get('device_properties', {}),
+    )
+
+
+def device_to_dict(device: Device) -> dict:
+    # NOTE(pjongy): Unlike dataclasses.asdict, device_properties is not deep copied
+    return {
+        '_id': device._id,
+        'id': device.id,
+        'random_bucket': device.random_bucket,
+        'external_id': device.external_id,
+        'push_token': device.push_token,
+        'send_platform': device.send_platform,
+        'device_platform': device.device_platform,
+        'device_properties': device.device_properties,
+    }
+
+
+@dataclasses.dataclass
+class DeviceUpsert:
+    rdb_pk: int
+    external_id: str
+    push_token: str
+    send_platform: SendPlatform
+    device_platform: DevicePlatform
+
+
+@dataclasses.dataclass
+class BulkUpsertDevicesResult:
+    upserted: int
+    matched: int
+    failed: Dict[str, str]  # external_id: reason
+
+
+@dataclasses.dataclass
+class BulkPropertiesResult:
+    matched: int
+    modified: int
+    failed: int
+
+
+@dataclasses.dataclass
+class DeviceTotalEstimate:
+    total: int
+    lower: int
+    upper: int
+    exact: bool
+    sample_ratio: float
+    sampled: int  # matched devices in random_bucket_range
+    random_bucket_range: Optional[Tuple[int, int]]
+
+
+def estimate_total_from_sample(sampled: int, sample_ratio: float) -> Tuple[int, int, int]:
+    """Scales up count of random_bucket sample, returns (total, lower, upper)
+
+    random_bucket is uniformly random so every device is in sample with probability sample_ratio,
+    standard error of sampled / sample_ratio is sqrt(sampled * (1 - sample_ratio)) / sample_ratio
+    """
+    total = sampled / sample_ratio
+    margin = ESTIMATE_CONFIDENCE_Z * math.sqrt(sampled * (1 - sample_ratio)) / sample_ratio
+    # NOTE(pjongy): Every sampled device exists so total can not be less than it
+    return round(total), max(sampled, math.floor(total - margin)), math.ceil(total + margin)
+
+
 def _resolve_condition_clause_to_filter(
     condition_clause: ConditionClause
 ):
@@ -82,16 +174,127 @@ def _resolve_condition_clause_to_filter(
     }
 
 
+def _resolve_random_bucket_range_to_filter(random_bucket_range: Optional[Tuple[int, int]]):
+    if not random_bucket_range:
+        return {}
+    bucket_start, bucket_end = random_bucket_range
+    return {
+        'random_bucket': {
+            '$gte': bucket_start,
+            '$lte': bucket_end,
+        }
+    }
+
+
+def _resolve_sendable_filter(sendable_only: bool):
+    # NOTE(pjongy): push_token is cleared to empty string if it is pruned
+    if not sendable_only:
+        return {}
+    return {
+        'push_token': {
+            '$ne': ''
+        }
+    }
+
+
+def _encode_cursor(device: Device) -> str:
+    return f'{device.random_bucket}:{device._id}'
+
+
+def _decode_cursor(cursor: str) -> Tuple[int, ObjectId]:
+    try:
+        random_bucket, object_id = cursor.split(':', 1)
+        return int(random_bucket), ObjectId(object_id)
+    except (ValueError, InvalidId):
+        raise WrongParameterError(f'malformed cursor {cursor}')
+
+
+def _resolve_cursor_to_filter(cursor: str):
+    # NOTE(pjongy): Keyset on (random_bucket, _id) so each page is an index range scan
+    random_bucket, object_id = _decode_cursor(cursor)
+    return {
+        '$or': [
+            {'random_bucket': {'$gt': random_bucket}},
+            {'random_bucket': random_bucket, '_id': {'$gt': object_id}},
+        ]
+    }
+
+
+def _resolve_properties_to_update(properties: Dict[str, DevicePropertyValue]) -> dict:
+    # NOTE(pjongy): Every property is applied by single update, None value means remove attribute
+    update = {}
+    for property_key, property_value in properties.items():
+        if property_value is None:
+            update.setdefault('$unset', {})[f'device_properties.{property_key}'] = ''
+        else:
+            update.setdefault('$set', {})[f'device_properties.{property_key}'] = property_value
+    return update
+
+
 logger = get_logger(__name__)
 
 
 class DeviceDispatcher:
     COLLECTION_NAME = 'device'
 
-    def __init__(self, database: AgnosticDatabase):
+    INDEXES = [
+        IndexModel([('external_id', pymongo.ASCENDING)], unique=True),
+        IndexModel([('device_properties.$**', pymongo.ASCENDING)]),  # NOTE(pjongy): wildcard
+        IndexModel(KEYSET_SORT_KEYS),
+        IndexModel([('push_token', pymongo.ASCENDING)]),  # NOTE(pjongy): For pruning tokens
+    ]
+
+    def __init__(
+        self,
+        database: AgnosticDatabase,
+        cache_max_size: int = 1000,
+        cache_ttl_seconds: float = 5.0,
+    ):
         self.database = database
         self.collection: AgnosticCollection = self.database[self.COLLECTION_NAME]
+        self.condition_usage = ConditionUsage()
+        self.device_cache = LRUCache(max_size=cache_max_size, ttl_seconds=cache_ttl_seconds)
+
+    async def initialize(self):
+        for index in self.INDEXES:
+            try:
+                names = await self.collection.create_indexes([index])
+                logger.info(f'index ensured: {names}')
+            except OperationFailure:
+                # NOTE(pjongy): e.g) Existing duplicated external_id, should be resolved manually
+                logger.exception(f'index creation failed {index.document}')
+
+    async def explain_condition(self, condition_clause: ConditionClause) -> dict:
+        condition_filter = _resolve_condition_clause_to_filter(condition_clause=condition_clause)
+        # NOTE(pjongy): Stats are of first EXPLAIN_LIMIT devices (like a keyset page), explain
+        #  runs the query so it should not scan whole collection
+        result: dict = await self.collection.find(
+            filter=condition_filter,
+            sort=KEYSET_SORT_KEYS,
+        ).limit(EXPLAIN_LIMIT).explain()
+        logger.debug(result)
+
+        execution_stats = result.get('executionStats', {})
+        return {
+            'winning_plan': result.get('queryPlanner', {}).get('winningPlan'),
+            'returned': execution_stats.get('nReturned'),
+            'docs_examined': execution_stats.get('totalDocsExamined'),
+            'keys_examined': execution_stats.get('totalKeysExamined'),
+            'execution_time_millis': execution_stats.get('executionTimeMillis'),
+            'suggested_indexes': suggest_indexes(condition_clause),
+        }
 
+    def advise_indexes(self, size: int = 10) -> List[dict]:
+        return [
+            {
+                'condition_shape': shape,
+                'count': count,
+                'suggested_indexes': suggest_indexes(condition_clause),
+            }
+            for shape, count, condition_clause in self.condition_usage.most_common(size)
+        ]
+
+    @observe_db_call('mongo')
     async def upsert_device_by_external_id(
         self,
         rdb_pk: int,
@@ -107,10 +310,13 @@ class DeviceDispatcher:
             'push_token': push_token,
             'send_platform': send_platform,
             'device_platform': device_platform,
-            'random_bucket': randint(1, 10000),
         }
         update = {
-            '$set': document
+            '$set': document,
+            # NOTE(pjongy): random_bucket is a keyset component so it should not move on re-upsert
+            '$setOnInsert': {
+                'random_bucket': randint(RANDOM_BUCKET_MIN, RANDOM_BUCKET_MAX),
+            },
         }
 
         result: dict = await self.collection.find_one_and_update(
@@ -121,43 +327,147 @@ class DeviceDispatcher:
         )
         logger.debug(result)
 
-        return deserialize.deserialize(Device, result)
+        device = device_from_document(result)
+        self.device_cache.set(external_id, device)
+        return device
 
-    async def upsert_property_by_external_id(
+    @observe_db_call('mongo')
+    async def bulk_upsert_devices_by_external_id(
+        self,
+        devices: List[DeviceUpsert],
+    ) -> BulkUpsertDevicesResult:
+        if not devices:
+            return BulkUpsertDevicesResult(upserted=0, matched=0, failed={})
+
+        operations = [
+            UpdateOne(
+                {'external_id': device.external_id},
+                {
+                    '$set': {
+                        'id': device.rdb_pk,
+                        'external_id': device.external_id,
+                        'push_token': device.push_token,
+                        'send_platform': device.send_platform,
+                        'device_platform': device.device_platform,
+                    },
+                    '$setOnInsert': {
+                        'random_bucket': randint(RANDOM_BUCKET_MIN, RANDOM_BUCKET_MAX),
+                    },
+                },
+                upsert=True,
+            )
+            for device in devices
+        ]
+
+        try:
+            result: BulkWriteResult = await self.collection.bulk_write(operations, ordered=False)
+            bulk_api_result = result.bulk_api_result
+        except BulkWriteError as e:
+            bulk_api_result = e.details
+        for device in devices:
+            self.device_cache.invalidate(device.external_id)
+
+        return BulkUpsertDevicesResult(
+            upserted=bulk_api_result['nUpserted'],
+            matched=bulk_api_result['nMatched'],
+            failed={
+                devices[write_error['index']].external_id: write_error['errmsg']
+                for write_error in bulk_api_result['writeErrors']
+            },
+        )
+
+    @observe_db_call('mongo')
+    async def upsert_properties_by_external_id(
         self,
         external_id: str,
-        property_key: str,
-        property_value: DevicePropertyValue = None
-    ) -> Device:
+        properties: Dict[str, DevicePropertyValue],
+    ) -> Optional[Device]:
         filter_ = {'external_id': external_id}
-
-        if property_value is None:  # NOTE(pjongy): Remove attribute
-            update = {
-                '$unset': {
-                    f'device_properties.{property_key}': '',
-                }
-            }
+        update = _resolve_properties_to_update(properties=properties)
+
+        if update:
+            result: Optional[dict] = await self.collection.find_one_and_update(
+                filter=filter_,
+                update=update,
+                return_document=ReturnDocument.AFTER,
+            )
         else:
-            update = {
-                '$set': {
-                    f'device_properties.{property_key}': property_value,
-                }
-            }
+            result: Optional[dict] = await self.collection.find_one(filter_)
+        logger.debug(result)
 
-        result: dict = await self.collection.find_one_and_update(
-            filter=filter_,
-            update=update,
-            return_document=ReturnDocument.AFTER,
+        if result is None:
+            self.device_cache.invalidate(external_id)
+            return None
+        device = device_from_document(result)
+        self.device_cache.set(external_id, device)
+        return device
+
+    @observe_db_call('mongo')
+    async def bulk_upsert_properties_by_external_id(
+        self,
+        properties_by_external_id: Dict[str, Dict[str, DevicePropertyValue]],
+    ) -> BulkPropertiesResult:
+        operations = []
+        for external_id, properties in properties_by_external_id.items():
+            update = _resolve_properties_to_update(properties=properties)
+            if update:
+                operations.append(UpdateOne({'external_id': external_id}, update))
+
+        if not operations:
+            return BulkPropertiesResult(matched=0, modified=0, failed=0)
+
+        # NOTE(pjongy): Unordered bulk write continues remaining writes even if some of them failed
+        try:
+            result: BulkWriteResult = await self.collection.bulk_write(operations, ordered=False)
+            bulk_api_result = result.bulk_api_result
+        except BulkWriteError as e:
+            logger.error(f'bulk property write partially failed {e.details["writeErrors"][:10]}')
+            bulk_api_result = e.details
+        for external_id in properties_by_external_id:
+            self.device_cache.invalidate(external_id)
+
+        return BulkPropertiesResult(
+            matched=bulk_api_result['nMatched'],
+            modified=bulk_api_result['nModified'],
+            failed=len(bulk_api_result['writeErrors']),
         )
-        logger.debug(result)
 
-        return deserialize.deserialize(Device, result)
+    @observe_db_call('mongo')
+    async def clear_push_tokens(self, push_tokens: List[str]) -> int:
+        """Clears push_token of devices which have one of push_tokens (rejected by provider),
+        device is not sent until new push_token is upserted"""
+        if not push_tokens:
+            return 0
 
+        filter_ = {
+            'push_token': {
+                '$in': push_tokens
+            }
+        }
+        external_ids = [
+            document['external_id']
+            async for document in self.collection.find(
+                filter=filter_,
+                projection={'external_id': True},
+            )
+        ]
+        result: UpdateResult = await self.collection.update_many(
+            filter_,
+            {'$set': {'push_token': ''}},
+        )
+        for external_id in external_ids:
+            self.device_cache.invalidate(external_id)
+        return result.modified_count
+
+    @observe_db_call('mongo')
     async def get_device_total_by_condition(
         self,
         external_ids: List[str],
         condition_clause: ConditionClause,
+        random_bucket_range: Optional[Tuple[int, int]] = None,
+        sendable_only: bool = False,
     ) -> int:
+        self.condition_usage.track(condition_clause)
         condition_filter = _resolve_condition_clause_to_filter(condition_clause=condition_clause)
         external_id_filter = {}
         if external_ids:
@@ -166,8 +476,15 @@ class DeviceDispatcher:
                     '$in': external_ids
                 }
             }
+        random_bucket_filter = _resolve_random_bucket_range_to_filter(
+            random_bucket_range=random_bucket_range)
         filter_ = {
-            '$and': [condition_filter, external_id_filter]
+            '$and': [
+                condition_filter,
+                external_id_filter,
+                random_bucket_filter,
+                _resolve_sendable_filter(sendable_only=sendable_only),
+            ]
         }
         total: int = await self.collection.count_documents(
             filter=filter_,
@@ -175,6 +492,70 @@ class DeviceDispatcher:
         logger.debug(total)
         return total
 
+    @observe_db_call('mongo')
+    async def estimate_device_total_by_condition(
+        self,
+        condition_clause: ConditionClause,
+        sample_ratio: float = 0.01,
+        min_sampled: int = 100,
+    ) -> DeviceTotalEstimate:
+        """Counts devices only in random contiguous random_bucket range of sample_ratio
+
+        Falls back to exact count if less than min_sampled devices are sampled since relative
+        error (about 1 / sqrt(sampled)) is too large for small results
+        """
+        bucket_count = min(
+            RANDOM_BUCKET_SIZE, max(1, round(RANDOM_BUCKET_SIZE * sample_ratio)))
+        if bucket_count < RANDOM_BUCKET_SIZE:
+            bucket_start = randint(RANDOM_BUCKET_MIN, RANDOM_BUCKET_MAX - bucket_count + 1)
+            random_bucket_range = (bucket_start, bucket_start + bucket_count - 1)
+            self.condition_usage.track(condition_clause)
+            condition_filter = _resolve_condition_clause_to_filter(
+                condition_clause=condition_clause)
+            random_bucket_filter = _resolve_random_bucket_range_to_filter(
+                random_bucket_range=random_bucket_range)
+            # NOTE(pjongy): Hint keyset index to examine sampled range only, planner could pick
+            #  condition index which examines whole matched devices
+            sampled: int = await self.collection.count_documents(
+                filter={
+                    '$and': [
+                        condition_filter,
+                        random_bucket_filter,
+                        _resolve_sendable_filter(sendable_only=True),
+                    ]
+                },
+                hint=KEYSET_SORT_KEYS,
+            )
+            if sampled >= min_sampled:
+                actual_sample_ratio = bucket_count / RANDOM_BUCKET_SIZE
+                total, lower, upper = estimate_total_from_sample(
+                    sampled=sampled, sample_ratio=actual_sample_ratio)
+                return DeviceTotalEstimate(
+                    total=total,
+                    lower=lower,
+                    upper=upper,
+                    exact=False,
+                    sample_ratio=actual_sample_ratio,
+                    sampled=sampled,
+                    random_bucket_range=random_bucket_range,
+                )
+
+        total = await self.get_device_total_by_condition(
+            external_ids=[],
+            condition_clause=condition_clause,
+            sendable_only=True,
+        )
+        return DeviceTotalEstimate(
+            total=total,
+            lower=total,
+            upper=total,
+            exact=True,
+            sample_ratio=1.0,
+            sampled=total,
+            random_bucket_range=None,
+        )
+
+    @observe_db_call('mongo')
     async def search_devices(
         self,
         external_ids: List[str],
@@ -182,7 +563,9 @@ class DeviceDispatcher:
         start: int = 0,
         size: int = 10,
         order_bys: List[str] = (),
+        sendable_only: bool = False,
     ) -> List[Device]:
+        self.condition_usage.track(condition_clause)
         condition_filter = _resolve_condition_clause_to_filter(condition_clause=condition_clause)
         external_id_filter = {}
         if external_ids:
@@ -193,7 +576,11 @@ class DeviceDispatcher:
             }
 
         filter_ = {
-            '$and': [condition_filter, external_id_filter]
+            '$and': [
+                condition_filter,
+                external_id_filter,
+                _resolve_sendable_filter(sendable_only=sendable_only),
+            ]
         }
 
         sort = []
@@ -215,11 +602,112 @@ class DeviceDispatcher:
         logger.debug(result)
 
         return [
-            deserialize.deserialize(Device, device)
+            device_from_document(device)
             async for device in result
         ]
 
-    async def find_device_by_external_id(self, external_id: str):
+    def _find_by_keyset(
+        self,
+        external_ids: List[str],
+        condition_clause: ConditionClause,
+        cursor: Optional[str] = None,
+        random_bucket_range: Optional[Tuple[int, int]] = None,
+        sendable_only: bool = False,
+        **kwargs
+    ) -> AsyncIOMotorCursor:
+        self.condition_usage.track(condition_clause)
+        condition_filter = _resolve_condition_clause_to_filter(condition_clause=condition_clause)
+        external_id_filter = {}
+        if external_ids:
+            external_id_filter = {
+                'external_id': {
+                    '$in': external_ids
+                }
+            }
+        random_bucket_filter = _resolve_random_bucket_range_to_filter(
+            random_bucket_range=random_bucket_range)
+        cursor_filter = {}
+        if cursor:
+            cursor_filter = _resolve_cursor_to_filter(cursor=cursor)
+
+        filter_ = {
+            '$and': [
+                condition_filter,
+                external_id_filter,
+                random_bucket_filter,
+                cursor_filter,
+                _resolve_sendable_filter(sendable_only=sendable_only),
+            ]
+        }
+
+        return self.collection.find(
+            filter=filter_,
+            sort=KEYSET_SORT_KEYS,
+            **kwargs
+        )
+
+    @observe_db_call('mongo')
+    async def search_devices_by_cursor(
+        self,
+        external_ids: List[str],
+        condition_clause: ConditionClause,
+        cursor: Optional[str] = None,
+        size: int = 10,
+        random_bucket_range: Optional[Tuple[int, int]] = None,
+        sendable_only: bool = False,
+    ) -> Tuple[List[Device], Optional[str]]:
+        result: AsyncIOMotorCursor = self._find_by_keyset(
+            external_ids=external_ids,
+            condition_clause=condition_clause,
+            cursor=cursor,
+            random_bucket_range=random_bucket_range,
+            sendable_only=sendable_only,
+            limit=size,
+        )
+        logger.debug(result)
+
+        devices = [
+            device_from_document(device)
+            async for device in result
+        ]
+
+        next_cursor = None
+        if len(devices) == size:
+            next_cursor = _encode_cursor(devices[-1])
+        return devices, next_cursor
+
+    def iterate_devices(
+        self,
+        external_ids: List[str],
+        condition_clause: ConditionClause,
+        cursor: Optional[str] = None,
+        random_bucket_range: Optional[Tuple[int, int]] = None,
+        sendable_only: bool = False,
+        batch_size: int = 1000,
+    ) -> AsyncIterator[Device]:
+        # NOTE(pjongy): Not a generator itself so that wrong filter raises before iteration
+        result: AsyncIOMotorCursor = self._find_by_keyset(
+            external_ids=external_ids,
+            condition_clause=condition_clause,
+            cursor=cursor,
+            random_bucket_range=random_bucket_range,
+            sendable_only=sendable_only,
+            batch_size=batch_size,
+        )
+        logger.debug(result)
+
+        async def devices():
+            async for device in result:
+                yield device_from_document(device)
+
+        return devices()
+
+    @observe_db_call('mongo')
+    async def find_device_by_external_id(self, external_id: str) -> Optional[Device]:
+        device = self.device_cache.get(external_id)
+        if device is not None:
+            return device
+
         filter_ = {
             'external_id': external_id,
         }
@@ -228,4 +716,8 @@ class DeviceDispatcher:
         )
         logger.debug(result)
 
-        return deserialize.deserialize(Device, result)
+        if result is None:
+            return None
+        device = device_from_document(result)
+        self.device_cache.set(external_id, device)
+        return device
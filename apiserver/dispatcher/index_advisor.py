@@ -0,0 +1,112 @@
+import itertools
+from collections import Counter
+from typing import List, Tuple, Dict
+
+import pymongo
+
+from common.structure.condition import ConditionClause
+
+IndexKeys = List[Tuple[str, int]]
+
+EQUALITY_OPERATORS = {'int_eq', 'str_eq', 'str_exists'}
+RANGE_OPERATORS = {'int_gt', 'int_gte', 'int_lt', 'int_lte'}
+
+# NOTE(pjongy): AND of ORs expands into cross product of branches, suggestions are made for first
+#  branches only not to grow exponentially by nesting
+MAX_BRANCHES = 32
+# NOTE(pjongy): Shapes are made by callers, only this many most common ones are kept
+MAX_TRACKED_SHAPES = 1000
+
+# NOTE(pjongy): Keyset paging (cursor/stream/launch) sorts by these keys
+KEYSET_SORT_KEYS: IndexKeys = [
+    ('random_bucket', pymongo.ASCENDING),
+    ('_id', pymongo.ASCENDING),
+]
+
+
+def condition_clause_shape(condition_clause: ConditionClause) -> str:
+    """Condition clause without values, frequently used shapes are worth an index"""
+    if condition_clause.conditions is not None:
+        inner_shapes = sorted(
+            condition_clause_shape(_condition_clause)
+            for _condition_clause in condition_clause.conditions
+        )
+        return f'{condition_clause.join_type}({", ".join(inner_shapes)})'
+    return f'{condition_clause.operator}:{condition_clause.key}'
+
+
+def _flatten_and_clause(condition_clause: ConditionClause) -> List[List[ConditionClause]]:
+    # NOTE(pjongy): Returns OR branches of AND-ed leaf conditions, one index is needed per branch
+    if condition_clause.conditions is None:
+        return [[condition_clause]]
+
+    if condition_clause.join_type == 'OR':
+        return list(itertools.islice(
+            (
+                branch
+                for _condition_clause in condition_clause.conditions
+                for branch in _flatten_and_clause(_condition_clause)
+            ),
+            MAX_BRANCHES,
+        ))
+
+    branches = [[]]
+    for _condition_clause in condition_clause.conditions:
+        inner_branches = _flatten_and_clause(_condition_clause)
+        branches = list(itertools.islice(
+            (
+                branch + inner_branch
+                for branch in branches
+                for inner_branch in inner_branches
+            ),
+            MAX_BRANCHES,
+        ))
+    return branches
+
+
+def suggest_indexes(condition_clause: ConditionClause) -> List[IndexKeys]:
+    """Compound index suggestion following Equality-Sort-Range order"""
+    suggestions = []
+    for branch in _flatten_and_clause(condition_clause):
+        equality_keys = []
+        range_keys = []
+        for leaf in branch:
+            key = f'device_properties.{leaf.key}'
+            if leaf.operator in EQUALITY_OPERATORS and key not in equality_keys:
+                equality_keys.append(key)
+            elif leaf.operator in RANGE_OPERATORS and key not in range_keys:
+                range_keys.append(key)
+
+        index_keys = [(key, pymongo.ASCENDING) for key in equality_keys]
+        index_keys.extend(KEYSET_SORT_KEYS)
+        index_keys.extend(
+            (key, pymongo.ASCENDING) for key in range_keys if key not in equality_keys
+        )
+        if index_keys not in suggestions:
+            suggestions.append(index_keys)
+    return suggestions
+
+
+class ConditionUsage:
+    """Counts condition shapes, least common ones are dropped over max_shapes so counts of
+    shapes used rarely are approximate"""
+
+    def __init__(self, max_shapes: int = MAX_TRACKED_SHAPES):
+        self.max_shapes = max_shapes
+        self.counter: Counter = Counter()
+        self.samples: Dict[str, ConditionClause] = {}
+
+    def track(self, condition_clause: ConditionClause):
+        shape = condition_clause_shape(condition_clause)
+        self.counter[shape] += 1
+        self.samples.setdefault(shape, condition_clause)
+        # NOTE(pjongy): Pruned at twice of max_shapes, so most_common is not sorted every call
+        if len(self.counter) > self.max_shapes * 2:
+            self.counter = Counter(dict(self.counter.most_common(self.max_shapes)))
+            self.samples = {shape: self.samples[shape] for shape in self.counter}
+
+    def most_common(self, size: int) -> List[Tuple[str, int, ConditionClause]]:
+        return [
+            (shape, count, self.samples[shape])
+            for shape, count in self.counter.most_common(size)
+        ]
@@ -0,0 +1,23 @@
+"""Gunicorn hooks of api server, loaded by `--config python:apiserver.gunicorn_config`
+
+Metrics of every worker process are aggregated by prometheus_client multiprocess mode,
+which needs its directory to be set before workers are forked
+"""
+import os
+import shutil
+
+PROMETHEUS_MULTIPROC_DIR = os.environ.get(
+    'PROMETHEUS_MULTIPROC_DIR', '/tmp/jraze_apiserver_prometheus')
+# NOTE(pjongy): prometheus-client 0.9 only reads lowercase name, workers inherit it from master
+os.environ['prometheus_multiproc_dir'] = PROMETHEUS_MULTIPROC_DIR
+
+
+def on_starting(server):
+    # NOTE(pjongy): Values of previous run should not be summed
+    shutil.rmtree(PROMETHEUS_MULTIPROC_DIR, ignore_errors=True)
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,51 @@
+import os
+import time
+
+from aiohttp import web
+from prometheus_client import CollectorRegistry, Histogram, generate_latest, multiprocess
+
+# NOTE(pjongy): Gunicorn workers share one port, so metrics of every worker are aggregated by
+#  multiprocess mode (see gunicorn_config.py) and each worker serves the same values
+HTTP_REQUEST_SECONDS = Histogram(
+    'jraze_http_request_seconds',
+    'API server request latency by route',
+    ['method', 'route', 'status'],
+)
+DB_CALL_SECONDS = Histogram(
+    'jraze_db_call_seconds',
+    'Latency of dispatcher and repository calls',
+    ['database', 'operation'],  # database: mongo or mysql
+)
+
+
+def generate_metrics() -> bytes:
+    if 'prometheus_multiproc_dir' not in os.environ:  # NOTE(pjongy): Single process run
+        return generate_latest()
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
+
+
+def metrics_middleware(prefix: str):
+    """Observes latency of sub application mounted on prefix, labeled by route template"""
+    @web.middleware
+    async def middleware(request, handler):
+        started_at = time.perf_counter()
+        status = 500
+        try:
+            response = await handler(request)
+            status = response.status
+            return response
+        except web.HTTPException as e:
+            status = e.status
+            raise
+        finally:
+            resource = request.match_info.route.resource
+            route = f'{prefix}{resource.canonical}' if resource is not None else 'unmatched'
+            HTTP_REQUEST_SECONDS.labels(
+                method=request.method,
+                route=route,
+                status=status,
+            ).observe(time.perf_counter() - started_at)
+    return middleware
@@ -2,11 +2,17 @@ from tortoise import fields
 from tortoise.models import Model
 
 
+class NotificationLogMode:
+    ROW = 'row'  # DeviceNotificationLog per device
+    BLOCK = 'block'  # DeviceNotificationLogBlock per upper bits of device id
+
+
 class DeviceNotificationLog(Model):
     class Meta:
         table = 'device_notification_log'
+        indexes = (('device_id', 'created_at', 'id'),)
 
-    id = fields.IntField(pk=True)
+    id = fields.BigIntField(pk=True)
     device = fields.ForeignKeyField('models.Device', related_name='device_notification_logs')
     notification = fields.ForeignKeyField(
         'models.Notification',
@@ -0,0 +1,23 @@
+from tortoise import fields
+from tortoise.models import Model
+
+
+class DeviceNotificationLogBlock(Model):
+    """Notified device ids of a notification sharing same upper bits (block_key) in one row
+
+    Used instead of DeviceNotificationLog if notification_log_mode is `block`
+    """
+
+    class Meta:
+        table = 'device_notification_log_block'
+        indexes = (('block_key', 'notification_id'),)
+
+    id = fields.BigIntField(pk=True)
+    notification = fields.ForeignKeyField(
+        'models.Notification',
+        related_name='device_notification_log_blocks'
+    )
+    block_key = fields.BigIntField()  # device id >> DEVICE_ID_BLOCK_SHIFT
+    devices = fields.IntField()  # amount of device ids in payload
+    payload = fields.BinaryField()  # encoded lower bits of device ids
+    created_at = fields.DatetimeField(null=True, auto_now_add=True)
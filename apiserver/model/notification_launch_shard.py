@@ -0,0 +1,24 @@
+from tortoise import fields
+from tortoise.models import Model
+
+from apiserver.model.mixin import TimestampMixin
+
+
+class NotificationLaunchShard(Model, TimestampMixin):
+    class Meta:
+        table = 'notification_launch_shard'
+        unique_together = (('notification', 'shard_index'),)
+
+    id = fields.IntField(pk=True)
+    notification = fields.ForeignKeyField(
+        'models.Notification',
+        related_name='launch_shards'
+    )
+    shard_index = fields.IntField()
+    bucket_start = fields.IntField()  # inclusive random_bucket range
+    bucket_end = fields.IntField()
+    devices = fields.IntField(default=0)
+    # NOTE(pjongy): Checkpoint, shard resumes after cursor of last processed page on re-run
+    cursor = fields.CharField(max_length=64, null=True)
+    pages = fields.IntField(default=0)
+    done = fields.BooleanField(default=False)
@@ -1,8 +1,10 @@
 from typing import List
 
-from tortoise import QuerySet
+from tortoise import QuerySet, Tortoise
 
+from apiserver.decorator.metrics import observe_db_call
 from apiserver.model.device import Device
+from common.util import utc_now
 
 
 def device_model_to_dict(row: Device):
@@ -17,6 +19,7 @@ def _device_relational_query_set(query_set: QuerySet[Device]) -> QuerySet[Device
     return query_set
 
 
+@observe_db_call('mysql')
 async def find_device_by_external_id(external_id: str) -> Device:
     return await _device_relational_query_set(
         Device.filter(
@@ -27,6 +30,7 @@ async def find_device_by_external_id(external_id: str) -> Device:
     ).first()
 
 
+@observe_db_call('mysql')
 async def find_devices_by_external_ids(external_ids: List[str]) -> List[Device]:
     query = _device_relational_query_set(
         Device.filter(
@@ -38,9 +42,27 @@ async def find_devices_by_external_ids(external_ids: List[str]) -> List[Device]:
     return await query.all()
 
 
+@observe_db_call('mysql')
 async def create_device(
     external_id: str,
 ) -> Device:
     return await Device.create(
         external_id=external_id,
     )
+
+
+@observe_db_call('mysql')
+async def create_devices_if_not_exist(
+    external_ids: List[str],
+) -> None:
+    # NOTE(pjongy): executemany is rewritten into single multi-row INSERT,
+    #  and already existing external_id is skipped by its unique key
+    created_at = utc_now()
+    await Tortoise.get_connection('default').execute_many(
+        f'INSERT IGNORE INTO `{Device._meta.db_table}` (`external_id`, `created_at`) '
+        f'VALUES (%s, %s)',
+        [
+            [external_id, created_at]
+            for external_id in external_ids
+        ],
+    )
@@ -1,10 +1,18 @@
-from typing import List
+import datetime
+from typing import List, Optional, Tuple
 
+from tortoise import Tortoise
 from tortoise.query_utils import Q
 
-from apiserver.repository.notification import notification_model_to_dict
+from apiserver.decorator.metrics import observe_db_call
+from apiserver.exception.repository import WrongParameterError
+from apiserver.repository.notification import notification_model_to_dict, \
+    notification_values_to_dict, NOTIFICATION_VALUE_FIELDS
 from apiserver.model.device import Device
 from apiserver.model.device_notification_log import DeviceNotificationLog
+from common.util import utc_now
+
+DEVICE_NOTIFICATION_LOG_INSERT_CHUNK_SIZE = 5000
 
 
 def device_notification_log_model_to_dict(row: DeviceNotificationLog):
@@ -16,38 +24,106 @@ def device_notification_log_model_to_dict(row: DeviceNotificationLog):
     return device_notification_log_dict
 
 
+def device_notification_log_values_to_dict(row: dict):
+    device_notification_log_dict = {
+        'id': row['id'],
+        'notification': notification_values_to_dict(row, prefix='notification__'),
+        'created_at': row['created_at'],
+    }
+    return device_notification_log_dict
+
+
+CURSOR_DATETIME_FORMAT = '%Y%m%d%H%M%S%f'
+
+
+def _encode_cursor(row: dict) -> str:
+    return f'{row["created_at"].strftime(CURSOR_DATETIME_FORMAT)}:{row["id"]}'
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime.datetime, int]:
+    try:
+        created_at, id_ = cursor.split(':')
+        return datetime.datetime.strptime(created_at, CURSOR_DATETIME_FORMAT), int(id_)
+    except ValueError:
+        raise WrongParameterError(f'malformed cursor {cursor}')
+
+
+def _device_notification_log_values_query(query_set):
+    # NOTE(pjongy): Notification columns are joined in same query instead of prefetch
+    return query_set.values(
+        'id',
+        'created_at',
+        *[f'notification__{field}' for field in NOTIFICATION_VALUE_FIELDS],
+    )
+
+
+@observe_db_call('mysql')
 async def find_notification_events_by_external_id(
     device: Device,
     start: int = 0,
     size: int = 10,
     order_bys: List[str] = (),
-):
-    filter_ = [
-        Q(device=device)
-    ]
+    with_total: bool = True,
+) -> Tuple[Optional[int], List[dict]]:
+    query_set = DeviceNotificationLog.filter(device_id=device.id)
+    order_bys = [order_by for order_by in order_bys if order_by.isascii()]
+    if order_bys:
+        query_set = query_set.order_by(*order_bys)
 
-    query_set = DeviceNotificationLog.filter(Q(*filter_)).prefetch_related(
-        'device', 'notification'
-    )
-    for order_by in order_bys:
-        if order_by.isascii():
-            query_set = query_set.order_by(order_by)
+    total = None
+    if with_total:
+        total = await query_set.count()
     return (
-        await query_set.count(),
-        await query_set.offset(start).limit(size).all()
+        total,
+        await _device_notification_log_values_query(query_set.offset(start).limit(size))
+    )
+
+
+@observe_db_call('mysql')
+async def find_notification_events_by_cursor(
+    device: Device,
+    cursor: Optional[str] = None,
+    size: int = 10,
+    with_total: bool = True,
+) -> Tuple[Optional[int], List[dict], Optional[str]]:
+    # NOTE(pjongy): Newest first on (device_id, created_at, id) index, every page is a range scan
+    query_set = DeviceNotificationLog.filter(device_id=device.id)
+
+    total = None
+    if with_total:
+        total = await query_set.count()
+
+    if cursor is not None:
+        created_at, id_ = _decode_cursor(cursor)
+        query_set = query_set.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=id_)
+        )
+
+    rows = await _device_notification_log_values_query(
+        query_set.order_by('-created_at', '-id').limit(size)
     )
+    next_cursor = None
+    if len(rows) == size:
+        next_cursor = _encode_cursor(rows[-1])
+    return total, rows, next_cursor
 
 
+@observe_db_call('mysql')
 async def add_device_notification_logs(
     device_ids: List[int],
     notification_id: int,
+    chunk_size: int = DEVICE_NOTIFICATION_LOG_INSERT_CHUNK_SIZE,
 ) -> None:
-    return await DeviceNotificationLog.bulk_create(
-        [
-            DeviceNotificationLog(
-                device_id=device_id,
-                notification_id=notification_id,
-            )
-            for device_id in device_ids
-        ]
+    # NOTE(pjongy): Plain tuples instead of model instances, executemany is rewritten
+    #  into multi-row INSERT per chunk so each chunk is one round trip and one short transaction
+    query = (
+        f'INSERT INTO `{DeviceNotificationLog._meta.db_table}` '
+        f'(`device_id`, `notification_id`, `created_at`) VALUES (%s, %s, %s)'
     )
+    created_at = utc_now()
+    connection = Tortoise.get_connection('default')
+    for offset in range(0, len(device_ids), chunk_size):
+        await connection.execute_many(query, [
+            [device_id, notification_id, created_at]
+            for device_id in device_ids[offset:offset + chunk_size]
+        ])
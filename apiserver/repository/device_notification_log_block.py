@@ -0,0 +1,262 @@
+import zlib
+from collections import defaultdict
+from typing import List, Dict, Iterable, Set, Tuple, Optional
+
+from tortoise import Tortoise
+from tortoise.transactions import in_transaction
+
+from apiserver.decorator.metrics import observe_db_call
+from apiserver.model.device import Device
+from apiserver.model.device_notification_log_block import DeviceNotificationLogBlock
+from apiserver.model.notification import Notification
+from apiserver.repository.notification import notification_model_to_dict
+from common.util import utc_now
+
+DEVICE_ID_BLOCK_SHIFT = 16
+DEVICE_ID_BLOCK_MASK = (1 << DEVICE_ID_BLOCK_SHIFT) - 1
+BITMAP_SIZE = (1 << DEVICE_ID_BLOCK_SHIFT) // 8
+
+ENCODING_DELTA = 0  # varint encoded gaps between sorted offsets, for sparse blocks
+ENCODING_BITMAP = 1  # bit per offset, for dense blocks
+
+# NOTE(pjongy): Launch pages are ordered by random_bucket so each page appends a few ids per block,
+#  blocks of same (notification, block_key) are merged in background once they are more than this
+COMPACTION_THRESHOLD = 16
+COMPACTION_INTERVAL_SECONDS = 10.0
+
+# NOTE(pjongy): Events are ordered by notification since blocks are merged by compaction
+ORDER_BY_FIELDS = {
+    'id': 'id',
+    'created_at': 'created_at',
+}
+
+# NOTE(pjongy): (notification_id, block_key) appended since last compaction in this process,
+#  blocks left by restart are still correct but not merged
+_compaction_candidates: Set[Tuple[int, int]] = set()
+
+
+def encode_device_id_block(offsets: Iterable[int]) -> bytes:
+    sorted_offsets = sorted(set(offsets))
+
+    delta = bytearray()
+    previous = -1
+    for offset in sorted_offsets:
+        gap = offset - previous - 1
+        previous = offset
+        while gap >= 0x80:
+            delta.append((gap & 0x7F) | 0x80)
+            gap >>= 7
+        delta.append(gap)
+
+    if len(delta) <= BITMAP_SIZE:
+        return bytes([ENCODING_DELTA]) + zlib.compress(bytes(delta))
+
+    bitmap = bytearray(BITMAP_SIZE)
+    for offset in sorted_offsets:
+        bitmap[offset >> 3] |= 1 << (offset & 7)
+    return bytes([ENCODING_BITMAP]) + zlib.compress(bytes(bitmap))
+
+
+def decode_device_id_block(payload: bytes) -> List[int]:
+    encoding, body = payload[0], zlib.decompress(payload[1:])
+    if encoding == ENCODING_BITMAP:
+        return [
+            (index << 3) + bit
+            for index, byte in enumerate(body) if byte
+            for bit in range(8) if byte & (1 << bit)
+        ]
+
+    offsets = []
+    previous = -1
+    gap = 0
+    shift = 0
+    for byte in body:
+        gap |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        previous += gap + 1
+        offsets.append(previous)
+        gap = 0
+        shift = 0
+    return offsets
+
+
+def device_id_block_contains(payload: bytes, offset: int) -> bool:
+    body = zlib.decompress(payload[1:])
+    if payload[0] == ENCODING_BITMAP:
+        return bool(body[offset >> 3] & (1 << (offset & 7)))
+
+    # NOTE(pjongy): Offsets are sorted, stops at first offset not less than target
+    previous = -1
+    gap = 0
+    shift = 0
+    for byte in body:
+        gap |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        previous += gap + 1
+        if previous >= offset:
+            return previous == offset
+        gap = 0
+        shift = 0
+    return False
+
+
+def device_notification_log_block_values_to_dict(values: dict):
+    device_notification_log_dict = {
+        'id': values['id'],
+        'notification': notification_model_to_dict(values['notification']),
+        'created_at': values['created_at'],
+    }
+    return device_notification_log_dict
+
+
+def _split_device_ids_by_block(device_ids: Iterable[int]) -> Dict[int, Set[int]]:
+    offsets_by_block_key = defaultdict(set)
+    for device_id in device_ids:
+        offsets_by_block_key[device_id >> DEVICE_ID_BLOCK_SHIFT].add(
+            device_id & DEVICE_ID_BLOCK_MASK
+        )
+    return offsets_by_block_key
+
+
+async def _compact_device_notification_log_block(notification_id: int, block_key: int):
+    # NOTE(pjongy): Rows are locked while decoding and encoding up to 65536 ids, so it runs in
+    #  background not to hold launch's log request
+    table = DeviceNotificationLogBlock._meta.db_table
+    async with in_transaction() as connection:
+        _, rows = await connection.execute_query(
+            f'SELECT `id`, `payload`, `created_at` FROM `{table}` '
+            f'WHERE `notification_id` = %s AND `block_key` = %s FOR UPDATE',
+            [notification_id, block_key],
+        )
+        if len(rows) <= COMPACTION_THRESHOLD:  # NOTE(pjongy): Already compacted by another
+            return
+
+        offsets = set()
+        for row in rows:
+            offsets.update(decode_device_id_block(row['payload']))
+
+        await connection.execute_query(
+            f'DELETE FROM `{table}` WHERE `id` IN ({", ".join(["%s"] * len(rows))})',
+            [row['id'] for row in rows],
+        )
+        await connection.execute_query(
+            f'INSERT INTO `{table}` '
+            f'(`notification_id`, `block_key`, `devices`, `payload`, `created_at`) '
+            f'VALUES (%s, %s, %s, %s, %s)',
+            [
+                notification_id,
+                block_key,
+                len(offsets),
+                encode_device_id_block(offsets),
+                min(row['created_at'] for row in rows),
+            ],
+        )
+
+
+@observe_db_call('mysql')
+async def add_device_notification_log_blocks(
+    device_ids: List[int],
+    notification_id: int,
+) -> None:
+    table = DeviceNotificationLogBlock._meta.db_table
+    offsets_by_block_key = _split_device_ids_by_block(device_ids)
+    if not offsets_by_block_key:
+        return
+
+    created_at = utc_now()
+    connection = Tortoise.get_connection('default')
+    await connection.execute_many(
+        f'INSERT INTO `{table}` '
+        f'(`notification_id`, `block_key`, `devices`, `payload`, `created_at`) '
+        f'VALUES (%s, %s, %s, %s, %s)',
+        [
+            [notification_id, block_key, len(offsets), encode_device_id_block(offsets), created_at]
+            for block_key, offsets in offsets_by_block_key.items()
+        ],
+    )
+    _compaction_candidates.update(
+        (notification_id, block_key) for block_key in offsets_by_block_key
+    )
+
+
+@observe_db_call('mysql')
+async def compact_device_notification_log_blocks() -> int:
+    """Merges blocks of (notification, block_key) appended since last call if they are more than
+    COMPACTION_THRESHOLD, returns merged (notification, block_key) amount"""
+    if not _compaction_candidates:
+        return 0
+
+    candidates = list(_compaction_candidates)
+    _compaction_candidates.clear()
+
+    table = DeviceNotificationLogBlock._meta.db_table
+    connection = Tortoise.get_connection('default')
+    try:
+        _, rows = await connection.execute_query(
+            f'SELECT `notification_id`, `block_key` FROM `{table}` '
+            f'WHERE (`notification_id`, `block_key`) IN '
+            f'({", ".join(["(%s, %s)"] * len(candidates))}) '
+            f'GROUP BY `notification_id`, `block_key` HAVING COUNT(*) > %s',
+            [value for candidate in candidates for value in candidate] + [COMPACTION_THRESHOLD],
+        )
+        for row in rows:
+            await _compact_device_notification_log_block(
+                notification_id=row['notification_id'],
+                block_key=row['block_key'],
+            )
+    except Exception:
+        _compaction_candidates.update(candidates)  # NOTE(pjongy): Retried on next call
+        raise
+    return len(rows)
+
+
+@observe_db_call('mysql')
+async def find_notification_events_in_blocks_by_external_id(
+    device: Device,
+    start: int = 0,
+    size: int = 10,
+    order_bys: List[str] = (),
+    with_total: bool = True,
+) -> Tuple[Optional[int], List[dict]]:
+    """Events are ordered by notification's columns of order_bys (id by default)"""
+    blocks = await DeviceNotificationLogBlock.filter(
+        block_key=device.id >> DEVICE_ID_BLOCK_SHIFT,
+    ).values_list('id', 'notification_id', 'created_at', 'payload')
+
+    # NOTE(pjongy): Only membership is tested for every block, notifications are fetched for
+    #  requested page only
+    offset = device.id & DEVICE_ID_BLOCK_MASK
+    matched_blocks = {}
+    for block_id, notification_id, created_at, payload in blocks:
+        if notification_id in matched_blocks:
+            continue
+        if device_id_block_contains(payload, offset):
+            matched_blocks[notification_id] = (block_id, created_at)
+
+    total = len(matched_blocks) if with_total else None
+    if not matched_blocks:
+        return total, []
+
+    notification_order_bys = []
+    for order_by in order_bys:
+        direction = '-' if order_by.startswith('-') else ''
+        field = ORDER_BY_FIELDS.get(order_by.lstrip('-'))
+        if field is not None:
+            notification_order_bys.append(f'{direction}{field}')
+    notifications = await Notification.filter(
+        id__in=list(matched_blocks.keys()),
+    ).order_by(*(notification_order_bys or ['id'])).offset(start).limit(size)
+
+    events = []
+    for notification in notifications:
+        block_id, created_at = matched_blocks[notification.id]
+        events.append({
+            'id': block_id,
+            'notification': notification,
+            'created_at': created_at,
+        })
+    return total, events
@@ -1,3 +1,4 @@
+import copy
 import datetime
 import uuid
 from typing import List, Tuple
@@ -5,9 +6,16 @@ from typing import List, Tuple
 from tortoise.expressions import F
 from tortoise.query_utils import Q
 
+from apiserver.decorator.metrics import observe_db_call
 from apiserver.model.notification import Notification, NotificationStatus
+from common.cache import LRUCache
 from common.util import utc_now
 
+# NOTE(pjongy): Keyed by uuid string, configured by api server on start. It is per process and can
+#  be stale, so only read paths use it (find_cached_notification_by_id) and a cached instance is
+#  copied so mutation of returned one does not leak
+notification_cache = LRUCache()
+
 
 def notification_model_to_dict(row: Notification):
     notification_dict = {
@@ -31,6 +39,36 @@ def notification_model_to_dict(row: Notification):
     return notification_dict
 
 
+NOTIFICATION_VALUE_FIELDS = (
+    'id', 'uuid', 'title', 'body', 'sent_android', 'sent_ios', 'deep_link', 'image_url',
+    'icon_url', 'conditions', 'status', 'scheduled_at', 'created_at', 'modified_at',
+)
+
+
+def notification_values_to_dict(row: dict, prefix: str = ''):
+    """Same as notification_model_to_dict for `values()` of NOTIFICATION_VALUE_FIELDS"""
+    notification_dict = {
+        'id': row[f'{prefix}id'],
+        'uuid': row[f'{prefix}uuid'],
+        'title': row[f'{prefix}title'],
+        'body': row[f'{prefix}body'],
+        'sent': {
+            'android': row[f'{prefix}sent_android'],
+            'ios': row[f'{prefix}sent_ios'],
+        },
+        'deep_link': row[f'{prefix}deep_link'],
+        'image_url': row[f'{prefix}image_url'],
+        'icon_url': row[f'{prefix}icon_url'],
+        'conditions': row[f'{prefix}conditions'],
+        'status': row[f'{prefix}status'],
+        'scheduled_at': row[f'{prefix}scheduled_at'],
+        'created_at': row[f'{prefix}created_at'],
+        'modified_at': row[f'{prefix}modified_at'],
+    }
+    return notification_dict
+
+
+@observe_db_call('mysql')
 async def find_notifications_by_status(
     status: NotificationStatus = None,
     start: int = 0,
@@ -51,6 +89,7 @@ async def find_notifications_by_status(
     )
 
 
+@observe_db_call('mysql')
 async def find_launched_notification(
     current_datetime: datetime.datetime,
     start: int = 0,
@@ -67,12 +106,33 @@ async def find_launched_notification(
     )
 
 
+@observe_db_call('mysql')
 async def find_notification_by_id(uuid: str) -> Notification:
     return await Notification.filter(
         uuid=uuid
     ).first()
 
 
+async def find_cached_notification_by_id(uuid: str) -> Notification:
+    """Same as find_notification_by_id but may be stale, never save returned one"""
+    notification = notification_cache.get(str(uuid))
+    if notification is not None:
+        return copy.copy(notification)
+
+    notification = await find_notification_by_id(uuid=uuid)
+    if notification is not None:
+        notification_cache.set(str(uuid), copy.copy(notification))
+    return notification
+
+
+@observe_db_call('mysql')
+async def find_notifications_by_ids(uuids: List[str]) -> List[Notification]:
+    return await Notification.filter(
+        uuid__in=uuids
+    ).all()
+
+
+@observe_db_call('mysql')
 async def create_notification(
     title: str,
     body: str,
@@ -98,37 +158,52 @@ async def create_notification(
     )
 
 
+@observe_db_call('mysql')
 async def update_notification(
     target_notification: Notification,
     **kwargs
 ) -> Notification:
     available_fields = ['title', 'body', 'icon_url', 'image_url', 'deep_link', 'scheduled_at']
-    for k, v in kwargs.items():
-        if k in available_fields and v is not None:
-            setattr(target_notification, k, v)
-    target_notification.modified_at = utc_now()
-    await target_notification.save()
+    # NOTE(pjongy): Only changed columns are written, others (e.g. sent_ios, sent_android which
+    #  are increased by F() concurrently) are never written back from this instance
+    update_fields = ['modified_at']
+    try:
+        for k, v in kwargs.items():
+            if k in available_fields and v is not None:
+                setattr(target_notification, k, v)
+                update_fields.append(k)
+        target_notification.modified_at = utc_now()
+        await target_notification.save(update_fields=update_fields)
+    finally:
+        notification_cache.invalidate(str(target_notification.uuid))
     return target_notification
 
 
+@observe_db_call('mysql')
 async def change_notification_status(
     target_notification: Notification,
     status: NotificationStatus
 ) -> Notification:
-    target_notification.status = status
-    target_notification.modified_at = utc_now()
-    await target_notification.save()
+    try:
+        target_notification.status = status
+        target_notification.modified_at = utc_now()
+        await target_notification.save(update_fields=['status', 'modified_at'])
+    finally:
+        notification_cache.invalidate(str(target_notification.uuid))
     return target_notification
 
 
+@observe_db_call('mysql')
 async def increase_sent_count(
     uuid_: str,
     sent_ios: int = 0,
     sent_android: int = 0,
 ) -> int:
-    return await Notification.filter(
+    updated = await Notification.filter(
         uuid=uuid_
     ).update(
         sent_ios=F('sent_ios') + sent_ios,
         sent_android=F('sent_android') + sent_android,
     )
+    notification_cache.invalidate(str(uuid_))
+    return updated
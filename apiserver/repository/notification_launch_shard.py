@@ -0,0 +1,77 @@
+from typing import List, Optional
+
+from apiserver.decorator.metrics import observe_db_call
+from apiserver.model.notification import Notification
+from apiserver.model.notification_launch_shard import NotificationLaunchShard
+from common.util import utc_now
+
+
+def notification_launch_shard_model_to_dict(row: NotificationLaunchShard):
+    notification_launch_shard_dict = {
+        'shard_index': row.shard_index,
+        'bucket_start': row.bucket_start,
+        'bucket_end': row.bucket_end,
+        'devices': row.devices,
+        'cursor': row.cursor,
+        'pages': row.pages,
+        'done': row.done,
+        'created_at': row.created_at,
+        'modified_at': row.modified_at,
+    }
+    return notification_launch_shard_dict
+
+
+@observe_db_call('mysql')
+async def find_launch_shards_by_notification(
+    notification: Notification,
+) -> List[NotificationLaunchShard]:
+    return await NotificationLaunchShard.filter(
+        notification=notification,
+    ).order_by('shard_index').all()
+
+
+@observe_db_call('mysql')
+async def register_launch_shard(
+    notification: Notification,
+    shard_index: int,
+    bucket_start: int,
+    bucket_end: int,
+) -> NotificationLaunchShard:
+    """Creates shard if not exists, existing shard keeps its progress to be resumed"""
+    launch_shard, _ = await NotificationLaunchShard.get_or_create(
+        notification=notification,
+        shard_index=shard_index,
+        defaults={
+            'bucket_start': bucket_start,
+            'bucket_end': bucket_end,
+        },
+    )
+    return launch_shard
+
+
+@observe_db_call('mysql')
+async def upsert_launch_shard_progress(
+    notification: Notification,
+    shard_index: int,
+    bucket_start: int,
+    bucket_end: int,
+    devices: int,
+    done: bool,
+    cursor: Optional[str] = None,
+    pages: int = 0,
+) -> NotificationLaunchShard:
+    launch_shard, _ = await NotificationLaunchShard.get_or_create(
+        notification=notification,
+        shard_index=shard_index,
+        defaults={
+            'bucket_start': bucket_start,
+            'bucket_end': bucket_end,
+        },
+    )
+    launch_shard.devices = devices
+    launch_shard.cursor = cursor
+    launch_shard.pages = pages
+    launch_shard.done = done
+    launch_shard.modified_at = utc_now()
+    await launch_shard.save()
+    return launch_shard
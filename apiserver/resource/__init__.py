@@ -1,10 +1,12 @@
-import json
+import asyncio
+from typing import AsyncIterator, Optional
 
 import deserialize
-from aiohttp import web
+from aiohttp import StreamReader, web
+from aiohttp.web_request import Request
 
 from apiserver.exception.request import IncompleteParameterError, TypeConvertError
-from common.json_encoder import ManualJSONEncoder
+from common.json_encoder import json_dumps_bytes
 from common.logger.logger import get_logger
 
 logger = get_logger(__name__)
@@ -30,13 +32,87 @@ def json_response(
     }
 
     return web.Response(
-        body=json.dumps(response, cls=ManualJSONEncoder),
+        body=json_dumps_bytes(response),
         content_type='application/json',
         status=status,
         headers=headers,
     )
 
 
+async def ndjson_stream_response(
+    request: Request,
+    rows: AsyncIterator[dict],
+    chunk_size: int = 100,
+    status=200,
+) -> web.StreamResponse:
+    response = web.StreamResponse(
+        status=status,
+        headers={'Content-Type': 'application/x-ndjson'},
+    )
+    await response.prepare(request)
+
+    lines = []
+    try:
+        async for row in rows:
+            lines.append(json_dumps_bytes(row))
+            if len(lines) >= chunk_size:
+                await response.write(b'\n'.join(lines) + b'\n')
+                lines = []
+        if lines:
+            await response.write(b'\n'.join(lines) + b'\n')
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        # NOTE(pjongy): Status is already sent, so error handler can not respond. Last line tells
+        #  client that rows are incomplete
+        logger.exception('ndjson stream aborted')
+        try:
+            await response.write(json_dumps_bytes({'error': 'stream aborted'}) + b'\n')
+        except Exception:
+            logger.exception('ndjson stream error line write failed')
+            return response
+
+    await response.write_eof()
+    return response
+
+
+async def iter_ndjson_lines(
+    content: StreamReader,
+    max_line_bytes: int,
+) -> AsyncIterator[Optional[bytes]]:
+    """Lines of NDJSON body without newline, None for line longer than max_line_bytes
+
+    NOTE(pjongy): StreamReader's own line iteration raises on line over its buffer limit and
+     leaves rest of the line in stream, so lines are split from chunks here
+    """
+    buffer = bytearray()
+    too_long = False
+    async for chunk in content.iter_any():
+        start = 0
+        end = chunk.find(b'\n')
+        while end >= 0:
+            if too_long or len(buffer) + end - start > max_line_bytes:
+                yield None
+            else:
+                buffer.extend(chunk[start:end])
+                yield bytes(buffer)
+            buffer.clear()
+            too_long = False
+            start = end + 1
+            end = chunk.find(b'\n', start)
+
+        if not too_long:
+            buffer.extend(chunk[start:])
+            if len(buffer) > max_line_bytes:  # NOTE(pjongy): Skipped until next newline
+                buffer.clear()
+                too_long = True
+
+    if too_long:
+        yield None
+    elif buffer:
+        yield bytes(buffer)
+
+
 def convert_request(class_, dict_):
     try:
         return deserialize.deserialize(
@@ -1,16 +1,25 @@
 import dataclasses
-from typing import List
+import json
+import time
+from typing import List, Optional, Dict
 
 import deserialize
 
 from apiserver.decorator.request import request_error_handler
 from apiserver.dispatcher.device import DeviceDispatcher, DevicePropertyValue, DevicePlatform, \
-    SendPlatform
+    SendPlatform, DeviceUpsert, device_to_dict
+from apiserver.exception.repository import WrongParameterError
+from apiserver.exception.request import RequestError
 from apiserver.model.device import Device
-from apiserver.repository.device import find_device_by_external_id, create_device
+from apiserver.model.device_notification_log import NotificationLogMode
+from apiserver.repository.device import find_device_by_external_id, create_device, \
+    create_devices_if_not_exist, find_devices_by_external_ids
 from apiserver.repository.device_notification_log import find_notification_events_by_external_id, \
-    device_notification_log_model_to_dict
-from apiserver.resource import json_response, convert_request
+    device_notification_log_values_to_dict, find_notification_events_by_cursor
+from apiserver.repository.device_notification_log_block import \
+    find_notification_events_in_blocks_by_external_id, device_notification_log_block_values_to_dict
+from apiserver.resource import json_response, convert_request, ndjson_stream_response, \
+    iter_ndjson_lines
 from apiserver.resource.abstract import AbstractResource
 from common.logger.logger import get_logger
 from common.structure.condition import ConditionClause
@@ -27,6 +36,17 @@ class UpdateDeviceRequest:
     device_platform: DevicePlatform
 
 
+MAX_IMPORT_BATCH_SIZE = 5000
+MAX_IMPORT_REPORTED_ERRORS = 1000
+MAX_IMPORT_LINE_BYTES = 1024 * 1024
+
+
+@deserialize.default('batch_size', 1000)
+@deserialize.parser('batch_size', int)
+class ImportDevicesRequest:
+    batch_size: int
+
+
 class DevicePropertyObject:
     key: str
     value: DevicePropertyValue
@@ -36,40 +56,93 @@ class AddDevicePropertiesRequest:
     properties: List[DevicePropertyObject]
 
 
+class DevicePropertiesObject:
+    external_id: str
+    properties: List[DevicePropertyObject]
+
+
+class BulkAddDevicePropertiesRequest:
+    devices: List[DevicePropertiesObject]
+
+
 class DeleteDevicePropertiesRequest:
     properties: List[DevicePropertyObject]
 
 
+class SearchPaging:
+    OFFSET = 'offset'
+    CURSOR = 'cursor'
+    STREAM = 'stream'
+
+
 @deserialize.default('start', 0)
 @deserialize.default('size', 10)
 @deserialize.default('order_bys', [])
+@deserialize.default('paging', SearchPaging.OFFSET)
+@deserialize.default('with_total', True)
 @deserialize.parser('order_bys', lambda arg: arg.split(','))  # comma separated string to list
 @deserialize.parser('start', int)
 @deserialize.parser('size', int)
+@deserialize.parser('with_total', lambda arg: str(arg).lower() == 'true')
 class FetchDeviceNotificationEventsRequest:
     start: int
     size: int
     order_bys: List[str]
+    # offset: start/size/order_bys, cursor: cursor/size newest first (row log mode only)
+    paging: str
+    cursor: Optional[str]
+    with_total: bool
 
 
 @deserialize.parser('start', int)
 @deserialize.parser('size', int)
+@deserialize.default('start', 0)
+@deserialize.default('size', 10)
 @deserialize.default('external_ids', [])
 @deserialize.default('conditions', {})
 @deserialize.default('order_bys', [])
+@deserialize.default('paging', SearchPaging.OFFSET)
+@deserialize.default('with_total', True)
+@deserialize.default('sendable_only', False)
 class SearchDevicesRequest:
     external_ids: List[str]
     conditions: dict
     start: int
     size: int
     order_bys: List[str]
+    # offset: start/size/order_bys, cursor: cursor/size (order_bys ignored)
+    # stream: NDJSON of every matched device after cursor (start/size/order_bys ignored)
+    paging: str
+    cursor: Optional[str]
+    random_bucket_range: Optional[List[int]]  # [start, end] inclusive, cursor/stream paging only
+    with_total: bool  # count_documents costs as much as search itself, skip if not needed
+    sendable_only: bool  # excludes devices whose push_token is pruned
+
+
+MIN_ESTIMATE_SAMPLE_RATIO = 0.0001  # NOTE(pjongy): Single random_bucket
+
+
+@deserialize.default('conditions', {})
+@deserialize.default('sample_ratio', 0.01)
+@deserialize.default('min_sampled', 100)
+@deserialize.parser('sample_ratio', float)
+@deserialize.parser('min_sampled', int)
+class EstimateDevicesRequest:
+    conditions: dict
+    sample_ratio: float  # ratio of random_bucket range to count, (0, 1]
+    min_sampled: int  # exact count is used if sampled devices are less than this
 
 
 class DevicesHttpResource(AbstractResource):
-    def __init__(self, device_dispatcher: DeviceDispatcher):
+    def __init__(
+        self,
+        device_dispatcher: DeviceDispatcher,
+        notification_log_mode: str = NotificationLogMode.ROW,
+    ):
         super().__init__(logger=logger)
         self.router = self.app.router
         self.device_dispatcher = device_dispatcher
+        self.notification_log_mode = notification_log_mode
 
     def route(self):
         self.router.add_route('PUT', '', self.upsert_device)
@@ -80,6 +153,10 @@ class DevicesHttpResource(AbstractResource):
             self.get_notification_events
         )
         self.router.add_route('POST', '/-/:search', self.search_devices)
+        self.router.add_route('POST', '/-/:estimate', self.estimate_devices)
+        self.router.add_route('POST', '/-/:import', self.import_devices)
+        # NOTE(pjongy): Should be added before /{external_id}/... routes not to be matched as '-'
+        self.router.add_route('POST', '/-/properties/:add', self.bulk_add_properties)
         self.router.add_route('POST', '/{external_id}/properties/:add', self.add_properties)
 
     @request_error_handler
@@ -90,34 +167,116 @@ class DevicesHttpResource(AbstractResource):
         if device is None:
             return json_response(reason=f'invalid external_id {external_id}', status=404)
 
-        return json_response(result=dataclasses.asdict(device))
+        return json_response(result=device_to_dict(device))
 
     @request_error_handler
-    async def search_devices(self, request):
-        request: SearchDevicesRequest = convert_request(SearchDevicesRequest, await request.json())
+    async def estimate_devices(self, request):
+        request_body: EstimateDevicesRequest = convert_request(
+            EstimateDevicesRequest, await request.json())
 
         try:
             conditions: ConditionClause = deserialize.deserialize(
-                ConditionClause, request.conditions)
+                ConditionClause, request_body.conditions)
         except deserialize.exceptions.DeserializeException as error:
             return json_response(reason=f'wrong condition clause {error}', status=400)
 
-        total = await self.device_dispatcher.get_device_total_by_condition(
-            external_ids=request.external_ids,
+        if not MIN_ESTIMATE_SAMPLE_RATIO <= request_body.sample_ratio <= 1:
+            return json_response(
+                reason=f'sample_ratio should be in [{MIN_ESTIMATE_SAMPLE_RATIO}, 1]', status=400)
+
+        estimate = await self.device_dispatcher.estimate_device_total_by_condition(
             condition_clause=conditions,
+            sample_ratio=request_body.sample_ratio,
+            min_sampled=request_body.min_sampled,
         )
+        return json_response(result=dataclasses.asdict(estimate))
+
+    @request_error_handler
+    async def search_devices(self, request):
+        request_body: SearchDevicesRequest = convert_request(
+            SearchDevicesRequest, await request.json())
+
+        try:
+            conditions: ConditionClause = deserialize.deserialize(
+                ConditionClause, request_body.conditions)
+        except deserialize.exceptions.DeserializeException as error:
+            return json_response(reason=f'wrong condition clause {error}', status=400)
+
+        available_pagings = {SearchPaging.OFFSET, SearchPaging.CURSOR, SearchPaging.STREAM}
+        if request_body.paging not in available_pagings:
+            return json_response(reason=f'unknown paging {request_body.paging}', status=400)
+
+        random_bucket_range = None
+        if request_body.random_bucket_range is not None:
+            if request_body.paging == SearchPaging.OFFSET:
+                return json_response(
+                    reason='random_bucket_range is not available with offset paging', status=400)
+            if len(request_body.random_bucket_range) != 2:
+                return json_response(
+                    reason='random_bucket_range should be [start, end]', status=400)
+            random_bucket_range = tuple(request_body.random_bucket_range)
+
+        if request_body.paging == SearchPaging.STREAM:
+            try:
+                devices = self.device_dispatcher.iterate_devices(
+                    external_ids=request_body.external_ids,
+                    condition_clause=conditions,
+                    cursor=request_body.cursor,
+                    random_bucket_range=random_bucket_range,
+                    sendable_only=request_body.sendable_only,
+                )
+            except WrongParameterError as error:
+                return json_response(reason=f'wrong cursor {error}', status=400)
+
+            return await ndjson_stream_response(
+                request=request,
+                rows=(device_to_dict(device) async for device in devices),
+            )
+
+        total = None
+        if request_body.with_total:
+            total = await self.device_dispatcher.get_device_total_by_condition(
+                external_ids=request_body.external_ids,
+                condition_clause=conditions,
+                random_bucket_range=random_bucket_range,
+                sendable_only=request_body.sendable_only,
+            )
+
+        if request_body.paging == SearchPaging.CURSOR:
+            try:
+                devices, next_cursor = await self.device_dispatcher.search_devices_by_cursor(
+                    external_ids=request_body.external_ids,
+                    condition_clause=conditions,
+                    cursor=request_body.cursor,
+                    size=request_body.size,
+                    random_bucket_range=random_bucket_range,
+                    sendable_only=request_body.sendable_only,
+                )
+            except WrongParameterError as error:
+                return json_response(reason=f'wrong cursor {error}', status=400)
+
+            return json_response(result={
+                'total': total,
+                'devices': [
+                    device_to_dict(device)
+                    for device in devices
+                ],
+                'next_cursor': next_cursor,
+            })
+
         devices = await self.device_dispatcher.search_devices(
-            external_ids=request.external_ids,
+            external_ids=request_body.external_ids,
             condition_clause=conditions,
-            start=request.start,
-            size=request.size,
-            order_bys=request.order_bys,
+            start=request_body.start,
+            size=request_body.size,
+            order_bys=request_body.order_bys,
+            sendable_only=request_body.sendable_only,
         )
 
         return json_response(result={
             'total': total,
             'devices': [
-                dataclasses.asdict(device)
+                device_to_dict(device)
                 for device in devices
             ]
         })
@@ -143,6 +302,97 @@ class DevicesHttpResource(AbstractResource):
         )
         return json_response(result=dataclasses.asdict(result))
 
+    async def _import_device_batch(
+        self,
+        batch: Dict[str, UpdateDeviceRequest],
+    ) -> Dict[str, str]:
+        await create_devices_if_not_exist(external_ids=list(batch.keys()))
+        rdb_pks = {
+            device.external_id: device.id
+            for device in await find_devices_by_external_ids(external_ids=list(batch.keys()))
+        }
+
+        failed = {}
+        devices = []
+        for external_id, row in batch.items():
+            if external_id not in rdb_pks:
+                failed[external_id] = 'device is not created'
+                continue
+            devices.append(DeviceUpsert(
+                rdb_pk=rdb_pks[external_id],
+                external_id=external_id,
+                push_token=row.push_token,
+                send_platform=row.send_platform,
+                device_platform=row.device_platform,
+            ))
+
+        result = await self.device_dispatcher.bulk_upsert_devices_by_external_id(devices=devices)
+        failed.update(result.failed)
+        return failed
+
+    @request_error_handler
+    async def import_devices(self, request):
+        query_params: ImportDevicesRequest = convert_request(
+            ImportDevicesRequest,
+            dict(request.rel_url.query),
+        )
+        if not 0 < query_params.batch_size <= MAX_IMPORT_BATCH_SIZE:
+            return json_response(
+                reason=f'batch_size should be in 1 to {MAX_IMPORT_BATCH_SIZE}', status=400)
+
+        started_at = time.monotonic()
+        lines = 0
+        imported = 0
+        errors = []
+        # NOTE(pjongy): Same external_id in a batch is merged into the last line
+        batch: Dict[str, UpdateDeviceRequest] = {}
+        line_numbers: Dict[str, int] = {}
+
+        async def flush():
+            nonlocal imported
+            failed = await self._import_device_batch(batch=batch)
+            imported += len(batch) - len(failed)
+            for external_id, reason in failed.items():
+                errors.append({'line': line_numbers[external_id], 'reason': reason})
+            batch.clear()
+            line_numbers.clear()
+
+        # NOTE(pjongy): Body is read line by line, so it is never held in memory as a whole
+        async for line in iter_ndjson_lines(request.content, max_line_bytes=MAX_IMPORT_LINE_BYTES):
+            lines += 1
+            if line is None:
+                errors.append({
+                    'line': lines, 'reason': f'Line is longer than {MAX_IMPORT_LINE_BYTES} bytes',
+                })
+                continue
+            if not line.strip():
+                continue
+
+            try:
+                row: UpdateDeviceRequest = convert_request(UpdateDeviceRequest, json.loads(line))
+            # NOTE(pjongy): ValueError covers JSONDecodeError and UnicodeDecodeError (non UTF-8)
+            except (ValueError, RequestError) as error:
+                errors.append({'line': lines, 'reason': str(error) or 'Not JSON type'})
+                continue
+
+            batch[row.external_id] = row
+            line_numbers[row.external_id] = lines
+            if len(batch) >= query_params.batch_size:
+                await flush()
+
+        if batch:
+            await flush()
+
+        elapsed_seconds = time.monotonic() - started_at
+        return json_response(result={
+            'lines': lines,
+            'imported': imported,
+            'failed': len(errors),
+            'errors': errors[:MAX_IMPORT_REPORTED_ERRORS],
+            'elapsed_seconds': elapsed_seconds,
+            'devices_per_second': imported / elapsed_seconds if elapsed_seconds else 0.0,
+        })
+
     @request_error_handler
     async def add_properties(self, request):
         external_id = request.match_info['external_id']
@@ -150,19 +400,35 @@ class DevicesHttpResource(AbstractResource):
             AddDevicePropertiesRequest,
             await request.json()
         )
-        target_device = await find_device_by_external_id(external_id=external_id)
+        result = await self.device_dispatcher.upsert_properties_by_external_id(
+            external_id=external_id,
+            properties={
+                property_.key: property_.value
+                for property_ in request.properties
+            },
+        )
 
-        if target_device is None:
+        if result is None:
             return json_response(reason=f'invalid external_id {external_id}', status=404)
 
-        result = None
-        for property_ in request.properties:
-            result = await self.device_dispatcher.upsert_property_by_external_id(
-                external_id=external_id,
-                property_key=property_.key,
-                property_value=property_.value,
-            )
+        return json_response(result=dataclasses.asdict(result))
 
+    @request_error_handler
+    async def bulk_add_properties(self, request):
+        request: BulkAddDevicePropertiesRequest = convert_request(
+            BulkAddDevicePropertiesRequest,
+            await request.json()
+        )
+
+        properties_by_external_id = {}
+        for device in request.devices:
+            properties = properties_by_external_id.setdefault(device.external_id, {})
+            for property_ in device.properties:
+                properties[property_.key] = property_.value
+
+        result = await self.device_dispatcher.bulk_upsert_properties_by_external_id(
+            properties_by_external_id=properties_by_external_id,
+        )
         return json_response(result=dataclasses.asdict(result))
 
     @request_error_handler
@@ -182,17 +448,54 @@ class DevicesHttpResource(AbstractResource):
         if device is None:
             return json_response(reason=f'invalid external_id {external_id}', status=404)
 
-        total, events = await find_notification_events_by_external_id(
-            device=device,
-            start=query_params.start,
-            size=query_params.size,
-            order_bys=list(available_order_by_fields.intersection(query_params.order_bys)),
-        )
+        if query_params.paging == SearchPaging.CURSOR:
+            if self.notification_log_mode == NotificationLogMode.BLOCK:
+                return json_response(
+                    reason='cursor paging is not available for block log mode', status=400)
+
+            try:
+                total, events, next_cursor = await find_notification_events_by_cursor(
+                    device=device,
+                    cursor=query_params.cursor,
+                    size=query_params.size,
+                    with_total=query_params.with_total,
+                )
+            except WrongParameterError as error:
+                return json_response(reason=f'wrong cursor {error}', status=400)
+
+            return json_response(result={
+                'total': total,
+                'events': [
+                    device_notification_log_values_to_dict(event)
+                    for event in events
+                ],
+                'next_cursor': next_cursor,
+            })
+
+        if query_params.paging != SearchPaging.OFFSET:
+            return json_response(reason=f'invalid paging {query_params.paging}', status=400)
+
+        order_bys = list(available_order_by_fields.intersection(query_params.order_bys))
+        if self.notification_log_mode == NotificationLogMode.BLOCK:
+            total, rows = await find_notification_events_in_blocks_by_external_id(
+                device=device,
+                start=query_params.start,
+                size=query_params.size,
+                order_bys=order_bys,
+                with_total=query_params.with_total,
+            )
+            events = [device_notification_log_block_values_to_dict(row) for row in rows]
+        else:
+            total, rows = await find_notification_events_by_external_id(
+                device=device,
+                start=query_params.start,
+                size=query_params.size,
+                order_bys=order_bys,
+                with_total=query_params.with_total,
+            )
+            events = [device_notification_log_values_to_dict(row) for row in rows]
 
         return json_response(result={
             'total': total,
-            'events': [
-                device_notification_log_model_to_dict(event)
-                for event in events
-            ]
+            'events': events,
         })
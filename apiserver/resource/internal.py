@@ -1,16 +1,27 @@
-from typing import List
+from typing import List, Optional
 
+import deserialize
+from aiohttp import web
 from aiohttp.web_request import Request
+from prometheus_client import CONTENT_TYPE_LATEST
 
 from apiserver.decorator.internal import restrict_external_request_handler
 from apiserver.decorator.request import request_error_handler
+from apiserver.dispatcher.device import DeviceDispatcher
 from apiserver.exception.permission import ServerKeyError
+from apiserver.metrics import generate_metrics
+from apiserver.model.device_notification_log import NotificationLogMode
 from apiserver.repository.device_notification_log import add_device_notification_logs
+from apiserver.repository.device_notification_log_block import add_device_notification_log_blocks
 from apiserver.repository.notification import increase_sent_count, change_notification_status, \
-    find_notification_by_id
+    find_notification_by_id, find_cached_notification_by_id, find_notifications_by_ids, \
+    notification_cache
+from apiserver.repository.notification_launch_shard import upsert_launch_shard_progress, \
+    notification_launch_shard_model_to_dict, register_launch_shard
 from apiserver.resource import json_response, convert_request
 from apiserver.resource.abstract import AbstractResource
 from common.logger.logger import get_logger
+from common.structure.condition import ConditionClause
 from apiserver.model.notification import NotificationStatus
 
 logger = get_logger(__name__)
@@ -26,14 +37,64 @@ class IncreaseNotificationSentAmountRequest:
     android: int
 
 
+class NotificationSentAmountObject:
+    uuid: str
+    ios: int
+    android: int
+
+
+class IncreaseNotificationsSentAmountRequest:
+    notifications: List[NotificationSentAmountObject]
+
+
+class PrunePushTokensRequest:
+    push_tokens: List[str]
+
+
+class RegisterLaunchShardRequest:
+    bucket_start: int
+    bucket_end: int
+
+
+@deserialize.default('pages', 0)
+class UpdateLaunchShardProgressRequest:
+    bucket_start: int
+    bucket_end: int
+    devices: int
+    done: bool
+    cursor: Optional[str]  # next_cursor of last processed page
+    pages: int
+
+
+class ExplainDeviceConditionRequest:
+    conditions: ConditionClause
+
+
+@deserialize.default('size', 10)
+@deserialize.parser('size', int)
+class AdviseDeviceIndexesRequest:
+    size: int
+
+
 class InternalHttpResource(AbstractResource):
-    def __init__(self, internal_api_keys: List[str]):
+    def __init__(
+        self,
+        internal_api_keys: List[str],
+        device_dispatcher: DeviceDispatcher,
+        notification_log_mode: str = NotificationLogMode.ROW,
+    ):
         super().__init__(logger=logger)
         self.router = self.app.router
         self.internal_api_keys = internal_api_keys
+        self.device_dispatcher = device_dispatcher
+        self.notification_log_mode = notification_log_mode
 
     def _check_server_key(self, request: Request):
         x_server_key = request.headers.get('X-Server-Key')
+        # NOTE(pjongy): Prometheus scrape config can set only authorization header
+        authorization = request.headers.get('Authorization', '')
+        if x_server_key is None and authorization.startswith('Bearer '):
+            x_server_key = authorization[len('Bearer '):]
         if x_server_key not in self.internal_api_keys:
             raise ServerKeyError()
 
@@ -43,6 +104,19 @@ class InternalHttpResource(AbstractResource):
         self.router.add_route(
             'POST', '/notifications/{notification_uuid}/sent:increase',
             self.increase_notification_sent_result)
+        self.router.add_route(
+            'POST', '/notifications/-/sent:increase', self.increase_notifications_sent_result)
+        self.router.add_route(
+            'POST', '/notifications/{notification_uuid}/launch/shards/{shard_index}:register',
+            self.register_launch_shard)
+        self.router.add_route(
+            'POST', '/notifications/{notification_uuid}/launch/shards/{shard_index}:progress',
+            self.update_launch_shard_progress)
+        self.router.add_route('POST', '/devices/-/push_tokens:prune', self.prune_push_tokens)
+        self.router.add_route('POST', '/devices/-/:explain', self.explain_device_condition)
+        self.router.add_route('GET', '/devices/-/indexes:advise', self.advise_device_indexes)
+        self.router.add_route('GET', '/caches', self.get_cache_stats)
+        self.router.add_route('GET', '/metrics', self.get_metrics)
 
     @request_error_handler
     @restrict_external_request_handler
@@ -52,7 +126,12 @@ class InternalHttpResource(AbstractResource):
         request_body: CreateDeviceNotificationLogRequest = convert_request(
             CreateDeviceNotificationLogRequest, await request.json())
 
-        await add_device_notification_logs(
+        if self.notification_log_mode == NotificationLogMode.BLOCK:
+            add_logs = add_device_notification_log_blocks
+        else:
+            add_logs = add_device_notification_logs
+
+        await add_logs(
             device_ids=request_body.device_ids,
             notification_id=request_body.notification_id,
         )
@@ -87,3 +166,162 @@ class InternalHttpResource(AbstractResource):
             'android': request_body.android,
             'ios': request_body.ios,
         })
+
+    @request_error_handler
+    @restrict_external_request_handler
+    async def increase_notifications_sent_result(self, request):
+        self._check_server_key(request)
+
+        request_body: IncreaseNotificationsSentAmountRequest = convert_request(
+            IncreaseNotificationsSentAmountRequest, await request.json())
+
+        notifications = {
+            str(notification.uuid): notification
+            for notification in await find_notifications_by_ids(
+                uuids=[sent_amount.uuid for sent_amount in request_body.notifications],
+            )
+        }
+
+        increased = []
+        not_found = []
+        for sent_amount in request_body.notifications:
+            notification = notifications.get(sent_amount.uuid)
+            if notification is None:
+                not_found.append(sent_amount.uuid)
+                continue
+
+            if notification.status == NotificationStatus.DRAFT:
+                await change_notification_status(
+                    target_notification=notification,
+                    status=NotificationStatus.SENT,
+                )
+
+            await increase_sent_count(
+                uuid_=sent_amount.uuid,
+                sent_android=sent_amount.android,
+                sent_ios=sent_amount.ios,
+            )
+            increased.append({
+                'uuid': sent_amount.uuid,
+                'android': sent_amount.android,
+                'ios': sent_amount.ios,
+            })
+
+        return json_response(result={
+            'increased': increased,
+            'not_found': not_found,
+        })
+
+    @request_error_handler
+    @restrict_external_request_handler
+    async def register_launch_shard(self, request):
+        self._check_server_key(request)
+
+        notification_uuid = request.match_info['notification_uuid']
+        try:
+            shard_index = int(request.match_info['shard_index'])
+        except ValueError:
+            return json_response(reason='invalid shard index', status=400)
+
+        request_body: RegisterLaunchShardRequest = convert_request(
+            RegisterLaunchShardRequest, await request.json())
+        notification = await find_cached_notification_by_id(uuid=notification_uuid)
+
+        if notification is None:
+            return json_response(reason=f'notification not found {notification_uuid}', status=404)
+
+        launch_shard = await register_launch_shard(
+            notification=notification,
+            shard_index=shard_index,
+            bucket_start=request_body.bucket_start,
+            bucket_end=request_body.bucket_end,
+        )
+        return json_response(result=notification_launch_shard_model_to_dict(launch_shard))
+
+    @request_error_handler
+    @restrict_external_request_handler
+    async def update_launch_shard_progress(self, request):
+        self._check_server_key(request)
+
+        notification_uuid = request.match_info['notification_uuid']
+        try:
+            shard_index = int(request.match_info['shard_index'])
+        except ValueError:
+            return json_response(reason='invalid shard index', status=400)
+
+        request_body: UpdateLaunchShardProgressRequest = convert_request(
+            UpdateLaunchShardProgressRequest, await request.json())
+        notification = await find_cached_notification_by_id(uuid=notification_uuid)
+
+        if notification is None:
+            return json_response(reason=f'notification not found {notification_uuid}', status=404)
+
+        launch_shard = await upsert_launch_shard_progress(
+            notification=notification,
+            shard_index=shard_index,
+            bucket_start=request_body.bucket_start,
+            bucket_end=request_body.bucket_end,
+            devices=request_body.devices,
+            done=request_body.done,
+            cursor=request_body.cursor,
+            pages=request_body.pages,
+        )
+        return json_response(result=notification_launch_shard_model_to_dict(launch_shard))
+
+    @request_error_handler
+    @restrict_external_request_handler
+    async def prune_push_tokens(self, request):
+        self._check_server_key(request)
+
+        request_body: PrunePushTokensRequest = convert_request(
+            PrunePushTokensRequest, await request.json())
+
+        pruned = await self.device_dispatcher.clear_push_tokens(
+            push_tokens=request_body.push_tokens,
+        )
+        return json_response(result={
+            'pruned': pruned,
+        })
+
+    @request_error_handler
+    @restrict_external_request_handler
+    async def explain_device_condition(self, request):
+        self._check_server_key(request)
+
+        request_body: ExplainDeviceConditionRequest = convert_request(
+            ExplainDeviceConditionRequest, await request.json())
+
+        explained = await self.device_dispatcher.explain_condition(
+            condition_clause=request_body.conditions,
+        )
+        return json_response(result=explained)
+
+    @request_error_handler
+    @restrict_external_request_handler
+    async def advise_device_indexes(self, request):
+        self._check_server_key(request)
+
+        query_params: AdviseDeviceIndexesRequest = convert_request(
+            AdviseDeviceIndexesRequest, dict(request.rel_url.query))
+
+        return json_response(result=self.device_dispatcher.advise_indexes(size=query_params.size))
+
+    @request_error_handler
+    @restrict_external_request_handler
+    async def get_cache_stats(self, request):
+        self._check_server_key(request)
+
+        return json_response(result={
+            'notification': notification_cache.to_dict(),
+            'device': self.device_dispatcher.device_cache.to_dict(),
+        })
+
+    @request_error_handler
+    @restrict_external_request_handler
+    async def get_metrics(self, request):
+        self._check_server_key(request)
+
+        return web.Response(
+            body=generate_metrics(),
+            headers={'Content-Type': CONTENT_TYPE_LATEST},
+        )
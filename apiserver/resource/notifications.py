@@ -4,19 +4,21 @@ from typing import List, Optional
 
 import deserialize
 from jasyncq.dispatcher.model.task import TaskIn
-from jasyncq.dispatcher.tasks import TasksDispatcher
 
 from apiserver.decorator.request import request_error_handler
 from apiserver.dispatcher.device import DeviceDispatcher
 from apiserver.repository.notification import find_notifications_by_status, \
-    notification_model_to_dict, find_notification_by_id, create_notification, \
-    change_notification_status
+    notification_model_to_dict, find_notification_by_id, find_cached_notification_by_id, \
+    create_notification, change_notification_status
+from apiserver.repository.notification_launch_shard import find_launch_shards_by_notification, \
+    notification_launch_shard_model_to_dict
 from apiserver.resource import json_response, convert_request
 from apiserver.resource.abstract import AbstractResource
 from common.logger.logger import get_logger
 from apiserver.model.notification import NotificationStatus
 from common.structure.condition import ConditionClause
 from common.structure.job.notification import NotificationTask
+from common.task_queue.abstract import AbstractTaskQueue
 from common.util import string_to_utc_datetime, utc_now
 
 logger = get_logger(__name__)
@@ -52,7 +54,7 @@ class NotificationsHttpResource(AbstractResource):
     def __init__(
         self,
         device_dispatcher: DeviceDispatcher,
-        notification_task_queue: TasksDispatcher,
+        notification_task_queue: AbstractTaskQueue,
     ):
         super().__init__(logger=logger)
         self.router = self.app.router
@@ -63,6 +65,7 @@ class NotificationsHttpResource(AbstractResource):
         self.router.add_route('GET', '', self.get_notifications)
         self.router.add_route('POST', '', self.create_notification)
         self.router.add_route('GET', '/{notification_uuid}', self.get_notification)
+        self.router.add_route('GET', '/{notification_uuid}/launch', self.get_launch_progress)
         self.router.add_route('POST', '/{notification_uuid}/:launch', self.launch_notification)
         self.router.add_route('PUT', '/{notification_uuid}/status', self.update_notification_status)
 
@@ -96,13 +99,32 @@ class NotificationsHttpResource(AbstractResource):
     @request_error_handler
     async def get_notification(self, request):
         notification_uuid = request.match_info['notification_uuid']
-        notification = await find_notification_by_id(uuid=notification_uuid)
+        notification = await find_cached_notification_by_id(uuid=notification_uuid)
 
         if notification is None:
             return json_response(reason=f'notification not found {notification_uuid}', status=404)
 
         return json_response(result=notification_model_to_dict(notification))
 
+    @request_error_handler
+    async def get_launch_progress(self, request):
+        notification_uuid = request.match_info['notification_uuid']
+        notification = await find_cached_notification_by_id(uuid=notification_uuid)
+
+        if notification is None:
+            return json_response(reason=f'notification not found {notification_uuid}', status=404)
+
+        launch_shards = await find_launch_shards_by_notification(notification=notification)
+
+        return json_response(result={
+            'devices': sum(launch_shard.devices for launch_shard in launch_shards),
+            'done_shards': sum(1 for launch_shard in launch_shards if launch_shard.done),
+            'shards': [
+                notification_launch_shard_model_to_dict(launch_shard)
+                for launch_shard in launch_shards
+            ],
+        })
+
     @request_error_handler
     async def create_notification(self, request):
         request: CreateNotificationRequest = convert_request(
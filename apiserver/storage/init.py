@@ -12,7 +12,9 @@ async def init_db(host, port, user, password, db, generate=True):
                     'models': [
                         'apiserver.model.device',
                         'apiserver.model.notification',
-                        'apiserver.model.device_notification_log'
+                        'apiserver.model.device_notification_log',
+                        'apiserver.model.device_notification_log_block',
+                        'apiserver.model.notification_launch_shard',
                     ],
                     # If no default_connection specified, defaults to 'default'
                     'default_connection': 'default',
@@ -0,0 +1,102 @@
+"""Runs benchmarks and compares every metric with stored baseline
+
+Every metric is a rate (higher is better), a metric regresses if it is lower than
+baseline * (1 - threshold)
+
+$ python3 -m benchmark --save-baseline  # on deployed revision
+$ python3 -m benchmark --threshold 0.2  # exits with 1 if any metric regressed
+
+Without baseline (or with baseline of other metrics) nothing is compared, it exits with 2 instead
+of passing silently
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import sys
+from typing import Dict, List
+
+# NOTE(pjongy): CPU bound only, device_notification_log_insert needs MySQL so it is opt-in
+DEFAULT_MODULES = [
+    'device_notification_log_block', 'hot_paths', 'json_encode', 'structure_decode',
+]
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def run_modules(modules: List[str]) -> Dict[str, float]:
+    results = {}
+    for module_name in modules:
+        module = importlib.import_module(f'benchmark.{module_name}')
+        result = module.run()
+        if asyncio.iscoroutine(result):
+            result = asyncio.get_event_loop().run_until_complete(result)
+        results.update(result)
+    return results
+
+
+def find_regressions(
+    results: Dict[str, float],
+    baseline: Dict[str, float],
+    threshold: float,
+) -> Dict[str, float]:
+    return {
+        metric: value / baseline[metric] - 1
+        for metric, value in results.items()
+        if metric in baseline and value < baseline[metric] * (1 - threshold)
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--modules', nargs='+', default=DEFAULT_MODULES)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE_PATH)
+    parser.add_argument('--threshold', type=float, default=0.2)
+    parser.add_argument('--save-baseline', action='store_true')
+    args = parser.parse_args()
+
+    results = run_modules(modules=args.modules)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    for metric, value in results.items():
+        if metric in baseline:
+            print(f'{metric}: {value:.1f} ({value / baseline[metric] - 1:+.1%} of baseline)')
+        else:
+            print(f'{metric}: {value:.1f} (no baseline)')
+
+    if args.save_baseline:
+        # NOTE(pjongy): Metrics of modules which are not run this time are kept
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump({**baseline, **results}, baseline_file, indent=2, sort_keys=True)
+        print(f'baseline saved to {args.baseline}')
+        return 0
+
+    # NOTE(pjongy): Baseline is machine dependent so it is not committed, missing one is an error
+    #  not to be taken as pass in CI
+    compared_metrics = [metric for metric in results if metric in baseline]
+    if not compared_metrics:
+        print(
+            f'ERROR no metric has baseline in {args.baseline}, '
+            'run with --save-baseline on deployed revision first',
+            file=sys.stderr,
+        )
+        return 2
+    if len(compared_metrics) < len(results):
+        print(
+            f'WARNING {len(results) - len(compared_metrics)} of {len(results)} metrics '
+            'have no baseline and are not compared',
+            file=sys.stderr,
+        )
+
+    regressions = find_regressions(results=results, baseline=baseline, threshold=args.threshold)
+    for metric, change in regressions.items():
+        print(f'REGRESSION {metric}: {change:+.1%} (threshold -{args.threshold:.0%})')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""Rows and bytes saved by block log mode against row log mode for a launch, no MySQL is used
+
+Launch logs each page of 300 devices ordered by random_bucket, so a page spreads over every
+block_key. Bytes are column data only (no InnoDB row overhead and secondary index), which
+underestimates row mode
+
+$ python3 -m benchmark.device_notification_log_block --devices 1000000
+"""
+import argparse
+import random
+import time
+from collections import defaultdict
+from typing import Dict
+
+from apiserver.repository.device_notification_log_block import encode_device_id_block, \
+    device_id_block_contains, DEVICE_ID_BLOCK_SHIFT, DEVICE_ID_BLOCK_MASK
+
+PAGE_SIZE = 300  # NOTE(pjongy): Same as launch page size
+ROW_BYTES = 8 + 4 + 4 + 8  # id, device_id, notification_id, created_at
+BLOCK_ROW_BYTES = 8 + 4 + 8 + 4 + 8  # id, notification_id, block_key, devices, created_at
+
+
+def run(devices: int = 1000000, seed: int = 0) -> Dict[str, float]:
+    generator = random.Random(seed)
+    random_buckets = {device_id: generator.randint(1, 10000) for device_id in range(devices)}
+    device_ids = sorted(random_buckets, key=lambda device_id: random_buckets[device_id])
+
+    block_rows = 0
+    block_bytes = 0
+    offsets_by_block_key = defaultdict(set)
+    started_at = time.perf_counter()
+    for page_start in range(0, devices, PAGE_SIZE):
+        # NOTE(pjongy): Same as add_device_notification_log_blocks
+        page_offsets = defaultdict(set)
+        for device_id in device_ids[page_start:page_start + PAGE_SIZE]:
+            page_offsets[device_id >> DEVICE_ID_BLOCK_SHIFT].add(device_id & DEVICE_ID_BLOCK_MASK)
+        for block_key, offsets in page_offsets.items():
+            block_rows += 1
+            block_bytes += BLOCK_ROW_BYTES + len(encode_device_id_block(offsets))
+            offsets_by_block_key[block_key].update(offsets)
+    encode_seconds = time.perf_counter() - started_at
+
+    compacted_payloads = [
+        encode_device_id_block(offsets) for offsets in offsets_by_block_key.values()
+    ]
+    compacted_bytes = sum(BLOCK_ROW_BYTES + len(payload) for payload in compacted_payloads)
+
+    started_at = time.perf_counter()
+    for device_id in device_ids[:10000]:
+        device_id_block_contains(
+            compacted_payloads[0], device_id & DEVICE_ID_BLOCK_MASK)
+    contains_seconds = time.perf_counter() - started_at
+
+    row_bytes = devices * ROW_BYTES
+    return {
+        'device_notification_log_block.encode.ids_per_second': devices / encode_seconds,
+        'device_notification_log_block.contains.calls_per_second': 10000 / contains_seconds,
+        # NOTE(pjongy): Ratios of row mode to block mode, higher is better
+        'device_notification_log_block.inserted_rows.reduction': devices / block_rows,
+        'device_notification_log_block.inserted_bytes.reduction': row_bytes / block_bytes,
+        'device_notification_log_block.compacted_bytes.reduction': row_bytes / compacted_bytes,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--devices', type=int, default=1000000)
+    args = parser.parse_args()
+
+    for metric, value in run(devices=args.devices).items():
+        print(f'{metric}: {value:.1f}')
@@ -0,0 +1,107 @@
+"""Rows per second of device notification log insertion, model bulk_create vs multi-row insert
+vs block log mode
+
+$ ENV=dev API_SERVER__MYSQL__HOST=... API_SERVER__MYSQL__USER=... API_SERVER__MYSQL__PASSWORD=... \
+    python3 -m benchmark.device_notification_log_insert --rows 100000
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from typing import List, Dict
+
+from apiserver.config import config
+from apiserver.model.device import Device
+from apiserver.model.device_notification_log import DeviceNotificationLog
+from apiserver.model.device_notification_log_block import DeviceNotificationLogBlock
+from apiserver.model.notification import Notification
+from apiserver.repository.device_notification_log import add_device_notification_logs
+from apiserver.repository.device_notification_log_block import \
+    add_device_notification_log_blocks, compact_device_notification_log_blocks
+from apiserver.repository.notification import create_notification
+from apiserver.storage.init import init_db
+from common.util import utc_now
+
+
+async def add_device_notification_logs_by_model(device_ids: List[int], notification_id: int):
+    # NOTE(pjongy): Previous implementation
+    await DeviceNotificationLog.bulk_create([
+        DeviceNotificationLog(
+            device_id=device_id,
+            notification_id=notification_id,
+        )
+        for device_id in device_ids
+    ])
+
+
+async def run(rows: int = 100000, page_size: int = 300) -> Dict[str, float]:
+    mysql_config = config.api_server.mysql
+    await init_db(
+        host=mysql_config.host,
+        port=mysql_config.port,
+        user=mysql_config.user,
+        password=mysql_config.password,
+        db=mysql_config.database,
+    )
+
+    device = await Device.create(external_id=f'benchmark-{uuid.uuid4()}')
+    notification = await create_notification(
+        title='benchmark',
+        body='benchmark',
+        scheduled_at=utc_now(),
+    )
+    device_ids = [device.id] * rows
+    # NOTE(pjongy): Block mode does not need device rows, ids are spread like launch pages
+    block_device_ids = list(range(rows))
+    random.Random(0).shuffle(block_device_ids)
+
+    results = {}
+    try:
+        for name, insert in [
+            ('bulk_create', add_device_notification_logs_by_model),
+            ('multi_row_insert', add_device_notification_logs),
+        ]:
+            started_at = time.monotonic()
+            # NOTE(pjongy): Same as notification worker which logs each page of launch
+            for offset in range(0, rows, page_size):
+                await insert(
+                    device_ids=device_ids[offset:offset + page_size],
+                    notification_id=notification.id,
+                )
+            results[f'device_notification_log_insert.{name}.rows_per_second'] = (
+                rows / (time.monotonic() - started_at)
+            )
+
+        started_at = time.monotonic()
+        for offset in range(0, rows, page_size):
+            await add_device_notification_log_blocks(
+                device_ids=block_device_ids[offset:offset + page_size],
+                notification_id=notification.id,
+            )
+        results['device_notification_log_insert.block.rows_per_second'] = (
+            rows / (time.monotonic() - started_at)
+        )
+        started_at = time.monotonic()
+        await compact_device_notification_log_blocks()
+        results['device_notification_log_insert.block_compaction.rows_per_second'] = (
+            rows / (time.monotonic() - started_at)
+        )
+    finally:
+        await DeviceNotificationLog.filter(notification_id=notification.id).delete()
+        await DeviceNotificationLogBlock.filter(notification_id=notification.id).delete()
+        await Notification.filter(id=notification.id).delete()
+        await Device.filter(id=device.id).delete()
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--page-size', type=int, default=300)
+    args = parser.parse_args()
+
+    for metric, value in asyncio.get_event_loop().run_until_complete(
+        run(rows=args.rows, page_size=args.page_size)
+    ).items():
+        print(f'{metric}: {value:.1f}')
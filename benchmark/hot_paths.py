@@ -0,0 +1,142 @@
+"""Calls per second of CPU bound hot paths, no external service is used
+
+$ ENV=dev NOTIFICATION_WORKER__EXTERNAL__JRAZE__BASE_URL=http://localhost:8080/ \
+    NOTIFICATION_WORKER__EXTERNAL__JRAZE__X_SERVER_KEY=benchmark \
+    python3 -m benchmark.hot_paths
+"""
+import argparse
+import time
+import uuid
+from typing import Dict, Callable
+
+from bson import ObjectId
+
+from apiserver.dispatcher.device import _resolve_condition_clause_to_filter, \
+    device_from_document, device_to_dict, SendPlatform, DevicePlatform
+from apiserver.model.notification import Notification, NotificationStatus
+from apiserver.repository.notification import notification_model_to_dict
+from apiserver.resource import json_response
+from common.structure.condition import ConditionClause
+from common.structure.job.notification import Notification as NotificationArgs
+from common.util import utc_now
+from worker.notification.external.jraze.jraze import search_device_response_from_dict
+from worker.notification.task.launch_notification_shard import build_messaging_tasks
+
+PAGE_SIZE = 300  # NOTE(pjongy): Same as launch page size
+
+
+def _calls_per_second(call: Callable[[], object], number: int, rounds: int) -> float:
+    # NOTE(pjongy): Best of rounds to ignore noise from other processes
+    best = None
+    for _ in range(rounds):
+        started_at = time.perf_counter()
+        for _ in range(number):
+            call()
+        elapsed = time.perf_counter() - started_at
+        best = elapsed if best is None else min(best, elapsed)
+    return number / best
+
+
+def _condition_clause(depth: int) -> ConditionClause:
+    if depth == 0:
+        return ConditionClause(
+            conditions=None, key='age', value='20', join_type=None, operator='int_gte',
+        )
+    return ConditionClause(
+        conditions=[_condition_clause(depth - 1), _condition_clause(depth - 1)],
+        key=None,
+        value=None,
+        join_type='AND' if depth % 2 else 'OR',
+        operator=None,
+    )
+
+
+def _device_document(device_id: int) -> dict:
+    return {
+        '_id': ObjectId(),
+        'id': device_id,
+        'random_bucket': device_id % 10000 + 1,
+        'external_id': f'benchmark-{device_id}',
+        'push_token': 'x' * 152,
+        'send_platform': SendPlatform.FCM if device_id % 2 else SendPlatform.APNS,
+        'device_platform': DevicePlatform.ANDROID if device_id % 2 else DevicePlatform.IOS,
+        'device_properties': {'age': device_id % 100, 'tags': ['benchmark']},
+    }
+
+
+def _notification(notification_id: int) -> Notification:
+    current = utc_now()
+    return Notification(
+        id=notification_id,
+        uuid=uuid.uuid4(),
+        title='benchmark',
+        body='benchmark',
+        scheduled_at=current,
+        created_at=current,
+        modified_at=current,
+        conditions={'conditions': None, 'key': 'age', 'value': '20', 'operator': 'int_gte'},
+        status=NotificationStatus.DRAFT,
+    )
+
+
+def run(number: int = 100, rounds: int = 5) -> Dict[str, float]:
+    condition_clause = _condition_clause(depth=8)
+    device_documents = [_device_document(device_id) for device_id in range(PAGE_SIZE)]
+    search_response = {
+        'result': {
+            'total': None,
+            'devices': [
+                device_to_dict(device_from_document(document)) for document in device_documents
+            ],
+            'next_cursor': None,
+        },
+    }
+    large_result = {
+        'total': 1000,
+        'devices': [
+            device_to_dict(device_from_document(_device_document(device_id)))
+            for device_id in range(1000)
+        ],
+        'next_cursor': None,
+    }
+    devices = search_device_response_from_dict(search_response).result.devices
+    notification_args = NotificationArgs(
+        id=1,
+        uuid=str(uuid.uuid4()),
+        title='benchmark',
+        body='benchmark',
+        image_url=None,
+        icon_url=None,
+        deep_link=None,
+    )
+    notifications = [_notification(notification_id) for notification_id in range(100)]
+
+    calls = {
+        'condition_filter.depth_8': lambda: _resolve_condition_clause_to_filter(
+            condition_clause=condition_clause),
+        'json_response.devices_1000': lambda: json_response(result=large_result),
+        'device_page.apiserver_decode': lambda: [
+            device_to_dict(device_from_document(document)) for document in device_documents
+        ],
+        'device_page.worker_decode': lambda: search_device_response_from_dict(search_response),
+        'launch_page.build_messaging_tasks': lambda: build_messaging_tasks(
+            notification=notification_args, devices=devices),
+        'notification_model_to_dict.rows_100': lambda: [
+            notification_model_to_dict(notification) for notification in notifications
+        ],
+    }
+    return {
+        f'hot_paths.{name}.calls_per_second': _calls_per_second(
+            call=call, number=number, rounds=rounds)
+        for name, call in calls.items()
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=100)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    for metric, value in run(number=args.number, rounds=args.rounds).items():
+        print(f'{metric}: {value:.1f}')
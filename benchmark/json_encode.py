@@ -0,0 +1,97 @@
+"""Responses per second of json_response encoding, json module vs json_dumps_bytes (orjson)
+
+Fails if fallback of json_dumps_bytes makes different output from orjson
+
+$ python3 -m benchmark.json_encode --devices 1000 --repeat 100
+"""
+import argparse
+import json
+import time
+import uuid
+from typing import Dict
+
+from common import json_encoder
+from common.json_encoder import ManualJSONEncoder, json_dumps_bytes
+from common.structure.enum import DevicePlatform, SendPlatform
+from common.util import utc_now
+
+
+def _search_devices_response(devices: int) -> dict:
+    # NOTE(pjongy): Same shape as /devices/-/:search response with notification in device_properties
+    return {
+        'success': True,
+        'result': {
+            'total': devices,
+            'devices': [
+                {
+                    'id': device_id,
+                    'external_id': str(uuid.uuid4()),
+                    'push_token': 'x' * 152,
+                    'send_platform': SendPlatform.FCM,
+                    'device_platform': DevicePlatform.Android,
+                    'device_properties': {
+                        'age': device_id % 100,
+                        'tags': ['benchmark', 'json'],
+                        'last_notification': {
+                            'uuid': uuid.uuid4(),
+                            'created_at': utc_now(),
+                        },
+                    },
+                }
+                for device_id in range(devices)
+            ],
+            'next_cursor': None,
+        },
+        'reason': None,
+    }
+
+
+def check_fallback_parity(response: dict):
+    orjson = json_encoder.orjson
+    if orjson is None:
+        return
+
+    try:
+        json_encoder.orjson = None
+        fallback_encoded = json_dumps_bytes(response)
+    finally:
+        json_encoder.orjson = orjson
+    if fallback_encoded != json_dumps_bytes(response):
+        raise AssertionError('json module fallback of json_dumps_bytes differs from orjson')
+
+
+def run(devices: int = 1000, repeat: int = 100) -> Dict[str, float]:
+    response = _search_devices_response(devices=devices)
+    check_fallback_parity(response=response)
+    orjson = json_encoder.orjson
+
+    encoders = [
+        ('json_module', lambda o: json.dumps(o, cls=ManualJSONEncoder).encode()),
+        ('json_dumps_bytes_fallback', json_dumps_bytes),
+    ]
+    if orjson is not None:
+        encoders.append(('json_dumps_bytes_orjson', json_dumps_bytes))
+
+    results = {}
+    try:
+        for name, encode in encoders:
+            json_encoder.orjson = orjson if name.endswith('_orjson') else None
+            started_at = time.monotonic()
+            for _ in range(repeat):
+                encode(response)
+            results[f'json_encode.{name}.responses_per_second'] = (
+                repeat / (time.monotonic() - started_at)
+            )
+    finally:
+        json_encoder.orjson = orjson
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--devices', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=100)
+    args = parser.parse_args()
+
+    for metric, value in run(devices=args.devices, repeat=args.repeat).items():
+        print(f'{metric}: {value:.1f}')
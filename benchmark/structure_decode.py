@@ -0,0 +1,108 @@
+"""Decodes per second of hot path structures, deserialize and dataclasses.asdict vs decoders
+
+$ python3 -m benchmark.structure_decode --rows 100000
+"""
+import argparse
+import dataclasses
+import time
+from typing import Dict, List, Callable, Tuple
+
+import deserialize
+from bson import ObjectId
+
+from apiserver.dispatcher.device import device_from_document, device_to_dict, SendPlatform, \
+    DevicePlatform
+from common.structure.job.messaging import MessagingTask, messaging_job_from_dict, \
+    messaging_job_to_dict
+
+
+# NOTE(pjongy): Previous implementations
+@deserialize.default('device_properties', {})
+@deserialize.parser('_id', str)
+@dataclasses.dataclass
+class DeserializedDevice:
+    _id: str
+    id: int
+    random_bucket: int
+    external_id: str
+    push_token: str
+    send_platform: SendPlatform
+    device_platform: DevicePlatform
+    device_properties: dict
+
+
+@dataclasses.dataclass
+class DeserializedMessagingJob:
+    task: MessagingTask
+    kwargs: dict
+
+
+def _device_document(device_id: int) -> dict:
+    return {
+        '_id': ObjectId(),
+        'id': device_id,
+        'random_bucket': device_id % 10000,
+        'external_id': f'benchmark-{device_id}',
+        'push_token': 'x' * 152,
+        'send_platform': SendPlatform.FCM,
+        'device_platform': DevicePlatform.ANDROID,
+        'device_properties': {'age': device_id % 100, 'tags': ['benchmark']},
+    }
+
+
+def _messaging_job(index: int) -> dict:
+    return {
+        'task': MessagingTask.SEND_PUSH_MESSAGE,
+        'kwargs': {
+            'notification_id': 'benchmark',
+            'push_tokens': ['x' * 152] * 300,
+            'device_platform': 1,
+            'title': 'benchmark',
+            'body': 'benchmark',
+        },
+    }
+
+
+def run(rows: int = 100000) -> Dict[str, float]:
+    cases: List[Tuple[str, Callable[[int], dict], Callable[[dict], dict]]] = [
+        (
+            'device.deserialize',
+            _device_document,
+            lambda row: dataclasses.asdict(deserialize.deserialize(DeserializedDevice, row)),
+        ),
+        (
+            'device.decoder',
+            _device_document,
+            lambda row: device_to_dict(device_from_document(row)),
+        ),
+        (
+            'messaging_job.deserialize',
+            _messaging_job,
+            lambda row: dataclasses.asdict(deserialize.deserialize(DeserializedMessagingJob, row)),
+        ),
+        (
+            'messaging_job.decoder',
+            _messaging_job,
+            lambda row: messaging_job_to_dict(messaging_job_from_dict(row)),
+        ),
+    ]
+
+    results = {}
+    for name, make_row, decode in cases:
+        documents = [make_row(index) for index in range(rows)]
+        started_at = time.monotonic()
+        for row in documents:
+            decode(row)
+        results[f'structure_decode.{name}.rows_per_second'] = (
+            rows / (time.monotonic() - started_at)
+        )
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args()
+
+    for metric, value in run(rows=args.rows).items():
+        print(f'{metric}: {value:.1f}')
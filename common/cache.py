@@ -0,0 +1,81 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0  # dropped by max_size
+        self.expirations = 0  # dropped by ttl_seconds
+        self.invalidations = 0
+
+    def to_dict(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations,
+        }
+
+
+class LRUCache:
+    """In-process LRU cache whose entries also expire after ttl_seconds
+
+    NOTE(pjongy): Invalidation only reaches the process it is called in,
+     so ttl_seconds bounds staleness between processes
+    """
+
+    def __init__(self, max_size: int = 1000, ttl_seconds: float = 5.0):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.entries: OrderedDict = OrderedDict()  # key: (expires_at, value)
+        self.stats = CacheStats()
+
+    def configure(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._evict()
+
+    def _evict(self):
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.stats.misses += 1
+            return None
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self.entries[key]
+            self.stats.expirations += 1
+            self.stats.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.stats.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        if self.max_size <= 0:
+            return
+        self.entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self.entries.move_to_end(key)
+        self._evict()
+
+    def invalidate(self, key: Hashable):
+        if self.entries.pop(key, None) is not None:
+            self.stats.invalidations += 1
+
+    def to_dict(self) -> dict:
+        return {
+            'size': len(self.entries),
+            'max_size': self.max_size,
+            'ttl_seconds': self.ttl_seconds,
+            **self.stats.to_dict(),
+        }
@@ -0,0 +1,90 @@
+from typing import Tuple, Optional
+
+import httpcore
+import httpx
+
+from common.json_encoder import json_dumps_bytes
+
+
+class HttpClientStats:
+    def __init__(self):
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.opened_connections = 0
+
+    @property
+    def reused_connections(self) -> int:
+        # NOTE(pjongy): Every request which did not open a new connection is served by pooled one
+        return max(self.requests - self.opened_connections, 0)
+
+    def to_dict(self) -> dict:
+        return {
+            'requests': self.requests,
+            'in_flight': self.in_flight,
+            'peak_in_flight': self.peak_in_flight,
+            'opened_connections': self.opened_connections,
+            'reused_connections': self.reused_connections,
+        }
+
+
+class _StatsConnectionPool(httpcore.AsyncConnectionPool):
+    def __init__(self, stats: HttpClientStats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    def _create_connection(self, origin: Tuple[bytes, bytes, int]):
+        self.stats.opened_connections += 1
+        return super()._create_connection(origin=origin)
+
+    async def arequest(self, method, url, headers=None, stream=None, ext=None):
+        self.stats.requests += 1
+        self.stats.in_flight += 1
+        self.stats.peak_in_flight = max(self.stats.peak_in_flight, self.stats.in_flight)
+        try:
+            return await super().arequest(
+                method, url, headers=headers, stream=stream, ext=ext,
+            )
+        finally:
+            self.stats.in_flight -= 1
+
+
+class PooledHttpClient:
+    """Long-lived keep-alive client, create one per replica and share it between tasks"""
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 5.0,
+        timeout: float = 5.0,
+        http2: bool = False,
+    ):
+        self.stats = HttpClientStats()
+        self.client = httpx.AsyncClient(
+            transport=_StatsConnectionPool(
+                stats=self.stats,
+                ssl_context=httpx.create_ssl_context(http2=http2),
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+                http2=http2,
+            ),
+            timeout=httpx.Timeout(timeout),
+        )
+
+    async def post_json(
+        self,
+        url: str,
+        body,
+        headers: Optional[dict] = None,
+    ) -> httpx.Response:
+        # NOTE(pjongy): Encoded by json_dumps_bytes instead of json module used by httpx json=
+        return await self.client.post(
+            url=url,
+            content=json_dumps_bytes(body),
+            headers={'Content-Type': 'application/json', **(headers or {})},
+        )
+
+    async def aclose(self):
+        await self.client.aclose()
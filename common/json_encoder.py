@@ -1,15 +1,65 @@
 import datetime
+import enum
 import json
 import uuid
 
-from common.util import datetime_to_kst_datetime, datetime_to_utc_datetime
+from common.util import KST, UTC
+
+try:
+    import orjson
+except ImportError:  # NOTE(pjongy): Optional, json module makes same output slower
+    orjson = None
+
+
+def _datetime_to_kst_isoformat(o: datetime.datetime) -> str:
+    # NOTE(pjongy): Same as datetime_to_kst_datetime(datetime_to_utc_datetime(o)) in single step
+    if o.tzinfo is None:
+        o = o.replace(tzinfo=UTC)
+    if o.tzinfo is not KST:
+        o = o.astimezone(KST)
+    return o.isoformat()
 
 
 class ManualJSONEncoder(json.JSONEncoder):
     def default(self, o):
         if isinstance(o, datetime.datetime):
-            r = datetime_to_kst_datetime(datetime_to_utc_datetime(o)).isoformat()
-            return r
+            return _datetime_to_kst_isoformat(o)
         if isinstance(o, uuid.UUID):
             return str(o)
+        if isinstance(o, enum.Enum):
+            return o.value
         return super().default(o)
+
+
+def _orjson_default(o):
+    # NOTE(pjongy): Datetimes are passed through to be converted into KST as ManualJSONEncoder
+    if isinstance(o, datetime.datetime):
+        return _datetime_to_kst_isoformat(o)
+    raise TypeError(f'Object of type {o.__class__.__name__} is not JSON serializable')
+
+
+_compact_encoder = ManualJSONEncoder(separators=(',', ':'), ensure_ascii=False)
+
+
+def json_dumps_bytes(o) -> bytes:
+    """Compact UTF-8 JSON, orjson is used if installed
+
+    UUID as str, enum as its value and datetime as KST isoformat
+    """
+    if orjson is not None:
+        return orjson.dumps(
+            o,
+            default=_orjson_default,
+            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+        )
+    return _compact_encoder.encode(o).encode()
+
+
+def json_dumps(o) -> str:
+    return json_dumps_bytes(o).decode()
+
+
+def json_loads(s):
+    if orjson is not None:
+        return orjson.loads(s)
+    return json.loads(s)
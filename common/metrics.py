@@ -0,0 +1,77 @@
+import functools
+import time
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+from common.logger.logger import get_logger
+
+logger = get_logger(__name__)
+
+# NOTE(pjongy): Metrics are per process, every replica should be scraped
+TASK_QUEUE_FETCH_SECONDS = Histogram(
+    'jraze_task_queue_fetch_seconds',
+    'Task fetch latency including wait for empty queue',
+    ['queue_name', 'result'],  # result: claimed or empty
+)
+JOB_SECONDS = Histogram(
+    'jraze_job_seconds',
+    'Job processing duration by task type',
+    ['task'],
+)
+PUSH_SEND_SECONDS = Histogram(
+    'jraze_push_send_seconds',
+    'Duration of sending single push batch to provider',
+    ['provider'],
+)
+PUSH_SENT_TOTAL = Counter(
+    'jraze_push_sent_total',
+    'Pushes sent to provider by result',
+    ['provider', 'result'],  # result: success or failure
+)
+PUSH_INVALID_TOKENS_TOTAL = Counter(
+    'jraze_push_invalid_tokens_total',
+    'Push tokens rejected by provider as unregistered or invalid, they are pruned',
+    ['provider'],
+)
+PUSH_RESULT_FAILED_TOTAL = Counter(
+    'jraze_push_result_failed_total',
+    'Failed pushes reported to notification worker by messaging workers',
+    ['platform'],  # platform: android or ios
+)
+RATE_LIMIT_ACQUIRED_TOTAL = Counter(
+    'jraze_rate_limit_acquired_total',
+    'Tokens acquired from rate limiter, rate of this is current send rate',
+    ['limiter'],
+)
+RATE_LIMIT_THROTTLED_SECONDS_TOTAL = Counter(
+    'jraze_rate_limit_throttled_seconds_total',
+    'Seconds waited for rate limiter',
+    ['limiter'],
+)
+RATE_LIMIT_CONFIGURED_RATE = Gauge(
+    'jraze_rate_limit_configured_rate',
+    'Configured tokens per second of rate limiter, 0 means unlimited',
+    ['limiter'],
+)
+
+
+def observe_seconds(histogram: Histogram, **labels):
+    """Observes elapsed seconds of decorated coroutine function even if it raised"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started_at = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                histogram.labels(**labels).observe(time.perf_counter() - started_at)
+        return wrapper
+    return decorator
+
+
+def start_metrics_server(base_port: int, pid: int):
+    """Each replica of pool listens base_port + pid, 0 base_port to disable"""
+    if not base_port:
+        return
+    start_http_server(base_port + pid)
+    logger.info(f'metrics served on {base_port + pid}')
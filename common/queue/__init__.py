@@ -1,8 +1,6 @@
-import json
-
 from aioredis import RedisConnection
 
-from common.json_encoder import ManualJSONEncoder
+from common.json_encoder import json_dumps_bytes
 
 
 async def rpush(
@@ -13,7 +11,7 @@ async def rpush(
     return await redis_conn.execute(
         'rpush',
         topic,
-        json.dumps(job, cls=ManualJSONEncoder),
+        json_dumps_bytes(job),
     )
 
 
@@ -42,7 +40,7 @@ async def zadd(
         'zadd',
         topic,
         z_index,
-        json.dumps(job, cls=ManualJSONEncoder),
+        json_dumps_bytes(job),
     )
 
 
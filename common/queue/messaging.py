@@ -1,12 +1,11 @@
-import dataclasses
-import json
 from typing import Optional
 
-import deserialize
 from aioredis import RedisConnection
 
+from common.json_encoder import json_loads
 from common.queue import rpush, blpop
-from common.structure.job.messaging import MessagingJob
+from common.structure.job.messaging import MessagingJob, messaging_job_from_dict, \
+    messaging_job_to_dict
 
 MESSAGING_QUEUE = 'MESSAGING_QUEUE'
 
@@ -18,7 +17,7 @@ async def publish_messaging_job(
     return await rpush(
         redis_conn=redis_conn,
         topic=MESSAGING_QUEUE,
-        job=dataclasses.asdict(job)
+        job=messaging_job_to_dict(job)
     )
 
 
@@ -34,5 +33,5 @@ async def blocking_get_messaging_job(
     if not job_json:
         return None
 
-    job = json.loads(job_json)
-    return deserialize.deserialize(MessagingJob, job)
+    job = json_loads(job_json)
+    return messaging_job_from_dict(job)
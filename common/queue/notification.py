@@ -1,12 +1,11 @@
-import dataclasses
-import json
 from typing import Optional
 
-import deserialize
 from aioredis import RedisConnection
 
+from common.json_encoder import json_loads
 from common.queue import rpush, blpop
-from common.structure.job.notification import NotificationJob
+from common.structure.job.notification import NotificationJob, notification_job_from_dict, \
+    notification_job_to_dict
 
 
 NOTIFICATION_JOB_QUEUE_TOPIC = 'NOTIFICATION_JOB_QUEUE'
@@ -19,7 +18,7 @@ async def publish_notification_job(
     return await rpush(
         redis_conn=redis_conn,
         topic=NOTIFICATION_JOB_QUEUE_TOPIC,
-        job=dataclasses.asdict(job),
+        job=notification_job_to_dict(job),
     )
 
 
@@ -35,5 +34,5 @@ async def blocking_get_notification_job(
     if not job_json:
         return None
 
-    job = json.loads(job_json)
-    return deserialize.deserialize(NotificationJob, job)
+    job = json_loads(job_json)
+    return notification_job_from_dict(job)
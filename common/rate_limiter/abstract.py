@@ -0,0 +1,90 @@
+import asyncio
+import math
+from abc import ABC, abstractmethod
+from typing import Dict
+
+from common.logger.logger import get_logger
+from common.metrics import RATE_LIMIT_ACQUIRED_TOTAL, RATE_LIMIT_THROTTLED_SECONDS_TOTAL, \
+    RATE_LIMIT_CONFIGURED_RATE
+
+logger = get_logger(__name__)
+
+
+class RateLimiterStats:
+    def __init__(self):
+        self.acquired = 0
+        self.throttled_seconds = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            'acquired': self.acquired,
+            'throttled_seconds': self.throttled_seconds,
+        }
+
+
+class AbstractRateLimiter(ABC):
+    """Token bucket refilled by rate per second up to burst
+
+    Tokens are reserved even if the bucket is short of them, so concurrent callers are spread
+    by the time they should wait instead of retrying
+    """
+
+    def __init__(self, name: str, rate: float, burst: int):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.stats = RateLimiterStats()
+        RATE_LIMIT_CONFIGURED_RATE.labels(limiter=name).set(rate)
+
+    async def initialize(self):
+        pass
+
+    def reservation_size(self) -> int:
+        """Tokens reserved at once for a batch of sends"""
+        if self.rate <= 0:
+            return 1 << 30
+        # NOTE(pjongy): About 10 reservations per second over every replica, so shared bucket
+        #  storage is not hit per send, but not more than burst is released at once
+        return max(1, min(self.burst, math.ceil(self.rate / 10)))
+
+    def batch(self, size: int) -> 'BatchReservation':
+        return BatchReservation(rate_limiter=self, size=size)
+
+    @abstractmethod
+    async def _reserve(self, tokens: int) -> float:
+        """Takes tokens from the bucket and returns seconds until they are refilled"""
+        raise NotImplementedError('inherit class and implement method')
+
+    async def acquire(self, tokens: int = 1):
+        try:
+            wait_seconds = await self._reserve(tokens)
+        except Exception:
+            # NOTE(pjongy): Not to stop sending by failure of shared bucket storage
+            logger.exception(f'rate limiter {self.name} reservation failed')
+            return
+
+        self.stats.acquired += tokens
+        RATE_LIMIT_ACQUIRED_TOTAL.labels(limiter=self.name).inc(tokens)
+        if wait_seconds > 0:
+            self.stats.throttled_seconds += wait_seconds
+            RATE_LIMIT_THROTTLED_SECONDS_TOTAL.labels(limiter=self.name).inc(wait_seconds)
+            await asyncio.sleep(wait_seconds)
+
+
+class BatchReservation:
+    """Reserves tokens of a batch chunk by chunk, sends in a chunk share one reservation"""
+
+    def __init__(self, rate_limiter: AbstractRateLimiter, size: int):
+        self.rate_limiter = rate_limiter
+        self.size = size
+        self.chunk_size = rate_limiter.reservation_size()
+        self.chunks: Dict[int, asyncio.Future] = {}
+
+    async def acquire(self, index: int):
+        """Waits until index-th send of the batch is allowed"""
+        chunk = index // self.chunk_size
+        if chunk not in self.chunks:
+            tokens = min(self.chunk_size, self.size - chunk * self.chunk_size)
+            self.chunks[chunk] = asyncio.ensure_future(self.rate_limiter.acquire(tokens=tokens))
+        # NOTE(pjongy): Shield not to cancel reservation shared with other sends
+        await asyncio.shield(self.chunks[chunk])
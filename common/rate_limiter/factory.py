@@ -0,0 +1,55 @@
+from common.rate_limiter.abstract import AbstractRateLimiter
+from common.rate_limiter.local import LocalRateLimiter, UnlimitedRateLimiter
+from common.rate_limiter.mysql_backend import MySQLRateLimiter
+from common.rate_limiter.redis_backend import RedisRateLimiter
+from common.task_queue.factory import TaskQueueFactory, TaskQueueBackend
+
+
+class RateLimiterMode:
+    LOCAL = 'local'
+    SHARED = 'shared'  # NOTE(pjongy): Storage of task queue backend, MySQL for jasyncq
+
+
+class RateLimiterFactory:
+    """rate_limit_config is each messaging service's `rate_limit` config section
+
+    Shared buckets are stored with connection pool of task_queue_factory
+    """
+
+    def __init__(self, rate_limit_config, task_queue_factory: TaskQueueFactory):
+        self.config = rate_limit_config
+        self.task_queue_factory = task_queue_factory
+
+    async def create(self, name: str) -> AbstractRateLimiter:
+        if self.config.sends_per_second <= 0:
+            return UnlimitedRateLimiter(name=name)
+
+        if self.config.mode == RateLimiterMode.LOCAL:
+            rate_limiter = LocalRateLimiter(
+                name=name,
+                rate=self.config.sends_per_second,
+                burst=self.config.burst,
+            )
+        elif self.config.mode == RateLimiterMode.SHARED:
+            if self.task_queue_factory.pool is None:
+                await self.task_queue_factory.connect()
+
+            if self.task_queue_factory.config.backend == TaskQueueBackend.REDIS:
+                rate_limiter = RedisRateLimiter(
+                    redis=self.task_queue_factory.pool,
+                    name=name,
+                    rate=self.config.sends_per_second,
+                    burst=self.config.burst,
+                )
+            else:
+                rate_limiter = MySQLRateLimiter(
+                    pool=self.task_queue_factory.pool,
+                    name=name,
+                    rate=self.config.sends_per_second,
+                    burst=self.config.burst,
+                )
+        else:
+            raise ValueError(f'rate limit mode not allow: {self.config.mode}')
+
+        await rate_limiter.initialize()
+        return rate_limiter
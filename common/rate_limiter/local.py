@@ -0,0 +1,26 @@
+import time
+
+from common.rate_limiter.abstract import AbstractRateLimiter
+
+
+class LocalRateLimiter(AbstractRateLimiter):
+    """Bucket of this process only, rate should be divided by the number of replicas"""
+
+    def __init__(self, name: str, rate: float, burst: int):
+        super().__init__(name=name, rate=rate, burst=burst)
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+
+    async def _reserve(self, tokens: int) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate) - tokens
+        self.updated_at = now
+        return max(-self.tokens, 0.0) / self.rate
+
+
+class UnlimitedRateLimiter(AbstractRateLimiter):
+    def __init__(self, name: str):
+        super().__init__(name=name, rate=0, burst=0)
+
+    async def _reserve(self, tokens: int) -> float:
+        return 0.0
@@ -0,0 +1,50 @@
+from aiomysql import Pool
+
+from common.rate_limiter.abstract import AbstractRateLimiter
+
+TABLE_NAME = 'jraze_rate_limit'
+
+
+class MySQLRateLimiter(AbstractRateLimiter):
+    """Bucket shared by every replica using same database, a row per limiter name"""
+
+    def __init__(self, pool: Pool, name: str, rate: float, burst: int):
+        super().__init__(name=name, rate=rate, burst=burst)
+        self.pool = pool
+
+    async def initialize(self):
+        async with self.pool.acquire() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute(
+                    f'CREATE TABLE IF NOT EXISTS `{TABLE_NAME}` ('
+                    f'`name` VARCHAR(255) NOT NULL PRIMARY KEY, '
+                    f'`tokens` DOUBLE NOT NULL, '
+                    f'`updated_at` DOUBLE NOT NULL)'
+                )
+                await cursor.execute(
+                    f'INSERT IGNORE INTO `{TABLE_NAME}` (`name`, `tokens`, `updated_at`) '
+                    f'VALUES (%s, %s, UNIX_TIMESTAMP(NOW(6)))',
+                    [self.name, self.burst],
+                )
+            await connection.commit()
+
+    async def _reserve(self, tokens: int) -> float:
+        # NOTE(pjongy): Refilled by database time so that replicas' clock skew does not matter,
+        #  `tokens` is assigned before `updated_at` so it is computed with previous updated_at
+        async with self.pool.acquire() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute(
+                    f'UPDATE `{TABLE_NAME}` SET '
+                    f'`tokens` = LEAST(%s, `tokens` + '
+                    f'(UNIX_TIMESTAMP(NOW(6)) - `updated_at`) * %s) - %s, '
+                    f'`updated_at` = UNIX_TIMESTAMP(NOW(6)) '
+                    f'WHERE `name` = %s',
+                    [self.burst, self.rate, tokens, self.name],
+                )
+                await cursor.execute(
+                    f'SELECT `tokens` FROM `{TABLE_NAME}` WHERE `name` = %s',
+                    [self.name],
+                )
+                (remaining,) = await cursor.fetchone()
+            await connection.commit()
+        return max(-remaining, 0.0) / self.rate
@@ -0,0 +1,38 @@
+from aioredis import Redis
+
+from common.rate_limiter.abstract import AbstractRateLimiter
+
+# NOTE(pjongy): Refilled by redis server time so that replicas' clock skew does not matter
+#  KEYS: bucket hash
+#  ARGV: rate, burst, tokens to reserve
+RESERVE_TOKENS_SCRIPT = '''
+redis.replicate_commands()
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(bucket[1]) or burst
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + (now - updated_at) * rate) - tonumber(ARGV[3])
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('EXPIRE', KEYS[1], 3600)
+return tostring(tokens)
+'''
+
+
+class RedisRateLimiter(AbstractRateLimiter):
+    """Bucket shared by every replica using same redis"""
+
+    def __init__(self, redis: Redis, name: str, rate: float, burst: int):
+        super().__init__(name=name, rate=rate, burst=burst)
+        self.redis = redis
+        self.key = f'jraze:rate_limit:{name}'
+
+    async def _reserve(self, tokens: int) -> float:
+        remaining = await self.redis.eval(
+            RESERVE_TOKENS_SCRIPT,
+            keys=[self.key],
+            args=[self.rate, self.burst, tokens],
+        )
+        return max(-float(remaining), 0.0) / self.rate
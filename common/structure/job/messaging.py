@@ -27,5 +27,17 @@ class MessagingTask(enum.IntEnum):
 
 @dataclasses.dataclass
 class MessagingJob:
+    __slots__ = ('task', 'kwargs')
+
     task: MessagingTask
     kwargs: dict  # NOTE(pjongy): JSON data for task args e.g) FCMSendPushMessageArgs
+
+
+def messaging_job_from_dict(job: dict) -> MessagingJob:
+    # NOTE(pjongy): Decoded without deserialize since it is called for every fetched task
+    return MessagingJob(task=MessagingTask(job['task']), kwargs=job['kwargs'])
+
+
+def messaging_job_to_dict(job: MessagingJob) -> dict:
+    # NOTE(pjongy): Unlike dataclasses.asdict, kwargs is not deep copied
+    return {'task': job.task, 'kwargs': job.kwargs}
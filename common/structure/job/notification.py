@@ -1,6 +1,6 @@
 import dataclasses
 import enum
-from typing import Optional
+from typing import Optional, List
 
 from common.structure.condition import ConditionClause
 from common.structure.enum import DevicePlatform
@@ -23,6 +23,20 @@ class NotificationLaunchMessageArgs:
     conditions: Optional[ConditionClause]
 
 
+@dataclasses.dataclass
+class LaunchShard:
+    index: int
+    bucket_start: int  # inclusive random_bucket range
+    bucket_end: int
+
+
+@dataclasses.dataclass
+class NotificationLaunchShardMessageArgs:
+    notification: Notification
+    conditions: Optional[ConditionClause]
+    shard: LaunchShard
+
+
 @dataclasses.dataclass
 class NotificationSentResultMessageArgs:
     device_platform: DevicePlatform
@@ -31,12 +45,31 @@ class NotificationSentResultMessageArgs:
     failed: int
 
 
+@dataclasses.dataclass
+class PrunePushTokensMessageArgs:
+    push_tokens: List[str]  # rejected by provider as unregistered or invalid
+
+
 class NotificationTask(enum.IntEnum):
     LAUNCH_NOTIFICATION = 1
     UPDATE_RESULT = 2
+    LAUNCH_NOTIFICATION_SHARD = 3
+    PRUNE_PUSH_TOKENS = 4
 
 
 @dataclasses.dataclass
 class NotificationJob:
+    __slots__ = ('task', 'kwargs')
+
     task: NotificationTask
     kwargs: dict  # NOTE(pjongy): JSON data for task args e.g) NotificationLaunchMessageArgs
+
+
+def notification_job_from_dict(job: dict) -> NotificationJob:
+    # NOTE(pjongy): Decoded without deserialize since it is called for every fetched task
+    return NotificationJob(task=NotificationTask(job['task']), kwargs=job['kwargs'])
+
+
+def notification_job_to_dict(job: NotificationJob) -> dict:
+    # NOTE(pjongy): Unlike dataclasses.asdict, kwargs is not deep copied
+    return {'task': job.task, 'kwargs': job.kwargs}
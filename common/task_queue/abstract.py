@@ -0,0 +1,48 @@
+from abc import ABC, abstractmethod
+from typing import List
+
+from jasyncq.dispatcher.model.task import TaskIn, TaskOut
+
+
+class AbstractTaskQueue(ABC):
+    """Task queue of single topic, every service should use same backend for a topic"""
+
+    @abstractmethod
+    async def initialize(self):
+        raise NotImplementedError('inherit class and implement method')
+
+    @abstractmethod
+    async def apply_tasks(
+        self,
+        tasks: List[TaskIn],
+    ) -> List[TaskOut]:
+        raise NotImplementedError('inherit class and implement method')
+
+    @abstractmethod
+    async def fetch_tasks(
+        self,
+        queue_name: str,
+        limit: int,
+        lease_seconds: int,
+        wait_seconds: float = 0.0,
+    ) -> List[TaskOut]:
+        """Claim due tasks and tasks whose lease is expired (not completed in lease_seconds),
+        waits for at most wait_seconds if there is nothing to claim"""
+        raise NotImplementedError('inherit class and implement method')
+
+    @abstractmethod
+    async def extend_lease(
+        self,
+        task_ids: List[str],
+        lease_seconds: int,
+    ):
+        """Renews lease of claimed tasks from now, running tasks should call this periodically
+        not to be claimed again by other consumers"""
+        raise NotImplementedError('inherit class and implement method')
+
+    @abstractmethod
+    async def complete_tasks(
+        self,
+        task_ids: List[str],
+    ):
+        raise NotImplementedError('inherit class and implement method')
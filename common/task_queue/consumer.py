@@ -0,0 +1,123 @@
+import asyncio
+import time
+from typing import Callable, Awaitable, Set
+
+from jasyncq.dispatcher.model.task import TaskOut
+
+from common.logger.logger import get_logger
+from common.metrics import TASK_QUEUE_FETCH_SECONDS
+from common.task_queue.abstract import AbstractTaskQueue
+
+logger = get_logger(__name__)
+
+TaskHandler = Callable[[TaskOut], Awaitable[None]]
+
+
+class TaskConsumer:
+    """Keeps up to max_in_flight tasks running, fetching only as many as free slots
+
+    Lease of running tasks is extended every lease_seconds / 3 so long running task is not
+    claimed by other consumers
+    """
+
+    def __init__(
+        self,
+        task_queue: AbstractTaskQueue,
+        queue_name: str,
+        handler: TaskHandler,
+        max_in_flight: int = 10,
+        prefetch_size: int = 10,
+        lease_seconds: int = 60,
+        min_idle_seconds: float = 0.05,
+        max_idle_seconds: float = 1.0,
+    ):
+        self.task_queue = task_queue
+        self.queue_name = queue_name
+        self.handler = handler
+        self.max_in_flight = max_in_flight
+        self.prefetch_size = prefetch_size
+        self.lease_seconds = lease_seconds
+        self.min_idle_seconds = min_idle_seconds
+        self.max_idle_seconds = max_idle_seconds
+
+        self.in_flight = asyncio.Semaphore(max_in_flight)
+        self.running: Set[asyncio.Future] = set()
+        self.leased_task_ids: Set[str] = set()
+        self.idle_seconds = min_idle_seconds
+        self.heartbeat_seconds = lease_seconds / 3
+
+    async def _process(self, task: TaskOut):
+        task_id = str(task.uuid)
+        self.leased_task_ids.add(task_id)
+        try:
+            await self.handler(task)
+        except Exception:
+            logger.exception(f'task handler failed {task.uuid}')
+        finally:
+            self.leased_task_ids.discard(task_id)
+            self.in_flight.release()
+
+        try:
+            await self.task_queue.complete_tasks(task_ids=[task_id])
+        except Exception:
+            # NOTE(pjongy): Not completed task will be fetched again after lease_seconds
+            logger.exception(f'task completion failed {task.uuid}')
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            task_ids = list(self.leased_task_ids)
+            if not task_ids:
+                continue
+            try:
+                await self.task_queue.extend_lease(
+                    task_ids=task_ids,
+                    lease_seconds=self.lease_seconds,
+                )
+            except Exception:
+                # NOTE(pjongy): Retried on next beat, tasks are claimed again only if every
+                #  beat fails until lease expires
+                logger.exception(f'lease extension failed {self.queue_name}')
+
+    async def run(self):
+        asyncio.ensure_future(self._heartbeat())
+        while True:
+            # NOTE(pjongy): Wait for at least one free slot, tasks are not fetched to be queued
+            #  locally since their lease is already running
+            await self.in_flight.acquire()
+            free_slots = 1
+            while free_slots < self.prefetch_size and not self.in_flight.locked():
+                await self.in_flight.acquire()
+                free_slots += 1
+
+            fetch_started_at = time.perf_counter()
+            try:
+                # NOTE(pjongy): Backend waits for idle_seconds if nothing is claimed
+                #  (blocking pop for redis, sleep for jasyncq)
+                tasks = await self.task_queue.fetch_tasks(
+                    queue_name=self.queue_name,
+                    limit=free_slots,
+                    lease_seconds=self.lease_seconds,
+                    wait_seconds=self.idle_seconds,
+                )
+                TASK_QUEUE_FETCH_SECONDS.labels(
+                    queue_name=self.queue_name,
+                    result='claimed' if tasks else 'empty',
+                ).observe(time.perf_counter() - fetch_started_at)
+            except Exception:
+                logger.exception(f'task fetch failed {self.queue_name}')
+                await asyncio.sleep(self.idle_seconds)
+                tasks = []
+
+            for _ in range(free_slots - len(tasks)):
+                self.in_flight.release()
+
+            if not tasks:
+                self.idle_seconds = min(self.idle_seconds * 2, self.max_idle_seconds)
+                continue
+            self.idle_seconds = self.min_idle_seconds
+
+            for task in tasks:
+                future = asyncio.ensure_future(self._process(task))
+                self.running.add(future)
+                future.add_done_callback(self.running.discard)
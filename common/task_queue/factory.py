@@ -0,0 +1,57 @@
+import aiomysql
+import aioredis
+
+from common.task_queue.abstract import AbstractTaskQueue
+from common.task_queue.jasyncq_backend import JasyncqTaskQueue
+from common.task_queue.redis_backend import RedisTaskQueue
+
+
+class TaskQueueBackend:
+    JASYNCQ = 'jasyncq'
+    REDIS = 'redis'
+
+
+class TaskQueueFactory:
+    """Shares one connection pool between topics of a process
+
+    task_queue_config is each service's `task_queue` config section
+    """
+
+    def __init__(self, task_queue_config):
+        self.config = task_queue_config
+        self.pool = None
+
+    async def connect(self):
+        if self.config.backend == TaskQueueBackend.JASYNCQ:
+            self.pool = await aiomysql.create_pool(
+                host=self.config.host,
+                port=self.config.port,
+                user=self.config.user,
+                password=self.config.password,
+                db=self.config.database,
+                autocommit=False,
+            )
+        elif self.config.backend == TaskQueueBackend.REDIS:
+            redis_config = self.config.redis
+            if redis_config is None:
+                raise ValueError('task_queue.redis should be set for redis backend')
+            self.pool = await aioredis.create_redis_pool(
+                (redis_config.host, redis_config.port),
+                db=redis_config.database,
+                password=redis_config.password,
+                encoding='utf-8',
+                maxsize=redis_config.max_connections,
+            )
+        else:
+            raise ValueError(f'task queue backend not allow: {self.config.backend}')
+
+    async def create(self, topic_name: str) -> AbstractTaskQueue:
+        if self.pool is None:
+            await self.connect()
+
+        if self.config.backend == TaskQueueBackend.REDIS:
+            task_queue = RedisTaskQueue(redis=self.pool, topic_name=topic_name)
+        else:
+            task_queue = JasyncqTaskQueue(pool=self.pool, topic_name=topic_name)
+        await task_queue.initialize()
+        return task_queue
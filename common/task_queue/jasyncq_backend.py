@@ -0,0 +1,78 @@
+import asyncio
+import time
+from typing import List
+
+from aiomysql import Pool
+from jasyncq.dispatcher.model.task import TaskIn, TaskOut
+from jasyncq.dispatcher.tasks import TasksDispatcher
+from jasyncq.repository.model.task import TaskStatus
+from jasyncq.repository.tasks import TaskRepository
+from pypika import Query
+
+from common.task_queue.abstract import AbstractTaskQueue
+
+
+class JasyncqTaskQueue(AbstractTaskQueue):
+    """MySQL table per topic, every fetch locks the table so it should not be polled hard"""
+
+    def __init__(self, pool: Pool, topic_name: str):
+        self.pool = pool
+        self.repository = TaskRepository(
+            pool=pool,
+            topic_name=topic_name,
+        )
+        self.dispatcher = TasksDispatcher(
+            repository=self.repository,
+        )
+
+    async def initialize(self):
+        await self.repository.initialize()
+
+    async def apply_tasks(self, tasks: List[TaskIn]) -> List[TaskOut]:
+        return await self.dispatcher.apply_tasks(tasks=tasks)
+
+    async def fetch_tasks(
+        self,
+        queue_name: str,
+        limit: int,
+        lease_seconds: int,
+        wait_seconds: float = 0.0,
+    ) -> List[TaskOut]:
+        tasks: List[TaskOut] = await self.dispatcher.fetch_pending_tasks(
+            queue_name=queue_name,
+            limit=limit,
+            check_term_seconds=lease_seconds,
+        )
+        # NOTE(pjongy): Second round trip only if pending tasks did not fill the limit
+        if len(tasks) < limit:
+            tasks.extend(await self.dispatcher.fetch_scheduled_tasks(
+                queue_name=queue_name,
+                limit=limit - len(tasks),
+            ))
+
+        if not tasks and wait_seconds > 0:
+            # NOTE(pjongy): There is no way to be notified, just relax polling
+            await asyncio.sleep(wait_seconds)
+        return tasks
+
+    async def extend_lease(self, task_ids: List[str], lease_seconds: int):
+        if not task_ids:
+            return
+
+        # NOTE(pjongy): jasyncq claims in-progress tasks whose progressed_at is older than
+        #  lease_seconds at fetch, so lease is extended by touching progressed_at
+        #  (worker's clock like jasyncq does)
+        repository = self.repository
+        query = Query.update(repository.task).set(
+            repository.task__progressed_at, int(time.time())
+        ).where(
+            repository.task__uuid.isin(task_ids)
+            & (repository.task__status == int(TaskStatus.WORK_IN_PROGRESS))
+        ).get_sql(quote_char='`')
+        async with self.pool.acquire() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute(query)
+            await connection.commit()
+
+    async def complete_tasks(self, task_ids: List[str]):
+        await self.dispatcher.complete_tasks(task_ids=task_ids)
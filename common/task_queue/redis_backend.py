@@ -0,0 +1,193 @@
+import math
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, List
+
+from aioredis import Redis
+from jasyncq.dispatcher.model.task import TaskIn, TaskOut
+
+from common.json_encoder import json_dumps_bytes, json_loads
+from common.task_queue.abstract import AbstractTaskQueue
+
+# NOTE(pjongy): Moves claimed tasks into in-progress set atomically, tasks whose lease is expired
+#  are claimed again before due tasks like jasyncq's pending tasks
+#  KEYS: queued zset, in-progress zset (both of queue), task hash
+#  ARGV: now, limit, lease deadline
+CLAIM_TASKS_SCRIPT = '''
+local limit = tonumber(ARGV[2])
+local tasks = {}
+local expired_ids = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1], 'LIMIT', 0, limit)
+for _, task_id in ipairs(expired_ids) do
+    local task = redis.call('HGET', KEYS[3], task_id)
+    if not task then
+        redis.call('ZREM', KEYS[2], task_id)
+    else
+        redis.call('ZADD', KEYS[2], ARGV[3], task_id)
+        table.insert(tasks, task)
+    end
+end
+if #tasks < limit then
+    local due_ids = redis.call(
+        'ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, limit - #tasks
+    )
+    for _, task_id in ipairs(due_ids) do
+        redis.call('ZREM', KEYS[1], task_id)
+        local task = redis.call('HGET', KEYS[3], task_id)
+        if task then
+            redis.call('ZADD', KEYS[2], ARGV[3], task_id)
+            table.insert(tasks, task)
+        end
+    end
+end
+return tasks
+'''
+
+MAX_NOTIFY_SIGNALS = 100
+
+
+class RedisTaskQueue(AbstractTaskQueue):
+    """Due tasks are scored by scheduled_at and claimed tasks by lease deadline in sorted sets
+    of each queue, idle consumers block on notify list instead of polling"""
+
+    def __init__(self, redis: Redis, topic_name: str):
+        self.redis = redis
+        # NOTE(pjongy): Hash tag keeps every key of a topic in same slot for redis cluster
+        self.key_prefix = f'jraze:task_queue:{{{topic_name}}}'
+        self.tasks_key = f'{self.key_prefix}:tasks'
+
+    def _queued_key(self, queue_name: str) -> str:
+        return f'{self.key_prefix}:queued:{queue_name}'
+
+    def _in_progress_key(self, queue_name: str) -> str:
+        # NOTE(pjongy): Per queue, so expired tasks of other queues never fill LIMIT of claim
+        return f'{self.key_prefix}:in_progress:{queue_name}'
+
+    def _notify_key(self, queue_name: str) -> str:
+        return f'{self.key_prefix}:notify:{queue_name}'
+
+    async def initialize(self):
+        pass
+
+    async def apply_tasks(self, tasks: List[TaskIn]) -> List[TaskOut]:
+        if not tasks:
+            return []
+
+        current_epoch = int(time.time())
+        task_outs = []
+        transaction = self.redis.multi_exec()
+        for task in tasks:
+            if task.depend_on is not None:
+                raise ValueError('redis task queue does not support depend_on')
+
+            task_out = TaskOut(
+                uuid=uuid.uuid4(),
+                scheduled_at=task.scheduled_at,
+                task=task.task,
+                queue_name=task.queue_name,
+            )
+            score = task.scheduled_at
+            if task.is_urgent and task.scheduled_at <= current_epoch:
+                score = 0  # NOTE(pjongy): Ahead of every due task
+
+            transaction.hset(self.tasks_key, str(task_out.uuid), json_dumps_bytes({
+                'uuid': str(task_out.uuid),
+                'scheduled_at': task_out.scheduled_at,
+                'task': task_out.task,
+                'queue_name': task_out.queue_name,
+            }))
+            transaction.zadd(self._queued_key(task.queue_name), score, str(task_out.uuid))
+            task_outs.append(task_out)
+
+        for queue_name in {task.queue_name for task in tasks}:
+            signals = min(
+                sum(1 for task in tasks if task.queue_name == queue_name),
+                MAX_NOTIFY_SIGNALS,
+            )
+            transaction.rpush(self._notify_key(queue_name), *([1] * signals))
+            transaction.ltrim(self._notify_key(queue_name), 0, MAX_NOTIFY_SIGNALS - 1)
+        await transaction.execute()
+        return task_outs
+
+    async def _claim_tasks(
+        self,
+        queue_name: str,
+        limit: int,
+        lease_seconds: int,
+    ) -> List[TaskOut]:
+        current_epoch = int(time.time())
+        task_jsons = await self.redis.eval(
+            CLAIM_TASKS_SCRIPT,
+            keys=[
+                self._queued_key(queue_name), self._in_progress_key(queue_name), self.tasks_key,
+            ],
+            args=[current_epoch, limit, current_epoch + lease_seconds],
+        )
+        return [TaskOut(**json_loads(task_json)) for task_json in task_jsons]
+
+    async def fetch_tasks(
+        self,
+        queue_name: str,
+        limit: int,
+        lease_seconds: int,
+        wait_seconds: float = 0.0,
+    ) -> List[TaskOut]:
+        tasks = await self._claim_tasks(
+            queue_name=queue_name,
+            limit=limit,
+            lease_seconds=lease_seconds,
+        )
+        if tasks or wait_seconds <= 0:
+            return tasks
+
+        # NOTE(pjongy): Scheduled tasks becoming due do not signal, so blocking is bounded.
+        #  Pool's shared connection would be blocked for other commands (claims, leases, rate
+        #  limiter) during BLPOP, so it runs on a connection acquired exclusively
+        with await self.redis as connection:
+            await connection.blpop(
+                self._notify_key(queue_name),
+                timeout=max(math.ceil(wait_seconds), 1),
+            )
+        return await self._claim_tasks(
+            queue_name=queue_name,
+            limit=limit,
+            lease_seconds=lease_seconds,
+        )
+
+    async def _group_task_ids_by_queue(self, task_ids: List[str]) -> Dict[str, List[str]]:
+        task_jsons = await self.redis.hmget(self.tasks_key, *task_ids)
+        task_ids_by_queue = defaultdict(list)
+        for task_id, task_json in zip(task_ids, task_jsons):
+            if task_json is not None:  # NOTE(pjongy): Already completed
+                task_ids_by_queue[json_loads(task_json)['queue_name']].append(task_id)
+        return task_ids_by_queue
+
+    async def extend_lease(self, task_ids: List[str], lease_seconds: int):
+        if not task_ids:
+            return
+
+        lease_deadline = int(time.time()) + lease_seconds
+        task_ids_by_queue = await self._group_task_ids_by_queue(task_ids=task_ids)
+        if not task_ids_by_queue:
+            return
+
+        transaction = self.redis.multi_exec()
+        for queue_name, queue_task_ids in task_ids_by_queue.items():
+            pairs = []
+            for task_id in queue_task_ids:
+                pairs.extend([lease_deadline, task_id])
+            # NOTE(pjongy): Only existing members are updated not to revive completed tasks
+            transaction.zadd(
+                self._in_progress_key(queue_name), *pairs, exist=self.redis.ZSET_IF_EXIST)
+        await transaction.execute()
+
+    async def complete_tasks(self, task_ids: List[str]):
+        if not task_ids:
+            return
+
+        task_ids_by_queue = await self._group_task_ids_by_queue(task_ids=task_ids)
+        transaction = self.redis.multi_exec()
+        for queue_name, queue_task_ids in task_ids_by_queue.items():
+            transaction.zrem(self._in_progress_key(queue_name), *queue_task_ids)
+        transaction.hdel(self.tasks_key, *task_ids)
+        await transaction.execute()
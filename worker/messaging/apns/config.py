@@ -1,4 +1,5 @@
 from pathlib import Path
+from typing import Optional
 
 import deserialize
 
@@ -7,7 +8,11 @@ from common.configutil import get_config
 
 class Config:
     @deserialize.parser('pool_size', int)
+    @deserialize.default('metrics_port', 0)
+    @deserialize.parser('metrics_port', int)
     class MessagingWorker:
+        @deserialize.parser('max_connections', int)
+        @deserialize.parser('max_in_flight', int)
         class APNs:
             class PEMCert:
                 file_name: str
@@ -21,19 +26,63 @@ class Config:
             pem_cert: PEMCert
             p8_cert: P8Cert
             cert_type: str
+            max_connections: int
+            # NOTE(pjongy): Concurrent send requests per replica, streams per connection are
+            #  negotiated by APNs (aioapns takes them from server's HTTP/2 settings)
+            max_in_flight: int
 
+        @deserialize.parser('sends_per_second', float)
+        @deserialize.parser('burst', int)
+        class RateLimit:
+            mode: str  # shared (task queue's MySQL or redis, by every replica) or local
+            sends_per_second: float  # per provider project, 0 to disable
+            burst: int  # sends allowed at once after idle
+
+        @deserialize.parser('max_in_flight', int)
+        @deserialize.parser('prefetch_size', int)
+        @deserialize.parser('max_idle_seconds', float)
+        @deserialize.default('lease_seconds', 60)
+        @deserialize.parser('lease_seconds', int)
+        class Consumer:
+            max_in_flight: int  # concurrently running tasks per replica
+            prefetch_size: int  # max tasks fetched at once
+            max_idle_seconds: float  # max backoff while queue is empty
+            # NOTE(pjongy): Running task's lease is extended every lease_seconds / 3, task is
+            #  claimed by another replica only if its replica stopped for lease_seconds
+            lease_seconds: int
+
+        @deserialize.default('backend', 'jasyncq')
         @deserialize.default('port', 3306)
         @deserialize.parser('port', int)
-        class MySQL:
-            host: str
+        class TaskQueue:
+            @deserialize.default('port', 6379)
+            @deserialize.default('database', 0)
+            @deserialize.default('max_connections', 10)
+            @deserialize.parser('port', int)
+            @deserialize.parser('database', int)
+            @deserialize.parser('max_connections', int)
+            class Redis:
+                host: str
+                port: int
+                password: Optional[str]
+                database: int
+                max_connections: int
+
+            backend: str  # jasyncq or redis, every service should use same backend
+            # NOTE(pjongy): MySQL connection for jasyncq backend
+            host: Optional[str]
             port: int
-            user: str
-            password: str
-            database: str
+            user: Optional[str]
+            password: Optional[str]
+            database: Optional[str]
+            redis: Optional[Redis]  # for redis backend
 
         apns: APNs
         pool_size: int
-        task_queue: MySQL
+        metrics_port: int  # replica listens metrics_port + pid, 0 to disable
+        task_queue: TaskQueue
+        consumer: Consumer
+        rate_limit: RateLimit
 
     push_worker: MessagingWorker
 
@@ -1,5 +1,17 @@
+import dataclasses
 from abc import ABC, abstractmethod
-from typing import Tuple, List
+from typing import Tuple, List, Optional
+
+
+INVALID_TOKEN_REASONS = {'BadDeviceToken', 'Unregistered'}
+
+
+@dataclasses.dataclass
+class APNsSendOutcome:
+    token: str
+    status: Optional[str]  # HTTP status from APNs, None if request did not reach APNs
+    reason: Optional[str]  # e.g) BadDeviceToken, Unregistered
+    apns_id: Optional[str]
 
 
 class AbstractAPNs(ABC):
@@ -8,5 +20,5 @@ class AbstractAPNs(ABC):
         self,
         targets: List[str],
         data: dict
-    ) -> Tuple[int, int]:
+    ) -> Tuple[int, int, List[APNsSendOutcome]]:
         raise NotImplementedError('inherit class and implement method')
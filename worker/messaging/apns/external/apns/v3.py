@@ -1,10 +1,15 @@
 import asyncio
-from typing import List, Tuple
+from typing import List, Tuple, Optional, Set
 from uuid import uuid4
 
 from aioapns import APNs, NotificationRequest, PushType
 
-from worker.messaging.apns.external.apns.abstract import AbstractAPNs
+from common.logger.logger import get_logger
+from common.rate_limiter.abstract import AbstractRateLimiter
+from common.rate_limiter.local import UnlimitedRateLimiter
+from worker.messaging.apns.external.apns.abstract import AbstractAPNs, APNsSendOutcome
+
+logger = get_logger(__name__)
 
 
 class APNsV3(AbstractAPNs):
@@ -16,6 +21,9 @@ class APNsV3(AbstractAPNs):
         p8_topic: str = '',
         pem_client_cert: str = '',
         cert_type: str = '',
+        max_connections: int = 10,
+        max_in_flight: int = 1000,
+        rate_limiter: Optional[AbstractRateLimiter] = None,
     ):
         args = {
             'pem': {
@@ -30,17 +38,23 @@ class APNsV3(AbstractAPNs):
         }[cert_type]
         self.apns = APNs(
             use_sandbox=False,
+            max_connections=max_connections,
             **args
         )
+        # NOTE(pjongy): Sliding window keeps every connection busy without queueing whole batch,
+        #  shared by concurrent send_data calls since connections are shared too
+        self.window_size = max_in_flight
+        self.window = asyncio.Semaphore(self.window_size)
+        self.rate_limiter = rate_limiter or UnlimitedRateLimiter(name=f'apns:{p8_topic}')
 
-    async def send_data(
+    async def _send(
         self,
-        targets: List[str],
-        data: dict
-    ) -> Tuple[int, int]:
-        collapse_key = str(uuid4())
-        results = await asyncio.gather(*[
-            self.apns.send_notification(
+        target: str,
+        data: dict,
+        collapse_key: str,
+    ) -> APNsSendOutcome:
+        try:
+            response = await self.apns.send_notification(
                 NotificationRequest(
                     device_token=target,
                     message=data,
@@ -48,14 +62,60 @@ class APNsV3(AbstractAPNs):
                     push_type=PushType.ALERT,
                 )
             )
-            for target in targets
-        ])
+        except Exception as e:
+            logger.error(f'apns data sent failed {e!r}')
+            return APNsSendOutcome(token=target, status=None, reason=repr(e), apns_id=None)
+
+        return APNsSendOutcome(
+            token=target,
+            status=response.status,
+            reason=response.description,
+            apns_id=response.notification_id,
+        )
+
+    async def send_data(
+        self,
+        targets: List[str],
+        data: dict
+    ) -> Tuple[int, int, List[APNsSendOutcome]]:
+        collapse_key = str(uuid4())
+        outcomes: List[Optional[APNsSendOutcome]] = [None] * len(targets)
+        in_flight: Set[asyncio.Future] = set()
+        reservation = self.rate_limiter.batch(size=len(targets))
+
+        async def send(index: int, target: str):
+            try:
+                try:
+                    await reservation.acquire(index=index)
+                except Exception as e:
+                    # NOTE(pjongy): e.g. shared rate limiter is unreachable, only this token fails
+                    logger.error(f'apns rate limit acquire failed {e!r}')
+                    outcomes[index] = APNsSendOutcome(
+                        token=target, status=None, reason=repr(e), apns_id=None)
+                    return
+
+                outcomes[index] = await self._send(
+                    target=target,
+                    data=data,
+                    collapse_key=collapse_key,
+                )
+            finally:
+                self.window.release()
+
+        for index, target in enumerate(targets):
+            await self.window.acquire()
+            future = asyncio.ensure_future(send(index=index, target=target))
+            in_flight.add(future)
+            future.add_done_callback(in_flight.discard)
+
+        if in_flight:
+            await asyncio.gather(*in_flight)
 
         success = 0
         failed = len(targets)
-        for response in results:
-            if response.is_successful:
+        for outcome in outcomes:
+            if outcome.status == '200':
                 success += 1
         failed -= success
 
-        return success, failed
+        return success, failed, outcomes
@@ -1,15 +1,16 @@
 import asyncio
-import dataclasses
-from typing import Dict, List
+from typing import Dict
 
-import aiomysql
-import deserialize
-from jasyncq.dispatcher.tasks import TasksDispatcher
 from jasyncq.dispatcher.model.task import TaskOut
-from jasyncq.repository.tasks import TaskRepository
 
 from common.logger.logger import get_logger
-from common.structure.job.messaging import MessagingJob, MessagingTask
+from common.metrics import JOB_SECONDS, start_metrics_server
+from common.structure.job.messaging import MessagingJob, MessagingTask, \
+    messaging_job_from_dict, messaging_job_to_dict
+from common.rate_limiter.abstract import AbstractRateLimiter
+from common.rate_limiter.factory import RateLimiterFactory
+from common.task_queue.consumer import TaskConsumer
+from common.task_queue.factory import TaskQueueFactory
 from worker.messaging.apns.external.apns.v3 import APNsV3
 from worker.messaging.apns.task.send_push_message import SendPushMessageTask
 from worker.messaging.apns.config import config
@@ -21,54 +22,44 @@ logger = get_logger(__name__)
 
 class Replica:
     MESSAGING_QUEUE = 'MESSAGING_QUEUE'
-    TASK_FETCH_SIZE = 1
 
     def __init__(self, pid):
         loop = asyncio.get_event_loop()
 
-        task_queue_config = config.push_worker.task_queue
-        self.task_queue_pool = loop.run_until_complete(
-            aiomysql.create_pool(
-                host=task_queue_config.host,
-                port=task_queue_config.port,
-                user=task_queue_config.user,
-                password=task_queue_config.password,
-                db=task_queue_config.database,
-                loop=loop,
-                autocommit=False,
-            )
-        )
-
-        messaging_task_queue_repository = TaskRepository(
-            pool=self.task_queue_pool,
-            topic_name='APNS_MESSAGING_TOPIC',
+        task_queue_factory = TaskQueueFactory(task_queue_config=config.push_worker.task_queue)
+        self.messaging_task_queue = loop.run_until_complete(
+            task_queue_factory.create(topic_name='APNS_MESSAGING_TOPIC')
         )
-        loop.run_until_complete(messaging_task_queue_repository.initialize())
-        self.messaging_task_queue = TasksDispatcher(
-            repository=messaging_task_queue_repository,
+        notification_task_queue = loop.run_until_complete(
+            task_queue_factory.create(topic_name='NOTIFICATION_TOPIC')
         )
 
-        notification_queue_repository = TaskRepository(
-            pool=self.task_queue_pool,
-            topic_name='NOTIFICATION_TOPIC',
+        rate_limiter_factory = RateLimiterFactory(
+            rate_limit_config=config.push_worker.rate_limit,
+            task_queue_factory=task_queue_factory,
         )
-        loop.run_until_complete(notification_queue_repository.initialize())
-        notification_queue_dispatcher = TasksDispatcher(
-            repository=notification_queue_repository
+        rate_limiter = loop.run_until_complete(
+            rate_limiter_factory.create(name=self.rate_limiter_name())
         )
-
-        apns: AbstractAPNs = self.create_apns_client()
+        apns: AbstractAPNs = self.create_apns_client(rate_limiter=rate_limiter)
         self.tasks: Dict[MessagingTask, AbstractTask] = {
             MessagingTask.SEND_PUSH_MESSAGE: SendPushMessageTask(
                 apns=apns,
-                notification_task_queue=notification_queue_dispatcher,
+                notification_task_queue=notification_task_queue,
             )
         }
 
+        start_metrics_server(base_port=config.push_worker.metrics_port, pid=pid)
         logger.info(f'Worker {pid} up')
         loop.run_until_complete(self.job())
 
-    def create_apns_client(self) -> AbstractAPNs:
+    def rate_limiter_name(self) -> str:
+        apns_config = config.push_worker.apns
+        if apns_config.cert_type == 'p8':
+            return f'apns:{apns_config.p8_cert.topic}'
+        return 'apns:pem'
+
+    def create_apns_client(self, rate_limiter: AbstractRateLimiter) -> AbstractAPNs:
         apns_config = config.push_worker.apns
         return APNsV3(
             p8_filename=apns_config.p8_cert.file_name,
@@ -77,6 +68,9 @@ class Replica:
             p8_topic=apns_config.p8_cert.topic,
             pem_client_cert=apns_config.pem_cert.file_name,
             cert_type=apns_config.cert_type,
+            max_connections=apns_config.max_connections,
+            max_in_flight=apns_config.max_in_flight,
+            rate_limiter=rate_limiter,
         )
 
     async def process_job(self, job: MessagingJob):  # real worker if job published
@@ -88,31 +82,23 @@ class Replica:
                 logger.warning(f'unknown task({job.task.name}): {e}')
                 return
 
-            await task.run(kwargs=job.kwargs)
+            with JOB_SECONDS.labels(task=job.task.name).time():
+                await task.run(kwargs=job.kwargs)
         except Exception:
-            logger.exception(f'Fatal Error! {dataclasses.asdict(job)}')
+            logger.exception(f'Fatal Error! {messaging_job_to_dict(job)}')
 
-    async def job(self):  # real working job
-        while True:
-            pending_tasks = await self.messaging_task_queue.fetch_pending_tasks(
-                queue_name=self.MESSAGING_QUEUE,
-                limit=self.TASK_FETCH_SIZE,
-                check_term_seconds=60,
-            )
-            scheduled_tasks = await self.messaging_task_queue.fetch_scheduled_tasks(
-                queue_name=self.MESSAGING_QUEUE,
-                limit=self.TASK_FETCH_SIZE,
-            )
+    async def process_task(self, task: TaskOut):
+        await self.process_job(job=messaging_job_from_dict(task.task))
 
-            tasks: List[TaskOut] = [*pending_tasks, *scheduled_tasks]
-            if not tasks:
-                # NOTE(pjongy): Relax wasting
-                await asyncio.sleep(1)
-
-            await asyncio.gather(*[
-                self.process_job(job=deserialize.deserialize(MessagingJob, task.task))
-                for task in tasks
-            ])
-            task_ids = [str(task.uuid) for task in tasks]
-            if task_ids:
-                await self.messaging_task_queue.complete_tasks(task_ids=task_ids)
+    async def job(self):  # real working job
+        consumer_config = config.push_worker.consumer
+        consumer = TaskConsumer(
+            task_queue=self.messaging_task_queue,
+            queue_name=self.MESSAGING_QUEUE,
+            handler=self.process_task,
+            max_in_flight=consumer_config.max_in_flight,
+            prefetch_size=consumer_config.prefetch_size,
+            max_idle_seconds=consumer_config.max_idle_seconds,
+            lease_seconds=consumer_config.lease_seconds,
+        )
+        await consumer.run()
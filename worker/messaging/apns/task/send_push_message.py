@@ -1,13 +1,15 @@
-import dataclasses
+from collections import Counter
 
 import deserialize
 from jasyncq.dispatcher.model.task import TaskIn
-from jasyncq.dispatcher.tasks import TasksDispatcher
 
 from common.logger.logger import get_logger
+from common.metrics import PUSH_SEND_SECONDS, PUSH_SENT_TOTAL, PUSH_INVALID_TOKENS_TOTAL
 from common.structure.job.messaging import SendPushMessageArgs
-from common.structure.job.notification import NotificationJob, NotificationTask
-from worker.messaging.apns.external.apns.abstract import AbstractAPNs
+from common.structure.job.notification import NotificationJob, NotificationTask, \
+    notification_job_to_dict
+from common.task_queue.abstract import AbstractTaskQueue
+from worker.messaging.apns.external.apns.abstract import AbstractAPNs, INVALID_TOKEN_REASONS
 from worker.messaging.apns.task import AbstractTask
 
 logger = get_logger(__name__)
@@ -17,7 +19,7 @@ class SendPushMessageTask(AbstractTask):
     def __init__(
         self,
         apns: AbstractAPNs,
-        notification_task_queue: TasksDispatcher,
+        notification_task_queue: AbstractTaskQueue,
     ):
         self.apns: AbstractAPNs = apns
         self.notification_task_queue = notification_task_queue
@@ -28,32 +30,56 @@ class SendPushMessageTask(AbstractTask):
         if not task_args.push_tokens:
             return
 
-        sent, failed = await self.apns.send_data(
-            targets=task_args.push_tokens,
-            data={
-                'aps': {
-                    'alert': {
-                        'title': task_args.title,
-                        'body': task_args.body,
+        with PUSH_SEND_SECONDS.labels(provider='apns').time():
+            sent, failed, outcomes = await self.apns.send_data(
+                targets=task_args.push_tokens,
+                data={
+                    'aps': {
+                        'alert': {
+                            'title': task_args.title,
+                            'body': task_args.body,
+                        }
                     }
                 }
-            }
-        )
+            )
+        PUSH_SENT_TOTAL.labels(provider='apns', result='success').inc(sent)
+        PUSH_SENT_TOTAL.labels(provider='apns', result='failure').inc(failed)
 
         logger.info(f'sent: {sent}, failed: {failed}')
+        if failed:
+            failed_reasons = Counter(
+                outcome.reason for outcome in outcomes if outcome.status != '200'
+            )
+            logger.info(f'failed reasons: {dict(failed_reasons)}')
+
+        invalid_tokens = [
+            outcome.token for outcome in outcomes if outcome.reason in INVALID_TOKEN_REASONS
+        ]
+        jobs = [
+            NotificationJob(
+                task=NotificationTask.UPDATE_RESULT,
+                kwargs={
+                    'device_platform': task_args.device_platform,
+                    'notification_uuid': task_args.notification_id,
+                    'sent': sent,
+                    'failed': failed,
+                },
+            ),
+        ]
+        if invalid_tokens:
+            PUSH_INVALID_TOKENS_TOTAL.labels(provider='apns').inc(len(invalid_tokens))
+            jobs.append(NotificationJob(
+                task=NotificationTask.PRUNE_PUSH_TOKENS,
+                kwargs={
+                    'push_tokens': invalid_tokens,
+                },
+            ))
         await self.notification_task_queue.apply_tasks(
             tasks=[
                 TaskIn(
-                    task=dataclasses.asdict(deserialize.deserialize(NotificationJob, {
-                        'task': NotificationTask.UPDATE_RESULT,
-                        'kwargs': {
-                            'device_platform': task_args.device_platform,
-                            'notification_uuid': task_args.notification_id,
-                            'sent': sent,
-                            'failed': failed,
-                        }
-                    })),
+                    task=notification_job_to_dict(job),
                     queue_name='NOTIFICATION_JOB_QUEUE',
                 )
+                for job in jobs
             ],
         )
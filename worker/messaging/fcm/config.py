@@ -1,4 +1,5 @@
 from pathlib import Path
+from typing import Optional
 
 import deserialize
 
@@ -7,11 +8,17 @@ from common.configutil import get_config
 
 class Config:
     @deserialize.parser('pool_size', int)
+    @deserialize.default('metrics_port', 0)
+    @deserialize.parser('metrics_port', int)
     class MessagingWorker:
         class FCM:
+            @deserialize.parser('max_in_flight', int)
+            @deserialize.parser('http2', lambda arg: str(arg).lower() == 'true')
             class V1:
                 project_id: str
                 key_file_name: str
+                max_in_flight: int  # concurrent send requests per replica
+                http2: bool
 
             class Legacy:
                 server_key: str
@@ -20,18 +27,58 @@ class Config:
             legacy: Legacy
             client: str
 
+        @deserialize.parser('sends_per_second', float)
+        @deserialize.parser('burst', int)
+        class RateLimit:
+            mode: str  # shared (task queue's MySQL or redis, by every replica) or local
+            sends_per_second: float  # per provider project, 0 to disable
+            burst: int  # sends allowed at once after idle
+
+        @deserialize.parser('max_in_flight', int)
+        @deserialize.parser('prefetch_size', int)
+        @deserialize.parser('max_idle_seconds', float)
+        @deserialize.default('lease_seconds', 60)
+        @deserialize.parser('lease_seconds', int)
+        class Consumer:
+            max_in_flight: int  # concurrently running tasks per replica
+            prefetch_size: int  # max tasks fetched at once
+            max_idle_seconds: float  # max backoff while queue is empty
+            # NOTE(pjongy): Running task's lease is extended every lease_seconds / 3, task is
+            #  claimed by another replica only if its replica stopped for lease_seconds
+            lease_seconds: int
+
+        @deserialize.default('backend', 'jasyncq')
         @deserialize.default('port', 3306)
         @deserialize.parser('port', int)
-        class MySQL:
-            host: str
+        class TaskQueue:
+            @deserialize.default('port', 6379)
+            @deserialize.default('database', 0)
+            @deserialize.default('max_connections', 10)
+            @deserialize.parser('port', int)
+            @deserialize.parser('database', int)
+            @deserialize.parser('max_connections', int)
+            class Redis:
+                host: str
+                port: int
+                password: Optional[str]
+                database: int
+                max_connections: int
+
+            backend: str  # jasyncq or redis, every service should use same backend
+            # NOTE(pjongy): MySQL connection for jasyncq backend
+            host: Optional[str]
             port: int
-            user: str
-            password: str
-            database: str
+            user: Optional[str]
+            password: Optional[str]
+            database: Optional[str]
+            redis: Optional[Redis]  # for redis backend
 
         fcm: FCM
         pool_size: int
-        task_queue: MySQL
+        metrics_port: int  # replica listens metrics_port + pid, 0 to disable
+        task_queue: TaskQueue
+        consumer: Consumer
+        rate_limit: RateLimit
 
     push_worker: MessagingWorker
 
@@ -8,5 +8,6 @@ class AbstractFCM(ABC):
         self,
         targets: List[str],
         data: dict
-    ) -> Tuple[int, int]:
+    ) -> Tuple[int, int, List[str]]:
+        """Returns sent, failed and invalid tokens (unregistered or malformed) to be pruned"""
         raise NotImplementedError('inherit class and implement method')
@@ -1,39 +1,55 @@
-from typing import List, Tuple
-
-import httpx
+from typing import List, Tuple, Optional
 
+from common.http_client import PooledHttpClient
+from common.json_encoder import json_loads
 from common.logger.logger import get_logger
+from common.rate_limiter.abstract import AbstractRateLimiter
+from common.rate_limiter.local import UnlimitedRateLimiter
 from worker.messaging.fcm.external.fcm.abstract import AbstractFCM
 
 logger = get_logger(__name__)
 
+INVALID_TOKEN_ERRORS = {'NotRegistered', 'InvalidRegistration'}
+
 
 class FCMClientLegacy(AbstractFCM):
     FCM_API_HOST = 'https://fcm.googleapis.com'
 
-    def __init__(self, server_key):
+    def __init__(self, server_key, rate_limiter: Optional[AbstractRateLimiter] = None):
         self.server_key = server_key
+        self.rate_limiter = rate_limiter or UnlimitedRateLimiter(name='fcm:legacy')
+        # NOTE(pjongy): Shared by concurrent send_data calls not to open connection per batch
+        self.http = PooledHttpClient(keepalive_expiry=60.0)
 
     async def send_data(
         self,
         targets: List[str],
         data: dict
-    ) -> Tuple[int, int]:
+    ) -> Tuple[int, int, List[str]]:
         PUSH_SEND_PATH = '/fcm/send'
         body = {
             **data,
             "registration_ids": targets
         }
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                url=f'{self.FCM_API_HOST}{PUSH_SEND_PATH}',
-                json=body,
-                headers={'Authorization': f'key={self.server_key}'}
-            )
-            logger.debug(response)
-
-            if not 200 <= response.status_code < 300:
-                raise PermissionError(f'fcm data sent failed {response}')
-
-            result = response.json()
-            return result['success'], result['failure']
+        # NOTE(pjongy): Single request sends to every target, counted as many sends by FCM
+        await self.rate_limiter.acquire(tokens=len(targets))
+        response = await self.http.post_json(
+            url=f'{self.FCM_API_HOST}{PUSH_SEND_PATH}',
+            body=body,
+            headers={
+                'Authorization': f'key={self.server_key}',
+            }
+        )
+        logger.debug(response)
+
+        if not 200 <= response.status_code < 300:
+            raise PermissionError(f'fcm data sent failed {response}')
+
+        result = json_loads(response.content)
+        # NOTE(pjongy): results are in same order with registration_ids
+        invalid_tokens = [
+            target
+            for target, target_result in zip(targets, result.get('results', []))
+            if target_result.get('error') in INVALID_TOKEN_ERRORS
+        ]
+        return result['success'], result['failure'], invalid_tokens
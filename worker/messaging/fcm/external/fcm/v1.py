@@ -1,66 +1,178 @@
 import asyncio
-from typing import List, Tuple
+import dataclasses
+import datetime
+import time
+from typing import List, Tuple, Optional
 
 import google.auth
 import google.auth.transport.requests
-import httpx
 from google.oauth2.service_account import Credentials
 from httpx import Response
 
+from common.http_client import PooledHttpClient
+from common.json_encoder import json_loads
 from common.logger.logger import get_logger
+from common.rate_limiter.abstract import AbstractRateLimiter
+from common.rate_limiter.local import UnlimitedRateLimiter
 from worker.messaging.fcm.external.fcm.abstract import AbstractFCM
 
 logger = get_logger(__name__)
 
 
+# NOTE(pjongy): INVALID_ARGUMENT is also returned for wrong message, so it is invalid token only
+#  if error message is about registration token
+UNREGISTERED_ERROR_CODE = 'UNREGISTERED'
+INVALID_ARGUMENT_ERROR_CODE = 'INVALID_ARGUMENT'
+
+
+def _is_invalid_token_error(error: dict) -> bool:
+    error_codes = {
+        detail.get('errorCode')
+        for detail in error.get('details', [])
+    }
+    if UNREGISTERED_ERROR_CODE in error_codes:
+        return True
+    return (
+        INVALID_ARGUMENT_ERROR_CODE in error_codes
+        and 'registration token' in error.get('message', '')
+    )
+
+
+@dataclasses.dataclass
+class BatchStats:
+    size: int
+    sent: int
+    failed: int
+    invalid: int
+    elapsed_seconds: float
+    sends_per_second: float
+
+
 class FCMClientV1(AbstractFCM):
     FCM_BASE_URL = 'https://fcm.googleapis.com/v1/projects/'
     SCOPES = ['https://www.googleapis.com/auth/firebase.messaging']
+    ACCESS_TOKEN_REFRESH_MARGIN = datetime.timedelta(minutes=5)
 
-    def __init__(self, project_id: str, service_account_file_name: str):
+    def __init__(
+        self,
+        project_id: str,
+        service_account_file_name: str,
+        max_in_flight: int = 500,
+        http2: bool = True,
+        rate_limiter: Optional[AbstractRateLimiter] = None,
+    ):
         self.project_id = project_id
+        self.rate_limiter = rate_limiter or UnlimitedRateLimiter(name=f'fcm:{project_id}')
         self.credential: Credentials = Credentials.from_service_account_file(
             service_account_file_name,
             scopes=self.SCOPES
         )
+        self.max_in_flight = max_in_flight
+        # NOTE(pjongy): Shared by concurrent send_data calls, max_in_flight is per replica
+        self.window = asyncio.Semaphore(max_in_flight)
+        # NOTE(pjongy): With HTTP/2 a few connections multiplex the whole in-flight window
+        self.http = PooledHttpClient(
+            max_connections=max_in_flight,
+            max_keepalive_connections=max_in_flight,
+            keepalive_expiry=60.0,
+            timeout=10.0,
+            http2=http2,
+        )
+        self.last_batch_stats: Optional[BatchStats] = None
+        self._refresh_task: Optional[asyncio.Future] = None
+
+    def _refresh_access_token(self):  # blocking, runs on executor thread
+        self.credential.refresh(google.auth.transport.requests.Request())
 
-    def get_access_token(self):
-        if self.credential.expiry is None or self.credential.expired:
-            self.credential.refresh(google.auth.transport.requests.Request())
+    def _access_token_expires_in(self) -> Optional[datetime.timedelta]:
+        if self.credential.token is None or self.credential.expiry is None:
+            return None
+        # NOTE(pjongy): google-auth keeps expiry as naive UTC datetime
+        return self.credential.expiry - datetime.datetime.utcnow()
+
+    def _start_refresh(self) -> asyncio.Future:
+        if self._refresh_task is None or self._refresh_task.done():
+            loop = asyncio.get_event_loop()
+            self._refresh_task = loop.run_in_executor(None, self._refresh_access_token)
+        return self._refresh_task
+
+    async def get_access_token(self) -> str:
+        expires_in = self._access_token_expires_in()
+        if expires_in is None or expires_in <= datetime.timedelta(0):
+            await self._start_refresh()
+        elif expires_in < self.ACCESS_TOKEN_REFRESH_MARGIN:
+            # NOTE(pjongy): Still valid, keep sending with it while refreshing in background
+            self._start_refresh()
         return self.credential.token
 
     async def send_data(
         self,
         targets: List[str],
         data: dict
-    ) -> Tuple[int, int]:
+    ) -> Tuple[int, int, List[str]]:
         PUSH_SEND_PATH = f'{self.project_id}/messages:send'
-        async with httpx.AsyncClient() as client:
-            results: List[Response] = await asyncio.gather(*[
-                client.post(
+        started_at = time.monotonic()
+        reservation = self.rate_limiter.batch(size=len(targets))
+
+        async def send(index: int, target: str) -> Response:
+            async with self.window:
+                await reservation.acquire(index=index)
+                access_token = await self.get_access_token()
+                return await self.http.post_json(
                     url=f'{self.FCM_BASE_URL}{PUSH_SEND_PATH}',
-                    json={
+                    body={
                         "message": {
                             "token": target,
                             **data
                         }
                     },
                     headers={
-                        'Authorization': f'Bearer {self.get_access_token()}'
+                        'Authorization': f'Bearer {access_token}'
                     }
                 )
-                for target in targets
-            ])
 
-            success = 0
-            failed = len(targets)
-            for response in results:
-                logger.debug(response)
-                if not 200 <= response.status_code < 300:
-                    logger.error(f'fcm data sent failed {response}')
+        results = await asyncio.gather(
+            *[send(index=index, target=target) for index, target in enumerate(targets)],
+            return_exceptions=True,
+        )
+
+        success = 0
+        failed = len(targets)
+        invalid_tokens = []
+        for target, response in zip(targets, results):
+            if isinstance(response, Exception):
+                logger.error(f'fcm data sent failed {response!r}')
+                continue
 
-                if 'name' in response.json():
-                    success += 1
-            failed -= success
+            logger.debug(response)
+            if not 200 <= response.status_code < 300:
+                logger.error(f'fcm data sent failed {response}')
 
-            return success, failed
+            try:
+                content = json_loads(response.content)
+            except ValueError:
+                # NOTE(pjongy): e.g) HTML body of proxy error, counted as failed
+                logger.error(f'fcm data sent failed with non JSON body {response}')
+                continue
+
+            if 'name' in content:
+                success += 1
+            elif _is_invalid_token_error(content.get('error', {})):
+                invalid_tokens.append(target)
+        failed -= success
+
+        elapsed_seconds = time.monotonic() - started_at
+        self.last_batch_stats = BatchStats(
+            size=len(targets),
+            sent=success,
+            failed=failed,
+            invalid=len(invalid_tokens),
+            elapsed_seconds=elapsed_seconds,
+            sends_per_second=len(targets) / elapsed_seconds if elapsed_seconds else 0.0,
+        )
+        logger.info(
+            f'fcm batch stats: {dataclasses.asdict(self.last_batch_stats)}, '
+            f'http stats: {self.http.stats.to_dict()}, '
+            f'rate limit stats: {self.rate_limiter.stats.to_dict()}'
+        )
+        return success, failed, invalid_tokens
@@ -1,12 +1,12 @@
-import dataclasses
-
 import deserialize
 from jasyncq.dispatcher.model.task import TaskIn
-from jasyncq.dispatcher.tasks import TasksDispatcher
 
 from common.logger.logger import get_logger
+from common.metrics import PUSH_SEND_SECONDS, PUSH_SENT_TOTAL, PUSH_INVALID_TOKENS_TOTAL
 from common.structure.job.messaging import SendPushMessageArgs
-from common.structure.job.notification import NotificationJob, NotificationTask
+from common.structure.job.notification import NotificationJob, NotificationTask, \
+    notification_job_to_dict
+from common.task_queue.abstract import AbstractTaskQueue
 from worker.messaging.fcm.external.fcm.abstract import AbstractFCM
 from worker.messaging.fcm.task import AbstractTask
 
@@ -17,7 +17,7 @@ class SendPushMessageTask(AbstractTask):
     def __init__(
         self,
         fcm: AbstractFCM,
-        notification_task_queue: TasksDispatcher,
+        notification_task_queue: AbstractTaskQueue,
     ):
         self.fcm: AbstractFCM = fcm
         self.notification_task_queue = notification_task_queue
@@ -28,31 +28,46 @@ class SendPushMessageTask(AbstractTask):
         if not task_args.push_tokens:
             return
 
-        sent, failed = await self.fcm.send_data(
-            targets=task_args.push_tokens,
-            data={
-                'notification': {
-                    'title': task_args.title,
-                    'body': task_args.body,
-                    'image': task_args.image_url,
+        with PUSH_SEND_SECONDS.labels(provider='fcm').time():
+            sent, failed, invalid_tokens = await self.fcm.send_data(
+                targets=task_args.push_tokens,
+                data={
+                    'notification': {
+                        'title': task_args.title,
+                        'body': task_args.body,
+                        'image': task_args.image_url,
+                    }
                 }
-            }
-        )
+            )
+        PUSH_SENT_TOTAL.labels(provider='fcm', result='success').inc(sent)
+        PUSH_SENT_TOTAL.labels(provider='fcm', result='failure').inc(failed)
 
-        logger.info(f'sent: {sent}, failed: {failed}')
+        logger.info(f'sent: {sent}, failed: {failed}, invalid tokens: {len(invalid_tokens)}')
+        jobs = [
+            NotificationJob(
+                task=NotificationTask.UPDATE_RESULT,
+                kwargs={
+                    'device_platform': task_args.device_platform,
+                    'notification_uuid': task_args.notification_id,
+                    'sent': sent,
+                    'failed': failed,
+                },
+            ),
+        ]
+        if invalid_tokens:
+            PUSH_INVALID_TOKENS_TOTAL.labels(provider='fcm').inc(len(invalid_tokens))
+            jobs.append(NotificationJob(
+                task=NotificationTask.PRUNE_PUSH_TOKENS,
+                kwargs={
+                    'push_tokens': invalid_tokens,
+                },
+            ))
         await self.notification_task_queue.apply_tasks(
             tasks=[
                 TaskIn(
-                    task=dataclasses.asdict(deserialize.deserialize(NotificationJob, {
-                        'task': NotificationTask.UPDATE_RESULT,
-                        'kwargs': {
-                            'device_platform': task_args.device_platform,
-                            'notification_uuid': task_args.notification_id,
-                            'sent': sent,
-                            'failed': failed,
-                        }
-                    })),
+                    task=notification_job_to_dict(job),
                     queue_name='NOTIFICATION_JOB_QUEUE',
                 )
+                for job in jobs
             ],
         )
@@ -1,29 +1,95 @@
 from pathlib import Path
+from typing import Optional
 
 import deserialize
 
 from common.configutil import get_config
 
 
+def _positive_int(arg) -> int:
+    value = int(arg)
+    if value < 1:
+        raise ValueError(f'should be at least 1: {arg}')
+    return value
+
+
 class Config:
+    @deserialize.parser('launch_shard_count', _positive_int)
+    @deserialize.parser('result_flush_interval_seconds', float)
+    @deserialize.parser('result_flush_threshold', int)
+    @deserialize.default('metrics_port', 0)
+    @deserialize.parser('metrics_port', int)
     class NotificationWorker:
+        @deserialize.default('backend', 'jasyncq')
         @deserialize.default('port', 3306)
         @deserialize.parser('port', int)
-        class MySQL:
-            host: str
+        class TaskQueue:
+            @deserialize.default('port', 6379)
+            @deserialize.default('database', 0)
+            @deserialize.default('max_connections', 10)
+            @deserialize.parser('port', int)
+            @deserialize.parser('database', int)
+            @deserialize.parser('max_connections', int)
+            class Redis:
+                host: str
+                port: int
+                password: Optional[str]
+                database: int
+                max_connections: int
+
+            backend: str  # jasyncq or redis, every service should use same backend
+            # NOTE(pjongy): MySQL connection for jasyncq backend
+            host: Optional[str]
             port: int
-            user: str
-            password: str
-            database: str
+            user: Optional[str]
+            password: Optional[str]
+            database: Optional[str]
+            redis: Optional[Redis]  # for redis backend
+
+        @deserialize.parser('max_in_flight', int)
+        @deserialize.parser('prefetch_size', int)
+        @deserialize.parser('max_idle_seconds', float)
+        @deserialize.parser('lease_seconds', int)
+        class Consumer:
+            max_in_flight: int  # concurrently running tasks per replica
+            prefetch_size: int  # max tasks fetched at once
+            max_idle_seconds: float  # max backoff while queue is empty
+            # NOTE(pjongy): Running task's lease is extended every lease_seconds / 3, task is
+            #  claimed by another replica only if its replica stopped for lease_seconds
+            lease_seconds: int
 
         class External:
             class Jraze:
+                @deserialize.parser('max_connections', int)
+                @deserialize.parser('max_keepalive_connections', int)
+                @deserialize.parser('keepalive_expiry', float)
+                @deserialize.parser('timeout', float)
+                @deserialize.parser('http2', lambda arg: str(arg).lower() == 'true')
+                class HttpClient:
+                    max_connections: int
+                    max_keepalive_connections: int
+                    keepalive_expiry: float  # seconds
+                    timeout: float  # seconds
+                    http2: bool
+
                 base_url: str
                 x_server_key: str
+                http: HttpClient
             jraze: Jraze
 
         pool_size: str
-        task_queue: MySQL
+        metrics_port: int  # replica listens metrics_port + pid, 0 to disable
+        launch_shard_count: int  # split a launch into sub-tasks by device's random_bucket range
+        # NOTE(pjongy): Sent results are aggregated per notification until one of them is reached,
+        #  each result holds a consumer slot until flushed so threshold is at most half of
+        #  consumer.max_in_flight
+        result_flush_interval_seconds: float
+        result_flush_threshold: int
+        task_queue: TaskQueue
+        consumer: Consumer
+        # NOTE(pjongy): Launch shards are consumed from their own queue with small in-flight
+        #  so that shards of a launch are spread over replicas
+        launch_shard_consumer: Consumer
         external: External
 
     notification_worker: NotificationWorker
@@ -1,8 +1,10 @@
-from typing import List
+import dataclasses
+from typing import List, Optional, Tuple, Dict
 
 import deserialize
-import httpx
 
+from common.http_client import PooledHttpClient
+from common.json_encoder import json_loads
 from common.structure.enum import DevicePlatform, SendPlatform
 from worker.notification.config import config
 from common.logger.logger import get_logger
@@ -11,24 +13,73 @@ from worker.notification.exception.external import ExternalException
 logger = get_logger(__name__)
 
 
+@dataclasses.dataclass
 class SearchDeviceResponse:
+    @dataclasses.dataclass
     class Result:
+        @dataclasses.dataclass
         class Device:
+            __slots__ = (
+                'id', 'external_id', 'push_token', 'send_platform', 'device_platform',
+                'device_properties',
+            )
+
             id: int
             external_id: str
             push_token: str
             send_platform: SendPlatform
             device_platform: DevicePlatform
             device_properties: dict
-        total: int
+        total: Optional[int]
         devices: List[Device]
+        next_cursor: Optional[str]
     result: Result
 
 
+def search_device_response_from_dict(response: dict) -> SearchDeviceResponse:
+    # NOTE(pjongy): Decoded without deserialize since it is called for every page of launch
+    result = response['result']
+    return SearchDeviceResponse(
+        result=SearchDeviceResponse.Result(
+            total=result.get('total'),
+            devices=[
+                SearchDeviceResponse.Result.Device(
+                    id=device['id'],
+                    external_id=device['external_id'],
+                    push_token=device['push_token'],
+                    send_platform=SendPlatform(device['send_platform']),
+                    device_platform=DevicePlatform(device['device_platform']),
+                    device_properties=device.get('device_properties', {}),
+                )
+                for device in result['devices']
+            ],
+            next_cursor=result.get('next_cursor'),
+        ),
+    )
+
+
 class LogNotificationResponse:
     result: int
 
 
+class LaunchShardResponse:
+    class Result:
+        shard_index: int
+        bucket_start: int
+        bucket_end: int
+        devices: int
+        done: bool
+        cursor: Optional[str]
+        pages: int
+    result: Result
+
+
+class PrunePushTokensResponse:
+    class Result:
+        pruned: int
+    result: Result
+
+
 class IncreaseNotificationSentResponse:
     class Result:
         ios: int
@@ -36,58 +87,81 @@ class IncreaseNotificationSentResponse:
     result: Result
 
 
+class IncreaseNotificationsSentResponse:
+    class Result:
+        class SentAmount:
+            uuid: str
+            ios: int
+            android: int
+        increased: List[SentAmount]
+        not_found: List[str]
+    result: Result
+
+
 class JrazeApi:
     JRAZE_BASE_URL = config.notification_worker.external.jraze.base_url
     X_SERVER_KEY = config.notification_worker.external.jraze.x_server_key
 
+    def __init__(self):
+        http_config = config.notification_worker.external.jraze.http
+        self.http = PooledHttpClient(
+            max_connections=http_config.max_connections,
+            max_keepalive_connections=http_config.max_keepalive_connections,
+            keepalive_expiry=http_config.keepalive_expiry,
+            timeout=http_config.timeout,
+            http2=http_config.http2,
+        )
+
     async def log_notification(
         self,
         device_ids: List[int],
         notification_id: int,
     ) -> LogNotificationResponse:
         NOTIFICATION_LOG_PATH = 'internal/devices/logs/notification:add'
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                url=f'{self.JRAZE_BASE_URL}{NOTIFICATION_LOG_PATH}',
-                json={
-                    'device_ids': device_ids,
-                    'notification_id': notification_id,
-                },
-                headers={
-                    'X-Server-Key': self.X_SERVER_KEY,
-                }
-            )
-            if not 200 <= response.status_code < 300:
-                logger.error(f'device notification log error: {response.read()}')
-                raise ExternalException()
+        response = await self.http.post_json(
+            url=f'{self.JRAZE_BASE_URL}{NOTIFICATION_LOG_PATH}',
+            body={
+                'device_ids': device_ids,
+                'notification_id': notification_id,
+            },
+            headers={
+                'X-Server-Key': self.X_SERVER_KEY,
+            }
+        )
+        if not 200 <= response.status_code < 300:
+            logger.error(f'device notification log error: {response.read()}')
+            raise ExternalException()
 
-            return deserialize.deserialize(LogNotificationResponse, response.json())
+        return deserialize.deserialize(LogNotificationResponse, json_loads(response.content))
 
     async def search_devices(
         self,
         conditions: dict,
-        start: int,
+        cursor: Optional[str],
         size: int,
+        random_bucket_range: Optional[Tuple[int, int]] = None,
     ) -> SearchDeviceResponse:
-        print(self.X_SERVER_KEY)
         SEARCH_DEVICES_PATH = 'devices/-/:search'
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                url=f'{self.JRAZE_BASE_URL}{SEARCH_DEVICES_PATH}',
-                json={
-                    'conditions': conditions,
-                    'start': start,
-                    'size': size,
-                },
-                headers={
-                    'X-Server-Key': self.X_SERVER_KEY,
-                }
-            )
-            if not 200 <= response.status_code < 300:
-                logger.error(f'device notification log error: {response.read()}')
-                raise ExternalException()
+        response = await self.http.post_json(
+            url=f'{self.JRAZE_BASE_URL}{SEARCH_DEVICES_PATH}',
+            body={
+                'conditions': conditions,
+                'paging': 'cursor',
+                'cursor': cursor,
+                'size': size,
+                'random_bucket_range': random_bucket_range,
+                'with_total': False,
+                'sendable_only': True,
+            },
+            headers={
+                'X-Server-Key': self.X_SERVER_KEY,
+            }
+        )
+        if not 200 <= response.status_code < 300:
+            logger.error(f'device notification log error: {response.read()}')
+            raise ExternalException()
 
-            return deserialize.deserialize(SearchDeviceResponse, response.json())
+        return search_device_response_from_dict(json_loads(response.content))
 
     async def increase_notification_sent(
         self,
@@ -96,19 +170,127 @@ class JrazeApi:
         android: int = 0,
     ) -> IncreaseNotificationSentResponse:
         INCREASE_PATH = f'internal/notifications/{notification_uuid}/sent:increase'
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                url=f'{self.JRAZE_BASE_URL}{INCREASE_PATH}',
-                json={
-                    'ios': ios,
-                    'android': android,
-                },
-                headers={
-                    'X-Server-Key': self.X_SERVER_KEY,
-                }
-            )
-            if not 200 <= response.status_code < 300:
-                logger.error(f'increase notification sent amount log error: {response.read()}')
-                raise ExternalException()
+        response = await self.http.post_json(
+            url=f'{self.JRAZE_BASE_URL}{INCREASE_PATH}',
+            body={
+                'ios': ios,
+                'android': android,
+            },
+            headers={
+                'X-Server-Key': self.X_SERVER_KEY,
+            }
+        )
+        if not 200 <= response.status_code < 300:
+            logger.error(f'increase notification sent amount log error: {response.read()}')
+            raise ExternalException()
+
+        return deserialize.deserialize(
+            IncreaseNotificationSentResponse, json_loads(response.content))
+
+    async def increase_notifications_sent(
+        self,
+        sent_amounts: Dict[str, Tuple[int, int]],  # notification_uuid: (ios, android)
+    ) -> IncreaseNotificationsSentResponse:
+        INCREASE_PATH = 'internal/notifications/-/sent:increase'
+        response = await self.http.post_json(
+            url=f'{self.JRAZE_BASE_URL}{INCREASE_PATH}',
+            body={
+                'notifications': [
+                    {
+                        'uuid': notification_uuid,
+                        'ios': ios,
+                        'android': android,
+                    }
+                    for notification_uuid, (ios, android) in sent_amounts.items()
+                ],
+            },
+            headers={
+                'X-Server-Key': self.X_SERVER_KEY,
+            }
+        )
+        if not 200 <= response.status_code < 300:
+            logger.error(f'increase notifications sent amount log error: {response.read()}')
+            raise ExternalException()
+
+        return deserialize.deserialize(
+            IncreaseNotificationsSentResponse, json_loads(response.content))
+
+    async def prune_push_tokens(
+        self,
+        push_tokens: List[str],
+    ) -> PrunePushTokensResponse:
+        PRUNE_PATH = 'internal/devices/-/push_tokens:prune'
+        response = await self.http.post_json(
+            url=f'{self.JRAZE_BASE_URL}{PRUNE_PATH}',
+            body={
+                'push_tokens': push_tokens,
+            },
+            headers={
+                'X-Server-Key': self.X_SERVER_KEY,
+            }
+        )
+        if not 200 <= response.status_code < 300:
+            logger.error(f'push token prune error: {response.read()}')
+            raise ExternalException()
+
+        return deserialize.deserialize(PrunePushTokensResponse, json_loads(response.content))
+
+    async def register_launch_shard(
+        self,
+        notification_uuid: str,
+        shard_index: int,
+        bucket_start: int,
+        bucket_end: int,
+    ) -> LaunchShardResponse:
+        REGISTER_PATH = (
+            f'internal/notifications/{notification_uuid}/launch/shards/{shard_index}:register'
+        )
+        response = await self.http.post_json(
+            url=f'{self.JRAZE_BASE_URL}{REGISTER_PATH}',
+            body={
+                'bucket_start': bucket_start,
+                'bucket_end': bucket_end,
+            },
+            headers={
+                'X-Server-Key': self.X_SERVER_KEY,
+            }
+        )
+        if not 200 <= response.status_code < 300:
+            logger.error(f'launch shard register error: {response.read()}')
+            raise ExternalException()
+
+        return deserialize.deserialize(LaunchShardResponse, json_loads(response.content))
+
+    async def update_launch_shard_progress(
+        self,
+        notification_uuid: str,
+        shard_index: int,
+        bucket_start: int,
+        bucket_end: int,
+        devices: int,
+        done: bool,
+        cursor: Optional[str] = None,
+        pages: int = 0,
+    ) -> LaunchShardResponse:
+        PROGRESS_PATH = (
+            f'internal/notifications/{notification_uuid}/launch/shards/{shard_index}:progress'
+        )
+        response = await self.http.post_json(
+            url=f'{self.JRAZE_BASE_URL}{PROGRESS_PATH}',
+            body={
+                'bucket_start': bucket_start,
+                'bucket_end': bucket_end,
+                'devices': devices,
+                'done': done,
+                'cursor': cursor,
+                'pages': pages,
+            },
+            headers={
+                'X-Server-Key': self.X_SERVER_KEY,
+            }
+        )
+        if not 200 <= response.status_code < 300:
+            logger.error(f'launch shard progress update error: {response.read()}')
+            raise ExternalException()
 
-            return deserialize.deserialize(IncreaseNotificationSentResponse, response.json())
+        return deserialize.deserialize(LaunchShardResponse, json_loads(response.content))
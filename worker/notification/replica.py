@@ -1,19 +1,20 @@
 import asyncio
-import dataclasses
-from typing import Dict, List
+from typing import Dict
 
-import aiomysql
-import deserialize
-from jasyncq.dispatcher.tasks import TasksDispatcher
 from jasyncq.dispatcher.model.task import TaskOut
-from jasyncq.repository.tasks import TaskRepository
 
 from common.logger.logger import get_logger
-from common.structure.job.notification import NotificationJob, NotificationTask
+from common.metrics import JOB_SECONDS, start_metrics_server
+from common.structure.job.notification import NotificationJob, NotificationTask, \
+    notification_job_from_dict, notification_job_to_dict
+from common.task_queue.consumer import TaskConsumer
+from common.task_queue.factory import TaskQueueFactory
 from worker.notification.config import config
 from worker.notification.external.jraze.jraze import JrazeApi
 from worker.notification.task import AbstractTask
 from worker.notification.task.launch_notification import LaunchNotificationTask
+from worker.notification.task.launch_notification_shard import LaunchNotificationShardTask
+from worker.notification.task.prune_push_tokens import PrunePushTokensTask
 from worker.notification.task.update_push_result import UpdatePushResultTask
 
 logger = get_logger(__name__)
@@ -21,61 +22,52 @@ logger = get_logger(__name__)
 
 class Replica:
     NOTIFICATION_JOB_QUEUE = 'NOTIFICATION_JOB_QUEUE'
-    TASK_FETCH_SIZE = 300
+    LAUNCH_SHARD_QUEUE = 'LAUNCH_SHARD_QUEUE'
 
     def __init__(self, pid):
-        task_queue_config = config.notification_worker.task_queue
         self.jraze_api = JrazeApi()
 
         loop = asyncio.get_event_loop()
-        self.notification_queue_dispatcher = loop.run_until_complete(self._get_task_dispatcher(
-            task_queue_config=task_queue_config,
-            topic='NOTIFICATION_TOPIC',
-        ))
-        apns_messaging_task_queue = loop.run_until_complete(self._get_task_dispatcher(
-            task_queue_config=task_queue_config,
-            topic='APNS_MESSAGING_TOPIC',
-        ))
-        fcm_messaging_task_queue = loop.run_until_complete(self._get_task_dispatcher(
-            task_queue_config=task_queue_config,
-            topic='FCM_MESSAGING_TOPIC',
-        ))
+        task_queue_factory = TaskQueueFactory(
+            task_queue_config=config.notification_worker.task_queue,
+        )
+        self.notification_task_queue = loop.run_until_complete(
+            task_queue_factory.create(topic_name='NOTIFICATION_TOPIC')
+        )
+        apns_messaging_task_queue = loop.run_until_complete(
+            task_queue_factory.create(topic_name='APNS_MESSAGING_TOPIC')
+        )
+        fcm_messaging_task_queue = loop.run_until_complete(
+            task_queue_factory.create(topic_name='FCM_MESSAGING_TOPIC')
+        )
 
         self.tasks: Dict[NotificationTask, AbstractTask] = {
             NotificationTask.LAUNCH_NOTIFICATION: LaunchNotificationTask(
+                jraze_api=self.jraze_api,
+                notification_task_queue=self.notification_task_queue,
+                shard_count=config.notification_worker.launch_shard_count,
+            ),
+            NotificationTask.LAUNCH_NOTIFICATION_SHARD: LaunchNotificationShardTask(
                 jraze_api=self.jraze_api,
                 apns_messaging_task_queue=apns_messaging_task_queue,
                 fcm_messaging_task_queue=fcm_messaging_task_queue,
             ),
             NotificationTask.UPDATE_RESULT: UpdatePushResultTask(
                 jraze_api=self.jraze_api,
+                flush_interval_seconds=config.notification_worker.result_flush_interval_seconds,
+                flush_threshold=min(
+                    config.notification_worker.result_flush_threshold,
+                    max(config.notification_worker.consumer.max_in_flight // 2, 1),
+                ),
+            ),
+            NotificationTask.PRUNE_PUSH_TOKENS: PrunePushTokensTask(
+                jraze_api=self.jraze_api,
             ),
         }
+        start_metrics_server(base_port=config.notification_worker.metrics_port, pid=pid)
         logger.info(f'Worker {pid} up')
         loop.run_until_complete(self.job())
 
-    async def _get_task_dispatcher(
-        self,
-        task_queue_config: config.NotificationWorker.MySQL,
-        topic: str,
-    ) -> TasksDispatcher:
-        task_queue_pool = await aiomysql.create_pool(
-            host=task_queue_config.host,
-            port=task_queue_config.port,
-            user=task_queue_config.user,
-            password=task_queue_config.password,
-            db=task_queue_config.database,
-            autocommit=False,
-        )
-        notification_queue_repository = TaskRepository(
-            pool=task_queue_pool,
-            topic_name=topic,
-        )
-        await notification_queue_repository.initialize()
-        return TasksDispatcher(
-            repository=notification_queue_repository
-        )
-
     async def process_job(self, job: NotificationJob):  # real worker if job published
         try:
             logger.info(job)
@@ -85,31 +77,36 @@ class Replica:
                 logger.warning(f'unknown task({job.task.name}): {e}')
                 return
 
-            await task.run(kwargs=job.kwargs)
+            with JOB_SECONDS.labels(task=job.task.name).time():
+                await task.run(kwargs=job.kwargs)
         except Exception:
-            logger.exception(f'Fatal Error! {dataclasses.asdict(job)}')
+            logger.exception(f'Fatal Error! {notification_job_to_dict(job)}')
 
-    async def job(self):  # real working job
-        while True:
-            pending_tasks = await self.notification_queue_dispatcher.fetch_pending_tasks(
-                queue_name=self.NOTIFICATION_JOB_QUEUE,
-                limit=self.TASK_FETCH_SIZE,
-                check_term_seconds=60,
-            )
-            scheduled_tasks = await self.notification_queue_dispatcher.fetch_scheduled_tasks(
-                queue_name=self.NOTIFICATION_JOB_QUEUE,
-                limit=self.TASK_FETCH_SIZE,
-            )
+    async def process_task(self, task: TaskOut):
+        await self.process_job(job=notification_job_from_dict(task.task))
 
-            tasks: List[TaskOut] = [*pending_tasks, *scheduled_tasks]
-            if not tasks:
-                # NOTE(pjongy): Relax wasting
-                await asyncio.sleep(1)
+    def create_consumer(self, queue_name: str, consumer_config) -> TaskConsumer:
+        return TaskConsumer(
+            task_queue=self.notification_task_queue,
+            queue_name=queue_name,
+            handler=self.process_task,
+            max_in_flight=consumer_config.max_in_flight,
+            prefetch_size=consumer_config.prefetch_size,
+            max_idle_seconds=consumer_config.max_idle_seconds,
+            lease_seconds=consumer_config.lease_seconds,
+        )
 
-            await asyncio.gather(*[
-                self.process_job(job=deserialize.deserialize(NotificationJob, task.task))
-                for task in tasks
-            ])
-            task_ids = [str(task.uuid) for task in tasks]
-            if task_ids:
-                await self.notification_queue_dispatcher.complete_tasks(task_ids=task_ids)
+    async def job(self):  # real working job
+        # NOTE(pjongy): Launch shard runs for long, so every task is completed and its lease is
+        #  extended on its own instead of waiting for whole fetched batch
+        consumers = [
+            self.create_consumer(
+                queue_name=self.NOTIFICATION_JOB_QUEUE,
+                consumer_config=config.notification_worker.consumer,
+            ),
+            self.create_consumer(
+                queue_name=self.LAUNCH_SHARD_QUEUE,
+                consumer_config=config.notification_worker.launch_shard_consumer,
+            ),
+        ]
+        await asyncio.gather(*[consumer.run() for consumer in consumers])
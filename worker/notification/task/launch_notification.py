@@ -1,13 +1,13 @@
 import dataclasses
+import math
 
 import deserialize
 from jasyncq.dispatcher.model.task import TaskIn
-from jasyncq.dispatcher.tasks import TasksDispatcher
 
 from common.logger.logger import get_logger
-from common.structure.enum import DevicePlatform, SendPlatform
-from common.structure.job.messaging import MessagingTask
-from common.structure.job.notification import NotificationLaunchMessageArgs, Notification
+from common.structure.job.notification import NotificationLaunchMessageArgs, Notification, \
+    NotificationTask
+from common.task_queue.abstract import AbstractTaskQueue
 from worker.notification.external.jraze.jraze import JrazeApi
 from worker.notification.task import AbstractTask
 
@@ -15,15 +15,31 @@ logger = get_logger(__name__)
 
 
 class LaunchNotificationTask(AbstractTask):
+    # NOTE(pjongy): Same range that apiserver assigns for device's random_bucket
+    RANDOM_BUCKET_MIN = 1
+    RANDOM_BUCKET_MAX = 10000
+
     def __init__(
         self,
         jraze_api: JrazeApi,
-        fcm_messaging_task_queue: TasksDispatcher,
-        apns_messaging_task_queue: TasksDispatcher,
+        notification_task_queue: AbstractTaskQueue,
+        shard_count: int,
     ):
         self.jraze_api: JrazeApi = jraze_api
-        self.fcm_messaging_task_queue = fcm_messaging_task_queue
-        self.apns_messaging_task_queue = apns_messaging_task_queue
+        self.notification_task_queue = notification_task_queue
+        self.shard_count = shard_count
+
+    def _split_random_bucket(self):
+        bucket_count = self.RANDOM_BUCKET_MAX - self.RANDOM_BUCKET_MIN + 1
+        shard_size = math.ceil(bucket_count / self.shard_count)
+        return [
+            (
+                bucket_start,
+                min(bucket_start + shard_size - 1, self.RANDOM_BUCKET_MAX),
+            )
+            for bucket_start in range(
+                self.RANDOM_BUCKET_MIN, self.RANDOM_BUCKET_MAX + 1, shard_size)
+        ]
 
     async def run(self, kwargs: dict):
         logger.debug(kwargs)
@@ -31,78 +47,38 @@ class LaunchNotificationTask(AbstractTask):
             NotificationLaunchMessageArgs, kwargs)
         notification: Notification = task_args.notification
 
-        start = 0
-        size = 300
-        while True:
-            search_device_result = await self.jraze_api.search_devices(
-                conditions=dataclasses.asdict(task_args.conditions),
-                start=start,
-                size=size,
+        shards = [
+            {
+                'index': index,
+                'bucket_start': bucket_start,
+                'bucket_end': bucket_end,
+            }
+            for index, (bucket_start, bucket_end) in enumerate(self._split_random_bucket())
+        ]
+        for shard in shards:
+            # NOTE(pjongy): Register every shard first so progress shows pending shards too,
+            #  shards of re-fetched launch keep their checkpoint and done shards are skipped
+            await self.jraze_api.register_launch_shard(
+                notification_uuid=str(notification.uuid),
+                shard_index=shard['index'],
+                bucket_start=shard['bucket_start'],
+                bucket_end=shard['bucket_end'],
             )
-            devices = search_device_result.result.devices
-            if not devices:
-                break
-
-            start += len(devices)
-            device_platforms = {DevicePlatform.IOS, DevicePlatform.Android}
-            send_platforms = {SendPlatform.APNS, SendPlatform.FCM}
-
-            tokens = {}
-            for send_platform in send_platforms:
-                if send_platform not in tokens:
-                    tokens[send_platform] = {}
-                for device_platform in device_platforms:
-                    if device_platform not in tokens[send_platform]:
-                        tokens[send_platform][device_platform] = []
-
-            device_ids = []
-            for device in devices:
-                tokens[device.send_platform][device.device_platform].append(device.push_token)
-                device_ids.append(device.id)
 
-            tasks = {
-                SendPlatform.APNS: [],
-                SendPlatform.FCM: [],
-            }
-            for send_platform in send_platforms:
-                for device_platform in device_platforms:
-                    tasks[send_platform].append({
-                        'task': MessagingTask.SEND_PUSH_MESSAGE,
+        await self.notification_task_queue.apply_tasks(
+            tasks=[
+                TaskIn(
+                    task={
+                        'task': NotificationTask.LAUNCH_NOTIFICATION_SHARD,
                         'kwargs': {
-                            'notification_id': str(notification.uuid),
-                            'push_tokens': tokens[send_platform][device_platform],
-                            'device_platform': device_platform,
-                            'body': notification.body,
-                            'title': notification.title,
-                            'deep_link': notification.deep_link,
-                            'image_url': notification.image_url,
-                            'icon_url': notification.icon_url
-                        }
-                    })
-
-            if tasks[SendPlatform.FCM]:
-                await self.fcm_messaging_task_queue.apply_tasks(
-                    tasks=[
-                        TaskIn(
-                            task=task,
-                            queue_name='MESSAGING_QUEUE',
-                        )
-                        for task in tasks[SendPlatform.FCM]
-                    ],
-                )
-
-            if tasks[SendPlatform.APNS]:
-                await self.apns_messaging_task_queue.apply_tasks(
-                    tasks=[
-                        TaskIn(
-                            task=task,
-                            queue_name='MESSAGING_QUEUE',
-                        )
-                        for task in tasks[SendPlatform.APNS]
-                    ],
+                            'notification': dataclasses.asdict(notification),
+                            'conditions': dataclasses.asdict(task_args.conditions),
+                            'shard': shard,
+                        },
+                    },
+                    queue_name='LAUNCH_SHARD_QUEUE',
                 )
-
-            await self.jraze_api.log_notification(
-                device_ids=device_ids,
-                notification_id=notification.id,
-            )
+                for shard in shards
+            ],
+        )
+        logger.info(f'notification {notification.uuid} launched with {len(shards)} shards')
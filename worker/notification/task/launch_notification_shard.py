@@ -0,0 +1,182 @@
+import dataclasses
+from typing import Dict, List, Optional
+
+import deserialize
+from jasyncq.dispatcher.model.task import TaskIn
+
+from common.logger.logger import get_logger
+from common.structure.enum import DevicePlatform, SendPlatform
+from common.structure.job.messaging import MessagingTask
+from common.structure.job.notification import NotificationLaunchShardMessageArgs, Notification, \
+    LaunchShard
+from common.task_queue.abstract import AbstractTaskQueue
+from worker.notification.external.jraze.jraze import JrazeApi, SearchDeviceResponse
+from worker.notification.task import AbstractTask
+
+logger = get_logger(__name__)
+
+
+def build_messaging_tasks(
+    notification: Notification,
+    devices: List[SearchDeviceResponse.Result.Device],
+) -> Dict[SendPlatform, List[dict]]:
+    """Messaging tasks of single searched page, per device platform for each send platform"""
+    device_platforms = {DevicePlatform.IOS, DevicePlatform.Android}
+    send_platforms = {SendPlatform.APNS, SendPlatform.FCM}
+
+    tokens = {
+        send_platform: {device_platform: [] for device_platform in device_platforms}
+        for send_platform in send_platforms
+    }
+    for device in devices:
+        tokens[device.send_platform][device.device_platform].append(device.push_token)
+
+    tasks = {
+        SendPlatform.APNS: [],
+        SendPlatform.FCM: [],
+    }
+    for send_platform in send_platforms:
+        for device_platform in device_platforms:
+            if not tokens[send_platform][device_platform]:
+                continue
+            tasks[send_platform].append({
+                'task': MessagingTask.SEND_PUSH_MESSAGE,
+                'kwargs': {
+                    'notification_id': str(notification.uuid),
+                    'push_tokens': tokens[send_platform][device_platform],
+                    'device_platform': device_platform,
+                    'body': notification.body,
+                    'title': notification.title,
+                    'deep_link': notification.deep_link,
+                    'image_url': notification.image_url,
+                    'icon_url': notification.icon_url
+                }
+            })
+    return tasks
+
+
+class LaunchNotificationShardTask(AbstractTask):
+    def __init__(
+        self,
+        jraze_api: JrazeApi,
+        fcm_messaging_task_queue: AbstractTaskQueue,
+        apns_messaging_task_queue: AbstractTaskQueue,
+    ):
+        self.jraze_api: JrazeApi = jraze_api
+        self.fcm_messaging_task_queue = fcm_messaging_task_queue
+        self.apns_messaging_task_queue = apns_messaging_task_queue
+
+    async def _update_progress(
+        self,
+        notification: Notification,
+        shard: LaunchShard,
+        cursor: Optional[str],
+        pages: int,
+        devices: int,
+        done: bool,
+    ):
+        await self.jraze_api.update_launch_shard_progress(
+            notification_uuid=str(notification.uuid),
+            shard_index=shard.index,
+            bucket_start=shard.bucket_start,
+            bucket_end=shard.bucket_end,
+            devices=devices,
+            done=done,
+            cursor=cursor,
+            pages=pages,
+        )
+
+    async def run(self, kwargs: dict):
+        logger.debug(kwargs)
+        task_args: NotificationLaunchShardMessageArgs = deserialize.deserialize(
+            NotificationLaunchShardMessageArgs, kwargs)
+        notification: Notification = task_args.notification
+        shard: LaunchShard = task_args.shard
+
+        checkpoint = (await self.jraze_api.register_launch_shard(
+            notification_uuid=str(notification.uuid),
+            shard_index=shard.index,
+            bucket_start=shard.bucket_start,
+            bucket_end=shard.bucket_end,
+        )).result
+        if checkpoint.done:
+            logger.info(f'notification {notification.uuid} shard {shard.index} is already done')
+            return
+
+        # NOTE(pjongy): Resumes after last checkpointed page, page processed after checkpoint
+        #  (at most one) is sent again
+        cursor = checkpoint.cursor
+        pages = checkpoint.pages
+        device_total = checkpoint.devices
+        if pages:
+            logger.info(
+                f'notification {notification.uuid} shard {shard.index} resumes after {pages} pages'
+            )
+
+        size = 300
+        while True:
+            search_device_result = await self.jraze_api.search_devices(
+                conditions=dataclasses.asdict(task_args.conditions),
+                cursor=cursor,
+                size=size,
+                random_bucket_range=(shard.bucket_start, shard.bucket_end),
+            )
+            devices = search_device_result.result.devices
+            if not devices:
+                break
+
+            cursor = search_device_result.result.next_cursor
+            tasks = build_messaging_tasks(notification=notification, devices=devices)
+            device_ids = [device.id for device in devices]
+
+            if tasks[SendPlatform.FCM]:
+                await self.fcm_messaging_task_queue.apply_tasks(
+                    tasks=[
+                        TaskIn(
+                            task=task,
+                            queue_name='MESSAGING_QUEUE',
+                        )
+                        for task in tasks[SendPlatform.FCM]
+                    ],
+                )
+
+            if tasks[SendPlatform.APNS]:
+                await self.apns_messaging_task_queue.apply_tasks(
+                    tasks=[
+                        TaskIn(
+                            task=task,
+                            queue_name='MESSAGING_QUEUE',
+                        )
+                        for task in tasks[SendPlatform.APNS]
+                    ],
+                )
+
+            if device_ids:
+                await self.jraze_api.log_notification(
+                    device_ids=device_ids,
+                    notification_id=notification.id,
+                )
+
+            pages += 1
+            device_total += len(devices)
+            if cursor is None:
+                break
+
+            await self._update_progress(
+                notification=notification,
+                shard=shard,
+                cursor=cursor,
+                pages=pages,
+                devices=device_total,
+                done=False,
+            )
+
+        await self._update_progress(
+            notification=notification,
+            shard=shard,
+            cursor=cursor,
+            pages=pages,
+            devices=device_total,
+            done=True,
+        )
+        logger.info(f'jraze api http stats: {self.jraze_api.http.stats.to_dict()}')
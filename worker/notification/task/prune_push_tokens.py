@@ -0,0 +1,26 @@
+import deserialize
+
+from common.logger.logger import get_logger
+from common.structure.job.notification import PrunePushTokensMessageArgs
+from worker.notification.external.jraze.jraze import JrazeApi
+from worker.notification.task import AbstractTask
+
+logger = get_logger(__name__)
+
+
+class PrunePushTokensTask(AbstractTask):
+    """Clears push tokens that messaging workers reported as invalid"""
+
+    def __init__(self, jraze_api: JrazeApi):
+        self.jraze_api: JrazeApi = jraze_api
+
+    async def run(self, kwargs: dict):
+        task_args: PrunePushTokensMessageArgs = deserialize.deserialize(
+            PrunePushTokensMessageArgs, kwargs)
+        if not task_args.push_tokens:
+            return
+
+        response = await self.jraze_api.prune_push_tokens(push_tokens=task_args.push_tokens)
+        logger.info(
+            f'pruned {response.result.pruned} devices of {len(task_args.push_tokens)} tokens'
+        )
@@ -1,6 +1,10 @@
+import asyncio
+from typing import Dict, Optional, Tuple
+
 import deserialize
 
 from common.logger.logger import get_logger
+from common.metrics import PUSH_RESULT_FAILED_TOTAL
 from common.structure.job.messaging import DevicePlatform
 from common.structure.job.notification import NotificationSentResultMessageArgs
 from worker.notification.external.jraze.jraze import JrazeApi
@@ -10,20 +14,103 @@ logger = get_logger(__name__)
 
 
 class UpdatePushResultTask(AbstractTask):
-    def __init__(self, jraze_api: JrazeApi):
+    """Aggregates sent amounts per notification and flushes them with single request
+
+    Each run waits until its amount is flushed, so the task is not completed before it is stored.
+    Failed flush is merged back and retried with next flush instead of failing waiting tasks,
+    since consumer completes tasks whose handler failed
+    """
+
+    def __init__(
+        self,
+        jraze_api: JrazeApi,
+        flush_interval_seconds: float = 1.0,
+        flush_threshold: int = 1000,
+    ):
         self.jraze_api: JrazeApi = jraze_api
+        self.flush_interval_seconds = flush_interval_seconds
+        self.flush_threshold = flush_threshold
+
+        self.sent_amounts: Dict[str, Tuple[int, int]] = {}  # notification_uuid: (ios, android)
+        self.pending_results = 0
+        self.pending_failed = 0  # NOTE(pjongy): Only logged, api server does not store it
+        self.flushed: Optional[asyncio.Future] = None
+        self.flush_timer: Optional[asyncio.TimerHandle] = None
 
     async def run(self, kwargs: dict):
         task_args: NotificationSentResultMessageArgs = deserialize.deserialize(
             NotificationSentResultMessageArgs, kwargs)
 
         if task_args.device_platform == DevicePlatform.IOS:
-            await self.jraze_api.increase_notification_sent(
-                notification_uuid=task_args.notification_uuid,
-                ios=task_args.sent,
-            )
+            sent_amount = (task_args.sent, 0)
+            platform = 'ios'
         elif task_args.device_platform == DevicePlatform.Android:
-            await self.jraze_api.increase_notification_sent(
-                notification_uuid=task_args.notification_uuid,
-                android=task_args.sent,
-            )
+            sent_amount = (0, task_args.sent)
+            platform = 'android'
+        else:
+            return
+        PUSH_RESULT_FAILED_TOTAL.labels(platform=platform).inc(task_args.failed)
+        self.pending_failed += task_args.failed
+
+        flushed = self._add(
+            sent_amounts={task_args.notification_uuid: sent_amount},
+            results=1,
+        )
+        # NOTE(pjongy): Shield not to cancel flush shared with other tasks
+        await asyncio.shield(flushed)
+
+    def _add(self, sent_amounts: Dict[str, Tuple[int, int]], results: int) -> asyncio.Future:
+        """Adds amounts to pending buffer and returns future resolved when they are flushed"""
+        for notification_uuid, (ios, android) in sent_amounts.items():
+            pending_ios, pending_android = self.sent_amounts.get(notification_uuid, (0, 0))
+            self.sent_amounts[notification_uuid] = (pending_ios + ios, pending_android + android)
+        self.pending_results += results
+
+        loop = asyncio.get_event_loop()
+        if self.flushed is None:
+            self.flushed = loop.create_future()
+            self.flush_timer = loop.call_later(self.flush_interval_seconds, self._start_flush)
+
+        flushed = self.flushed
+        if self.pending_results >= self.flush_threshold:
+            self._start_flush()
+        return flushed
+
+    def _start_flush(self):
+        if self.flushed is None:
+            return
+
+        self.flush_timer.cancel()
+        sent_amounts, results, flushed = self.sent_amounts, self.pending_results, self.flushed
+        logger.info(
+            f'flush {results} push results of {len(sent_amounts)} notifications '
+            f'(failed pushes: {self.pending_failed})'
+        )
+
+        self.sent_amounts = {}
+        self.pending_results = 0
+        self.pending_failed = 0
+        self.flushed = None
+        self.flush_timer = None
+        asyncio.ensure_future(
+            self._flush(sent_amounts=sent_amounts, results=results, flushed=flushed))
+
+    async def _flush(
+        self,
+        sent_amounts: Dict[str, Tuple[int, int]],
+        results: int,
+        flushed: asyncio.Future,
+    ):
+        try:
+            response = await self.jraze_api.increase_notifications_sent(sent_amounts=sent_amounts)
+        except Exception as e:
+            logger.warning(f'flush of {results} push results failed, retry with next flush: {e}')
+            # NOTE(pjongy): Not to retry immediately even if buffer is over threshold
+            await asyncio.sleep(self.flush_interval_seconds)
+            retried = self._add(sent_amounts=sent_amounts, results=results)
+            retried.add_done_callback(lambda _: flushed.set_result(None))
+            return
+
+        if response.result.not_found:
+            logger.warning(f'sent amount of unknown notifications: {response.result.not_found}')
+        flushed.set_result(None)